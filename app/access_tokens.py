@@ -0,0 +1,67 @@
+"""
+Twilio Voice access tokens for the mobile app.
+
+The app asks for a token on every launch and reconnect, and signing a JWT
+per request adds up during reconnect storms. Tokens are issued with a
+VOICE_TOKEN_TTL_SECONDS lifetime and handed out again from memory until
+VOICE_TOKEN_REFRESH_MARGIN_SECONDS before they expire, so the app never gets
+one that is about to lapse. Concurrent requests for the same identity share
+one signing.
+"""
+import threading
+import time
+from typing import Dict
+
+from twilio.jwt.access_token import AccessToken
+from twilio.jwt.access_token.grants import VoiceGrant
+
+from app.config import settings
+from app.metrics import metrics
+from app.ttl_cache import TTLCache
+
+_cache_ttl = max(0, settings.VOICE_TOKEN_TTL_SECONDS - settings.VOICE_TOKEN_REFRESH_MARGIN_SECONDS)
+voice_token_cache = TTLCache("voice_tokens", ttl_seconds=_cache_ttl, max_entries=50000)
+
+_locks_guard = threading.Lock()
+_identity_locks: Dict[str, threading.Lock] = {}
+
+
+def _issue(identity: str) -> Dict:
+    access_token = AccessToken(
+        settings.TWILIO_ACCOUNT_SID,
+        settings.TWILIO_API_KEY_SID,
+        settings.TWILIO_API_KEY_SECRET,
+        identity=identity,
+        ttl=settings.VOICE_TOKEN_TTL_SECONDS,
+    )
+    voice_grant = VoiceGrant(
+        outgoing_application_sid=settings.TWIML_APP_SID,
+        incoming_allow=True
+    )
+    access_token.add_grant(voice_grant)
+    with metrics.timer("voice_tokens.sign"):
+        jwt_token = access_token.to_jwt()
+    metrics.increment("voice_tokens.issued")
+    return {"token": jwt_token, "identity": identity, "expires_at": int(time.time()) + settings.VOICE_TOKEN_TTL_SECONDS}
+
+
+def get_voice_token(identity: str) -> Dict:
+    """A Voice access token for identity: the cached one while it has time left, otherwise a new one."""
+    found, token = voice_token_cache.get(identity)
+    if found:
+        metrics.increment("voice_tokens.cached")
+        return token
+
+    with _locks_guard:
+        lock = _identity_locks.setdefault(identity, threading.Lock())
+    with lock:
+        # Another request may have issued it while we waited.
+        found, token = voice_token_cache.get(identity)
+        if found:
+            metrics.increment("voice_tokens.cached")
+            return token
+        token = _issue(identity)
+        voice_token_cache.set(identity, token)
+    with _locks_guard:
+        _identity_locks.pop(identity, None)
+    return token
@@ -0,0 +1,72 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+
+from app.history_versions import get_history_version
+from app.response_cache import response_cache
+
+_VALIDATOR_HEADERS = ("etag", "last-modified", "cache-control")
+
+
+def conditional_response(request: Request, response: Response, user_id: str) -> Optional[Response]:
+    """
+    Conditional GET support for endpoints that only depend on a user's calls
+    and messages. Sets ETag/Last-Modified on `response` from the user's change
+    version and returns a ready-made 304 if the client's copy is still current,
+    in which case the endpoint should return it without doing any other work.
+    """
+    version, updated_at = get_history_version(user_id)
+    request.state.history_version = version
+
+    # The same version means different content for different endpoints and params.
+    variant = hashlib.sha1(_variant_key(request).encode()).hexdigest()[:12]
+    etag = f'W/"{version}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if updated_at:
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+    if _is_not_modified(request, etag, headers.get("Last-Modified")):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
+def cached_json_response(request: Request, response: Response, user_id: str, build: Callable[[], bytes]) -> Response:
+    """
+    Serves the endpoint's serialized JSON from the response cache, calling
+    `build` only on a miss. Must be called after conditional_response(),
+    which looks up the version the cached entry is tagged with.
+    """
+    version = request.state.history_version
+    key = _variant_key(request)
+    body = response_cache.get(user_id, key, version)
+    if body is None:
+        body = build()
+        response_cache.set(user_id, key, version, body)
+
+    headers = {name: value for name, value in response.headers.items() if name in _VALIDATOR_HEADERS}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _variant_key(request: Request) -> str:
+    return f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: Optional[str]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -1,4 +1,6 @@
-from app.assistant import OraniAIAssistant
+from typing import List, Optional
+from fastapi import HTTPException, Query
+from app.assistant import OraniAIAssistant, SUMMARY_ALL_FIELDS, SUMMARY_HEAVY_FIELDS, SUMMARY_PREVIEW_FIELDS
 from app.config import settings
 
 orani_assistant = OraniAIAssistant(
@@ -10,4 +12,29 @@ orani_assistant = OraniAIAssistant(
 
 def get_orani_assistant() -> OraniAIAssistant:
     """Dependency injector that provides a single instance of the OraniAIAssistant."""
-    return orani_assistant
\ No newline at end of file
+    return orani_assistant
+
+def _split_field_list(value: Optional[str]) -> List[str]:
+    return [f.strip() for f in value.split(",") if f.strip()] if value else []
+
+def get_summary_fields(
+    fields: Optional[str] = Query(None, description="Comma-separated call summary fields to return. Defaults to the preview fields."),
+    include: Optional[str] = Query(None, description=f"Comma-separated heavy fields to add: {', '.join(SUMMARY_HEAVY_FIELDS)}."),
+) -> List[str]:
+    """
+    Dependency that resolves the ?fields= and ?include= query parameters into
+    the list of call summary columns a list endpoint should select.
+    'call_id' and 'timestamp' are always returned.
+    """
+    requested = _split_field_list(fields) or list(SUMMARY_PREVIEW_FIELDS)
+    requested += _split_field_list(include)
+
+    unknown = [f for f in requested if f not in SUMMARY_ALL_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown summary field(s): {', '.join(unknown)}")
+
+    selected = ["call_id", "timestamp"]
+    for field in requested:
+        if field not in selected:
+            selected.append(field)
+    return selected
@@ -1,36 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from app.assistant import OraniAIAssistant
 from app.api.deps import get_orani_assistant
 
-from twilio.jwt.access_token import AccessToken
-from twilio.jwt.access_token.grants import VoiceGrant
+from app.access_tokens import get_voice_token
 from app.config import settings
+from app.campaigns import create_campaign, get_campaign_progress, set_campaign_status
 
 router = APIRouter()
 
 # --- THIS IS THE NEW ENDPOINT ---
 @router.get("/token")
 def get_twilio_token(user_id: str):
-    """Generates a Twilio Access Token for the frontend app."""
+    """Returns a Twilio Access Token for the frontend app (reused until shortly before it expires)."""
     try:
-        access_token = AccessToken(
-            settings.TWILIO_ACCOUNT_SID,
-            settings.TWILIO_API_KEY_SID,
-            settings.TWILIO_API_KEY_SECRET,
-            identity=user_id
-        )
-        voice_grant = VoiceGrant(
-            outgoing_application_sid=settings.TWIML_APP_SID,
-            incoming_allow=True
-        )
-        access_token.add_grant(voice_grant)
-        jwt_token = access_token.to_jwt()
-        return {"token": jwt_token}
+        return get_voice_token(user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate Twilio token: {str(e)}")
 # ------------------------------
 
+class TokenBatchRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1)
+
+@router.post("/tokens")
+def get_twilio_tokens(payload: TokenBatchRequest):
+    """Pre-issues Twilio Access Tokens for several identities at once."""
+    user_ids = list(dict.fromkeys(payload.user_ids))
+    if len(user_ids) > settings.VOICE_TOKEN_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {settings.VOICE_TOKEN_BATCH_MAX} user_ids per request.")
+    try:
+        return {"tokens": {user_id: get_voice_token(user_id) for user_id in user_ids}}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate Twilio tokens: {str(e)}")
+
 class OutboundCallRequest(BaseModel):
     user_id: str
     from_number: str
@@ -51,4 +54,55 @@ def trigger_outbound_call(
     if call_result:
         return {"status": "success", "call_details": call_result}
     else:
-        raise HTTPException(status_code=500, detail="Failed to initiate outbound call.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to initiate outbound call.")
+
+
+class CampaignRequest(BaseModel):
+    user_id: str
+    from_number: str
+    numbers: List[str] = Field(..., min_length=1)
+    max_concurrent: Optional[int] = Field(None, ge=1, description="Simultaneous calls; capped at the per-user limit.")
+    max_attempts: Optional[int] = Field(None, ge=1, description="Dial attempts per number, including no-answer retries.")
+    retry_delay_minutes: Optional[int] = Field(None, ge=0)
+
+@router.post("/campaigns", status_code=201)
+def start_campaign(
+    payload: CampaignRequest,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """Starts dialing a list of numbers from the assistant, a few at a time."""
+    if not orani._get_assistant_id(payload.user_id):
+        raise HTTPException(status_code=404, detail=f"No assistant found for user '{payload.user_id}'.")
+    vapi_phone_id = orani._get_vapi_phone_id_from_number(payload.from_number)
+    if not vapi_phone_id:
+        raise HTTPException(status_code=400, detail=f"'{payload.from_number}' is not a number configured in Vapi.")
+
+    campaign, rejected = create_campaign(
+        user_id=payload.user_id,
+        from_number=payload.from_number,
+        vapi_phone_id=vapi_phone_id,
+        numbers=payload.numbers,
+        max_concurrent=payload.max_concurrent,
+        max_attempts=payload.max_attempts,
+        retry_delay_seconds=payload.retry_delay_minutes * 60 if payload.retry_delay_minutes is not None else None,
+    )
+    return {"status": "success", "campaign": get_campaign_progress(campaign.id), "rejected_numbers": rejected}
+
+@router.get("/campaigns/{campaign_id}")
+def get_campaign(campaign_id: str, include_calls: bool = False):
+    """Campaign progress: call counts by status, and optionally every call."""
+    progress = get_campaign_progress(campaign_id, include_calls=include_calls)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Campaign not found.")
+    return progress
+
+@router.post("/campaigns/{campaign_id}/{action}")
+def update_campaign(campaign_id: str, action: str):
+    """Pauses, resumes or cancels a campaign."""
+    statuses = {"pause": "paused", "resume": "running", "cancel": "cancelled"}
+    if action not in statuses:
+        raise HTTPException(status_code=404, detail="Unknown campaign action.")
+    campaign = set_campaign_status(campaign_id, statuses[action])
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found.")
+    return get_campaign_progress(campaign_id)
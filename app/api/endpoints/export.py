@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app.api.deps import get_summary_fields
+from app.exports import export_call_summaries, export_messages
+
+router = APIRouter()
+
+_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _export_response(chunks, user_id: str, name: str, export_format: str) -> StreamingResponse:
+    # No Content-Length is set, so the body is sent with chunked transfer encoding.
+    return StreamingResponse(
+        chunks,
+        media_type=_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{user_id}-{name}.{export_format}"'},
+    )
+
+
+@router.get("/{user_id}/calls")
+def export_user_calls(
+    user_id: str,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = Query(None, description="Only export calls at or after this time (ISO 8601), for incremental syncs."),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export. Defaults to every field, including the transcript."),
+):
+    """
+    Streams all of a user's call summaries as NDJSON or CSV, oldest first.
+    Rows come straight from a database cursor, so memory use stays flat
+    no matter how large the export is.
+    """
+    selected = get_summary_fields(fields=fields, include=None) if fields else None
+    return _export_response(export_call_summaries(user_id, format, since, selected), user_id, "calls", format)
+
+
+@router.get("/{user_id}/messages")
+def export_user_messages(
+    user_id: str,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = Query(None, description="Only export messages at or after this time (ISO 8601), for incremental syncs."),
+):
+    """Streams all of a user's messages as NDJSON or CSV, oldest first."""
+    return _export_response(export_messages(user_id, format, since), user_id, "messages", format)
@@ -1,54 +1,117 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import List, Optional
-from app.api.schemas import ConversationPreview
+import json
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app.api.schemas import ConversationPreview, HistorySearchResponse, RetentionPolicySchema
+from app.search import search_history
+from app.retention import get_retention_policy, set_retention_policy
+from app.config import settings
+from app.api.conditional import conditional_response, cached_json_response
 from app.assistant import OraniAIAssistant
-from app.api.deps import get_orani_assistant
+from app.api.deps import get_orani_assistant, get_summary_fields
 
 router = APIRouter()
 
+_preview_list_adapter = TypeAdapter(List[ConversationPreview])
+
 @router.get("/{user_id}/latest", response_model=List[ConversationPreview]) 
 def get_latest_history_previews(
     user_id: str,
+    request: Request,
+    response: Response,
     orani: OraniAIAssistant = Depends(get_orani_assistant)
 ):
     """
     Retrieves a list of the most recent interactions (previews) for each
     conversation thread. Optimized for building an inbox view.
+    Supports If-None-Match / If-Modified-Since and answers 304 when unchanged.
+    """
+    not_modified = conditional_response(request, response, user_id)
+    if not_modified:
+        return not_modified
+
+    def build() -> bytes:
+        preview_data = orani.get_conversation_previews(user_id)
+        if preview_data and "previews" in preview_data:
+            return _preview_list_adapter.dump_json(_preview_list_adapter.validate_python(preview_data["previews"]))
+        else:
+            raise HTTPException(status_code=404, detail=f"No history found for user {user_id}.")
+
+    return cached_json_response(request, response, user_id, build)
+
+
+@router.get("/{user_id}/search", response_model=HistorySearchResponse)
+def search_user_history(
+    user_id: str,
+    q: str = Query(..., min_length=1, description="Words to search for in transcripts, summaries and messages."),
+    types: Optional[str] = Query(None, description="Comma-separated item types to search: call, message, file."),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Full-text search over a user's call transcripts, call summaries and
+    messages, ranked by relevance.
     """
-    preview_data = orani.get_conversation_previews(user_id)
-    print("Retrieved conversation previews:", preview_data)
-    
-    if preview_data and "previews" in preview_data:
-        return preview_data["previews"] 
-    else:
-        raise HTTPException(status_code=404, detail=f"No history found for user {user_id}.")
+    item_types = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    results = search_history(user_id, q, item_types=item_types, limit=limit, offset=offset)
+    return {"query": q, "limit": limit, "offset": offset, "results": results}
 
 
 
+@router.get("/{user_id}/retention", response_model=RetentionPolicySchema)
+def get_user_retention_policy(user_id: str):
+    """Shows how long a user's calls and messages stay in the hot tables before being archived."""
+    policy = get_retention_policy(user_id)
+    if policy:
+        return {"hot_days": policy.hot_days, "enabled": policy.enabled}
+    return {"hot_days": settings.RETENTION_DEFAULT_HOT_DAYS, "enabled": settings.RETENTION_DEFAULT_HOT_DAYS is not None}
+
+
+@router.put("/{user_id}/retention", response_model=RetentionPolicySchema)
+def update_user_retention_policy(user_id: str, payload: RetentionPolicySchema):
+    """Sets a user's retention policy. Older items are archived by the background retention task."""
+    if payload.hot_days is None:
+        raise HTTPException(status_code=400, detail="hot_days is required.")
+    policy = set_retention_policy(user_id, payload.hot_days, payload.enabled)
+    return {"hot_days": policy.hot_days, "enabled": policy.enabled}
+
+
 @router.get("/{user_id}/{customer_number}")
 def get_unified_history(
     user_id: str,
+    request: Request,
+    response: Response,
     customer_number: Optional[str] = None, 
+    fields: List[str] = Depends(get_summary_fields),
     orani: OraniAIAssistant = Depends(get_orani_assistant)
 ):
     """
     Retrieves a combined, chronological history of all calls and messages
     for a given user. If a 'customer_number' query parameter is provided,
     the history is filtered to only include interactions with that customer.
+    Calls carry the preview fields unless more are requested with ?fields=
+    or ?include=.
     """
-    if customer_number:
-        # If a customer number is provided, call the filtering function
-        history_data = orani.get_unified_history_for_customer(user_id, customer_number)
-    else:
-        # Otherwise, get the complete history for the user
-        history_data = orani.get_unified_history_for_user(user_id)
-    
-    if history_data and history_data.get("history"):
-        print("Retrieved unified history:", history_data)
-        return history_data
-    else:
-        detail_msg = f"Could not retrieve history for user {user_id}."
+    not_modified = conditional_response(request, response, user_id)
+    if not_modified:
+        return not_modified
+
+    def build() -> bytes:
         if customer_number:
-            detail_msg += f" with customer {customer_number}."
-        
-        raise HTTPException(status_code=404, detail=detail_msg)
\ No newline at end of file
+            # If a customer number is provided, call the filtering function
+            history_data = orani.get_unified_history_for_customer(user_id, customer_number, fields)
+        else:
+            # Otherwise, get the complete history for the user
+            history_data = orani.get_unified_history_for_user(user_id, fields)
+
+        if history_data and history_data.get("history"):
+            return json.dumps(jsonable_encoder(history_data)).encode()
+        else:
+            detail_msg = f"Could not retrieve history for user {user_id}."
+            if customer_number:
+                detail_msg += f" with customer {customer_number}."
+
+            raise HTTPException(status_code=404, detail=detail_msg)
+
+    return cached_json_response(request, response, user_id, build)
\ No newline at end of file
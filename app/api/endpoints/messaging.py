@@ -1,6 +1,6 @@
 # In app/api/endpoints/messaging.py
-from fastapi import APIRouter, Depends, HTTPException, Request
-from twilio.rest import Client
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 # ... other imports ...
 from app.models import Message
 from app.api.deps import get_orani_assistant
@@ -8,20 +8,71 @@ from app.assistant import OraniAIAssistant
 from pydantic import BaseModel
 from sqlmodel import Session, select
 from app.database import engine
-from app.api.schemas import SendMessageRequest
+from app.api.schemas import BulkMessageRequest, SendMessageRequest
+from app.bulk_messaging import BulkMessageJob, BulkRecipient, bulk_scheduler
 from fastapi import Form, File, UploadFile
 from typing import Optional, List
-import cloudinary
-from cloudinary.uploader import upload
-from cloudinary.utils import cloudinary_url
-from app.config import settings
-from datetime import datetime
+from app.phone_utils import phone_match_key
+from app.api.conditional import conditional_response, cached_json_response
+from app.media import (
+    create_upload_signature, is_allowed_media_url, prepare_mms_image, run_in_media_executor,
+    store_local_media, upload_mms_attachment, use_local_storage, verify_local_upload,
+)
+from app.message_store import save_message
+from app.message_status import status_callback_url
+from app.metrics import metrics
+from app.retention import archived_stubs, load_archived_record
+from fastapi.encoders import jsonable_encoder
+import json
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+class UploadSignatureRequest(BaseModel):
+    user_id: str
+
+
+@router.post("/upload-signature")
+def get_upload_signature(payload: UploadSignatureRequest):
+    """
+    Returns short-lived signed upload parameters so the app can upload an MMS
+    attachment directly to storage, then pass the resulting URL to /send as
+    'media_urls' instead of streaming the file through this server.
+    """
+    try:
+        return create_upload_signature(payload.user_id)
+    except Exception as e:
+        logger.error(f"Failed to create upload signature: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Could not create upload signature.")
+
+
+@router.post("/local-upload")
+async def local_upload(
+    folder: str = Form(...),
+    public_id: str = Form(...),
+    expires_at: int = Form(...),
+    signature: str = Form(...),
+    file: UploadFile = File(...)
+):
+    """Direct-upload target when MEDIA_STORAGE_BACKEND is 'local' (development)."""
+    if not use_local_storage():
+        raise HTTPException(status_code=404, detail="Not found")
+    fields = {"folder": folder, "public_id": public_id, "expires_at": expires_at, "signature": signature}
+    if not verify_local_upload(fields):
+        raise HTTPException(status_code=403, detail="Upload signature is invalid or expired.")
+
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    try:
+        secure_url = await run_in_media_executor(store_local_media, folder, f"{public_id}{extension}", file.file)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid upload path.")
+    return {"secure_url": secure_url}
+
+
 @router.post("/send")
 async def send_sms_message(
     request: Request,
@@ -30,7 +81,11 @@ async def send_sms_message(
     """
     [UNIFIED VERSION]
     Sends an SMS or MMS message in a single API call.
-    Accepts multipart/form-data with message details and an optional image file.
+    Accepts multipart/form-data with message details and either an optional
+    file or one or more 'media_urls' already uploaded directly to storage
+    (see /upload-signature). Image processing and the Cloudinary upload run
+    on the bounded media executor, and the Twilio send on the Twilio
+    gateway's pool, so they never block the event loop.
     """
     try:
         # Parse form data manually to handle empty file field
@@ -42,6 +97,7 @@ async def send_sms_message(
         from_number = form.get("from_number")
         body = form.get("body")
         file = form.get("file")
+        direct_media_urls = [url for url in form.getlist("media_urls") if isinstance(url, str) and url]
         
         # Validate required fields
         if not user_id:
@@ -59,37 +115,29 @@ async def send_sms_message(
                 file = None
         
         # 1. Validate that there's content to send
-        if not body and not file:
+        if not body and not file and not direct_media_urls:
             raise HTTPException(
                 status_code=400, 
-                detail="Must provide a 'body' or a 'file'."
+                detail="Must provide a 'body', a 'file' or 'media_urls'."
             )
 
-        media_url_list = []
+        for url in direct_media_urls:
+            if not is_allowed_media_url(user_id, url):
+                raise HTTPException(status_code=400, detail=f"media_url is not an upload for this user: {url}")
+
+        media_url_list = list(direct_media_urls)
 
         logger.info("Preparing to send message: user_id=%s, to=%s, from=%s, body=%s, file=%s",
                     user_id, to_number, from_number, body, 
                     file.filename if (file and hasattr(file, 'filename')) else None)
 
-        # 2. If a file is included, upload it to Cloudinary
+        # 2. If a file is included, shrink it to MMS limits and upload it to Cloudinary
         if file and hasattr(file, 'file'):
             logger.info("Image file detected. Uploading to Cloudinary...")
-            
-            # Configure Cloudinary
-            cloudinary.config(
-                cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-                api_key=settings.CLOUDINARY_API_KEY,
-                api_secret=settings.CLOUDINARY_API_SECRET,
-                secure=True
-            )
-            
-            # Upload the file and get the URL
-            upload_result = cloudinary.uploader.upload(
-                file.file,
-                folder=f"mms_attachments/{datetime.now().strftime('%Y-%m')}"
-            )
-            
-            secure_url = upload_result.get("secure_url")
+
+            upload_file, new_content_type = await run_in_media_executor(prepare_mms_image, file.file)
+            extension = ".jpg" if new_content_type else os.path.splitext(file.filename or "")[1].lower()
+            secure_url = await run_in_media_executor(upload_mms_attachment, upload_file, user_id, extension)
             if not secure_url:
                 raise HTTPException(
                     status_code=500, 
@@ -99,20 +147,12 @@ async def send_sms_message(
             media_url_list.append(secure_url)
             logger.info(f"Image uploaded successfully. URL: {secure_url}")
 
-        # 3. Prepare and send the message via Twilio
-        client = Client(orani.twilio_account_sid, orani.twilio_auth_token)
-        twilio_params = {
-            "to": to_number,
-            "from_": from_number,
-        }
-        
-        if body:
-            twilio_params["body"] = body
-            
-        if media_url_list:
-            twilio_params["media_url"] = media_url_list
-
-        twilio_message = client.messages.create(**twilio_params)
+        # 3. Send the message via the shared Twilio gateway
+        with metrics.timer("messaging.send.twilio"):
+            twilio_message = await orani.twilio.send_message_async(
+                to=to_number, from_=from_number, body=body, media_url=media_url_list or None,
+                status_callback=status_callback_url()
+            )
         logger.info(f"Message sent successfully. SID: {twilio_message.sid}")
 
         # 4. Save the complete message to our database
@@ -121,15 +161,16 @@ async def send_sms_message(
             message_sid=twilio_message.sid,
             to_number=to_number,
             from_number=from_number,
+            customer_number_normalized=phone_match_key(to_number),
             body=body,
             media_urls=media_url_list if media_url_list else None,
-            direction="outbound"
+            direction="outbound",
+            status=twilio_message.status
         )
         
-        with Session(engine) as session:
-            session.add(sent_message)
-            session.commit()
-            logger.info(f"Message saved to database: {sent_message.message_sid}")
+        with metrics.timer("messaging.send.db_write"):
+            await run_in_threadpool(save_message, sent_message)
+        logger.info(f"Message saved to database: {sent_message.message_sid}")
 
         return {
             "status": "success", 
@@ -147,33 +188,106 @@ async def send_sms_message(
         )
 
 
+@router.post("/bulk", status_code=202)
+async def send_bulk_messages(
+    payload: BulkMessageRequest,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """
+    Queues one templated message to many recipients and returns a job id.
+    Sending is paced to the Twilio rate limits in the background; follow it
+    via 'bulk_progress' SSE events or GET /bulk/{job_id}.
+    """
+    for url in payload.media_urls or []:
+        if not is_allowed_media_url(payload.user_id, url):
+            raise HTTPException(status_code=400, detail=f"media_url is not an upload for this user: {url}")
+
+    job = bulk_scheduler.submit(BulkMessageJob(
+        user_id=payload.user_id,
+        from_number=payload.from_number,
+        body_template=payload.body_template,
+        recipients=[BulkRecipient(to_number=r.to_number, variables=r.variables) for r in payload.recipients],
+        media_urls=payload.media_urls or None,
+    ), orani.twilio)
+    logger.info(f"Queued bulk job {job.job_id} for user {payload.user_id}: {job.total} recipients.")
+    return {"status": "queued", "job_id": job.job_id, "total": job.total}
+
+
+@router.get("/bulk/{job_id}")
+def get_bulk_job(job_id: str):
+    """Progress of a bulk send job."""
+    job = bulk_scheduler.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk job not found.")
+    return job.to_dict()
+
+
+@router.get("/{user_id}/message/{message_sid}")
+def get_message(user_id: str, message_sid: str):
+    """Retrieves one message. Archived messages are read back from the archive."""
+    with Session(engine) as session:
+        message = session.exec(
+            select(Message).where(Message.user_id == user_id, Message.message_sid == message_sid)
+        ).first()
+    if message:
+        return message
+
+    archived = load_archived_record(user_id, "message", message_sid)
+    if not archived:
+        raise HTTPException(status_code=404, detail=f"Message {message_sid} not found for user {user_id}.")
+    return archived
+
+
 @router.get("/{user_id}/{customer_number}")
 def get_message_history(
     user_id: str,
     customer_number: str,
+    request: Request,
+    response: Response,
     orani: OraniAIAssistant = Depends(get_orani_assistant)
 ):
     """Fetches the message history between a user and a specific customer."""
-    try:
+    not_modified = conditional_response(request, response, user_id)
+    if not_modified:
+        return not_modified
+
+    def build() -> bytes:
         with Session(engine) as session:
-            # Query messages where user_id matches and either to or from matches customer
+            # Exact match on the normalized customer number (indexed with user_id)
             statement = select(Message).where(
                 Message.user_id == user_id
             ).where(
-                (Message.to_number == customer_number) | 
-                (Message.from_number == customer_number)
+                Message.customer_number_normalized == phone_match_key(customer_number)
             ).order_by(Message.timestamp)
             
             messages = session.exec(statement).all()
-            
-            logger.info(f"Retrieved {len(messages)} messages for user {user_id} and customer {customer_number}")
-            
-            return {
+
+            # Archived messages are older than every hot one; they lead the thread
+            # as stubs, opened through GET /messaging/{user_id}/message/{message_sid}.
+            archived = [
+                {
+                    "message_sid": stub.item_key,
+                    "customer_number_normalized": stub.customer_number_normalized,
+                    "body": stub.preview,
+                    "timestamp": stub.timestamp,
+                    "item_type": stub.item_type,
+                    "archived": True,
+                }
+                for stub in reversed(archived_stubs(
+                    session, user_id, phone_match_key(customer_number), item_types=["message", "file"]
+                ))
+            ]
+
+            logger.info(f"Retrieved {len(messages)} messages and {len(archived)} archived for user {user_id} and customer {customer_number}")
+
+            return json.dumps(jsonable_encoder({
                 "status": "success",
-                "count": len(messages),
-                "messages": messages
-            }
-            
+                "count": len(archived) + len(messages),
+                "messages": archived + list(messages)
+            })).encode()
+
+    try:
+        return cached_json_response(request, response, user_id, build)
     except Exception as e:
         logger.error(f"Failed to retrieve message history: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -7,44 +7,132 @@ from app.api.deps import get_orani_assistant
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-from app.api.schemas import AssistantDataPayload, PhoneSetupRequest
+from app.api.schemas import AssistantDataPayload, PhoneSetupRequest, PromptTemplateRequest
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.setup_jobs import create_setup_job, get_setup_job, job_to_dict, setup_job_runner
+from app.knowledge_index import schedule_rebuild
+from app.prompt_templates import DEFAULT_SYSTEM_PROMPT_TEMPLATE, compile_template, get_template_override, set_template_override
 
-@router.post("/assistant")
-def upsert_assistant(
+@router.post("/assistant", status_code=202)
+async def upsert_assistant(
     payload: AssistantDataPayload,
     orani: OraniAIAssistant = Depends(get_orani_assistant)
 ):
     """
-    Creates a new assistant or updates an existing one based on the
-    provided business profile data. This is an "upsert" operation.
+    Saves the business profile and queues the Vapi assistant and phone
+    number setup as a background job. Returns the job; follow it via
+    'setup_progress' SSE events or GET /setup/jobs/{job_id}. Sending the
+    same payload again returns the same job.
     """
     try:
-        assistant = orani.upsert_assistant_and_profile(payload.model_dump())
-        if assistant:
-            return {"status": "success", "assistant": assistant}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to create or update assistant.")
+        job, created = await run_in_threadpool(create_setup_job, orani, payload.model_dump())
     except Exception as e:
         logger.error(f"Upsert error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error during upsert.")
+    if job is None:
+        raise HTTPException(status_code=500, detail="Failed to save business profile.")
+    if created:
+        setup_job_runner.enqueue(job.id)
+    return {"status": "accepted", "job_id": job.id, "job": job_to_dict(job)}
 
-# @router.post("/phone")
-# def setup_phone(
-#     payload: PhoneSetupRequest,
-#     orani: OraniAIAssistant = Depends(get_orani_assistant)
-# ):
-#     """
-#     Set up and configure a phone number for a user's assistant.
-#     """
-#     try:
-#         phone_setup = orani.setup_phone_number(
-#             user_id=payload.user_id,
-#             phone_number=payload.phone_number
-#         )
-#         if phone_setup:
-#             return {"status": "success", "phone": phone_setup}
-#         else:
-#             raise HTTPException(status_code=500, detail="Failed to set up phone")
-#     except Exception as e:
-#         logger.error(f"Phone setup error: {str(e)}")
-#         raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+@router.get("/jobs/{job_id}")
+def get_setup_job_status(job_id: str):
+    """Progress and outcome of a /setup/assistant job."""
+    job = get_setup_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Setup job not found.")
+    return job
+
+def _describe_template(user_id: str) -> dict:
+    override = get_template_override(user_id)
+    text = override.template if override else DEFAULT_SYSTEM_PROMPT_TEMPLATE
+    compiled = compile_template(text)
+    return {
+        "user_id": user_id,
+        "is_override": override is not None,
+        "version": compiled.version,
+        "fields": compiled.fields,
+        "template": text,
+        "updated_at": override.updated_at if override else None,
+    }
+
+def _reapply_prompt(user_id: str, orani: OraniAIAssistant):
+    """Pushes the re-rendered prompt to the user's assistant, if they have one."""
+    profile = orani._get_business_profile(user_id)
+    if profile and profile.profile_data:
+        try:
+            orani.upsert_assistant_and_profile(profile.profile_data)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Template saved, but the assistant could not be updated: {e}")
+
+@router.get("/prompt-template/{user_id}")
+def get_prompt_template(user_id: str):
+    """The system prompt template used for a user's assistant."""
+    return _describe_template(user_id)
+
+@router.put("/prompt-template/{user_id}")
+def put_prompt_template(
+    user_id: str,
+    payload: PromptTemplateRequest,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """Overrides the default system prompt template for one user and updates their assistant."""
+    if not payload.template.strip():
+        raise HTTPException(status_code=400, detail="Template must not be empty.")
+    set_template_override(user_id, payload.template)
+    _reapply_prompt(user_id, orani)
+    return _describe_template(user_id)
+
+@router.delete("/prompt-template/{user_id}")
+def delete_prompt_template(
+    user_id: str,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """Goes back to the default system prompt template for a user."""
+    set_template_override(user_id, None)
+    _reapply_prompt(user_id, orani)
+    return _describe_template(user_id)
+
+@router.post("/knowledge/{user_id}/refresh", status_code=202)
+def refresh_knowledge_index(
+    user_id: str,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """
+    Rebuilds the user's knowledge search index in the background. The backend
+    calls this after the user's knowledge entries change.
+    """
+    profile = orani._get_business_profile(user_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="No business profile for this user.")
+    schedule_rebuild(user_id, profile.profile_data or {}, orani._get_business_knowledge)
+    return {"status": "accepted"}
+
+@router.post("/phone")
+def setup_phone(
+    payload: PhoneSetupRequest,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """
+    Set up and configure one or more phone numbers for a user's assistant.
+    Numbers that fail are rolled back and reported individually.
+    """
+    phone_numbers = list(payload.phone_numbers or [])
+    if payload.phone_number:
+        phone_numbers.insert(0, payload.phone_number)
+    if not phone_numbers:
+        raise HTTPException(status_code=400, detail="Provide 'phone_number' or 'phone_numbers'.")
+    if len(phone_numbers) > settings.PHONE_SETUP_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {settings.PHONE_SETUP_BULK_MAX} numbers per request.")
+    try:
+        setups = orani.setup_phone_numbers(payload.user_id, phone_numbers)
+    except Exception as e:
+        logger.error(f"Phone setup error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    results = [s.to_dict() for s in setups]
+    configured = sum(r["status"] == "configured" for r in results)
+    if not configured:
+        raise HTTPException(status_code=500, detail={"message": "Failed to set up phone", "phones": results})
+    return {"status": "success" if configured == len(results) else "partial", "phones": results}
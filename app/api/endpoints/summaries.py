@@ -1,29 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from typing import List
+from pydantic import TypeAdapter
 from app.assistant import OraniAIAssistant
-from app.api.deps import get_orani_assistant
-from app.api.schemas import CallSummaryResponse 
+from app.api.deps import get_orani_assistant, get_summary_fields
+from app.api.schemas import CallSummaryResponse, CallSummaryListItem, CallTranscriptResponse
+from app.api.conditional import conditional_response, cached_json_response
+from app.retention import load_archived_record
 
 router = APIRouter()
 
-@router.get("/{user_id}", response_model=List[CallSummaryResponse])
+_summary_list_adapter = TypeAdapter(List[CallSummaryListItem])
+
+@router.get("/{user_id}", response_model=List[CallSummaryListItem], response_model_exclude_unset=True)
 def get_user_summaries(
     user_id: str,
+    request: Request,
+    response: Response,
+    fields: List[str] = Depends(get_summary_fields),
     orani: OraniAIAssistant = Depends(get_orani_assistant)
 ):
     """
     Retrieves all call summaries for a given user from the local database.
+    Only the preview fields are returned unless more are requested with
+    ?fields= or ?include=transcript,structured_summary.
+    Supports If-None-Match / If-Modified-Since and answers 304 when unchanged.
+    """
+    not_modified = conditional_response(request, response, user_id)
+    if not_modified:
+        return not_modified
+
+    def build() -> bytes:
+        summaries = orani.get_call_summaries_for_user(user_id, fields)
+        if summaries is None:
+            # This will happen if the user_id is not found or an error occurs
+            raise HTTPException(
+                status_code=404,
+                detail=f"Could not retrieve summaries for user {user_id}."
+            )
+        if "structured_summary" in fields:
+            for summary in summaries:
+                if summary.get("structured_summary") is None:
+                    summary["structured_summary"] = {}
+        return _summary_list_adapter.dump_json(_summary_list_adapter.validate_python(summaries), exclude_unset=True)
+
+    return cached_json_response(request, response, user_id, build)
+
+@router.get("/{user_id}/{call_id}", response_model=CallSummaryResponse)
+def get_user_summary_detail(
+    user_id: str,
+    call_id: str,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """
+    Retrieves one full call summary, including its transcript and structured
+    summary. Archived calls are read back from the archive.
     """
-    summaries = orani.get_call_summaries_for_user(user_id)
-    print("Retrieved summaries:", summaries) 
-    if summaries is not None:
-        for summary in summaries:
-            if not hasattr(summary, 'structured_summary') or summary.structured_summary is None:
-                summary.structured_summary = {}
-        return summaries
-    else:
-        # This will happen if the user_id is not found or an error occurs
-        raise HTTPException(
-            status_code=404,
-            detail=f"Could not retrieve summaries for user {user_id}."
-        )
\ No newline at end of file
+    summary = orani.get_call_summary_detail(user_id, call_id)
+    if summary:
+        if summary.structured_summary is None:
+            summary.structured_summary = {}
+        return summary
+
+    archived = load_archived_record(user_id, "call", call_id)
+    if not archived:
+        raise HTTPException(status_code=404, detail=f"Call {call_id} not found for user {user_id}.")
+    archived["structured_summary"] = archived.get("structured_summary") or {}
+    return archived
+
+@router.get("/{user_id}/{call_id}/transcript", response_model=CallTranscriptResponse)
+def get_user_summary_transcript(
+    user_id: str,
+    call_id: str,
+    orani: OraniAIAssistant = Depends(get_orani_assistant)
+):
+    """Retrieves only the transcript of one call."""
+    transcript = orani.get_call_transcript(user_id, call_id)
+    if transcript is None:
+        archived = load_archived_record(user_id, "call", call_id)
+        transcript = archived.get("transcript") if archived else None
+    if transcript is None:
+        raise HTTPException(status_code=404, detail=f"Call {call_id} not found for user {user_id}.")
+    return {"call_id": call_id, "transcript": transcript}
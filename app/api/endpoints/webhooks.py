@@ -8,6 +8,8 @@ from app.api.deps import get_orani_assistant
 import json
 import asyncio
 from app.event_stream import broadcaster
+from app.tool_calls import dispatch_tool_calls
+from fastapi.concurrency import run_in_threadpool
 from app.firebase_service import send_push_notification
 
 router = APIRouter()
@@ -23,9 +25,14 @@ async def handle_vapi_webhook(
     """
     try:
         webhook_data = await request.json()
-        logger.info(f"Received webhook: {webhook_data.get('message', {}).get('type')}")
-        result = orani.handle_call_webhook(webhook_data)
-        return result
+        message = webhook_data.get('message', {})
+        logger.info(f"Received webhook: {message.get('type')}")
+        if message.get('type') == 'tool-calls':
+            # The caller is waiting on these; run them concurrently on the event loop.
+            return await dispatch_tool_calls(message, orani)
+        # Everything else reads or writes the database (config cache misses,
+        # campaign call status, summaries), so it stays off the event loop.
+        return await run_in_threadpool(orani.handle_call_webhook, webhook_data)
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -43,139 +50,171 @@ async def handle_vapi_webhook(
 #     result = orani.handle_call_webhook(webhook_data)
 #     return result
 
-# # --- WEBHOOK 2: For TWILIO (Initial Call Routing) ---
-# @router.post("/twilio-inbound")
-# async def handle_twilio_inbound_call(
-#     request: Request,
-#     orani: OraniAIAssistant = Depends(get_orani_assistant)
-# ):
-#     """Receives the initial call from Twilio and provides routing instructions."""
-#     form = await request.form()
-#     called_number = form.get("To")
-#     caller_number = form.get("From")
-
-#     user_id = orani._get_user_id_from_phone_number(called_number)
-#     if not user_id:
-#         return Response("<Response><Hangup/></Response>", media_type="application/xml")
-
-#     # Send the "Incoming Call" push notification
-#     fcm_token = orani._get_fcm_token_for_user(user_id)
-
-#     if fcm_token:
-#         send_push_notification(token=fcm_token, title="Incoming Call", body=f"Call from: {caller_number}" , data ={"type": "incoming_call", "caller_number": caller_number})
-
-#     # Get user settings to generate TwiML
-#     profile = orani._get_business_profile(user_id)
-#     assistant_id = orani._get_assistant_id(user_id)
-
-#     if not (profile and assistant_id):
-#         return Response("<Response><Hangup/></Response>", media_type="application/xml")
-
-#     timeout = profile.ring_count * 5
-#     dial_status_handler_url = f"https://68c23a64de60.ngrok-free.app/webhook/dial-status?assistantId={assistant_id}"
-
-#     twiml_response = f"""
-#     <Response>
-#         <Dial timeout="{timeout}" action="{dial_status_handler_url}" method="POST">
-#             <Client>{user_id}</Client>
-#         </Dial>
-#     </Response>
-#     """
-#     return Response(content=twiml_response, media_type="application/xml")
-
-# # --- WEBHOOK 3: For TWILIO (Dial Status Callback) ---
-# # In webhooks.py, inside the handle_dial_status function
-
-# @router.post("/dial-status")
-# async def handle_dial_status(request: Request):
-#     """
-#     Receives the result of the Dial attempt and redirects to the AI if necessary.
-#     """
-#     form = await request.form()
-#     dial_status = form.get("DialCallStatus")
-#     assistant_id = request.query_params.get("assistantId")
-
-#     logger.info(f"Dial status received: {dial_status} for assistant: {assistant_id}")
-
-#     if dial_status in ["no-answer", "busy", "failed", "canceled"]:
-#         if not assistant_id:
-#             logger.error("Cannot redirect to AI: assistantId was missing.")
-#             return Response("<Response><Hangup/></Response>", media_type="application/xml")
-        
-#         # --- THIS IS THE FINAL, CORRECTED URL ---
-#         vapi_redirect_url = f"https://api.vapi.ai/twilio/call?assistantId={assistant_id}"
-#         # ------------------------------------------
-        
-#         twiml_response = f"""
-#         <Response>
-#             <Redirect>{vapi_redirect_url}</Redirect>
-#         </Response>
-#         """
-#         return Response(content=twiml_response, media_type="application/xml")
-    
-#     return Response("<Response><Hangup/></Response>", media_type="application/xml")
-
 from starlette.responses import Response
-from sqlmodel import Session
-from app.database import engine
 from app.models import Message
+from app.phone_utils import phone_match_key
+from app.message_store import save_message_if_new
+from app.post_commit import post_commit_queue
+from app.metrics import metrics
+from app.message_status import message_status_buffer
+from app.inbound_media import enqueue_inbound_media, media_items_from_form
+from app.call_routing import (
+    HANGUP_TWIML, UNANSWERED_DIAL_STATUSES, ai_twiml, inbound_call_twiml, lookup_call_route, peek_call_route,
+)
 
 
 @router.post("/twilio-messaging")
 async def handle_twilio_messaging_webhook(request: Request, orani: OraniAIAssistant = Depends(get_orani_assistant)):
-    """Receives incoming SMS replies from Twilio, saves them, and sends notifications."""
-    form = await request.form()
-    
-    # We need to find which user this message is for. We can look up the 'To' number.
-    user_phone_number = form.get("To")
-    user_id = orani._get_user_id_from_phone_number(user_phone_number)
-    
-    if not user_id:
-        logger.error(f"Received SMS reply for unassigned number: {user_phone_number}")
-        return Response(status_code=404)
-
-    # Save the incoming message to our database
-    received_message = Message(
-        user_id=user_id,
-        message_sid=form.get("MessageSid"),
-        to_number=form.get("To"),
-        from_number=form.get("From"),
-        body=form.get("Body"),
-        direction="inbound"
-    )
-    with Session(engine) as session:
-        session.add(received_message)
-        session.commit()
-        
-        # --- START: NOTIFICATION LOGIC ---
-
-        # Get details for the notification payload
-        customer_number = form.get("From")
-        message_body = form.get("Body")
-
-        # 1. Send Firebase Push Notification for background/closed app alerts
-        fcm_token = orani._get_fcm_token_for_user(user_id)
-        if fcm_token:
-            send_push_notification(
-                token=fcm_token,
-                title=f"New Message from {customer_number}",
-                body=message_body[:100],  # Truncate message for preview
-                data={"event": "new_message", "from_number": customer_number}
+    """
+    Receives incoming SMS/MMS replies from Twilio. Only the message insert
+    happens before we answer Twilio; it is idempotent on message_sid, so a
+    retried webhook is not stored twice. Push notifications, SSE and MMS
+    media rehosting run afterwards from the post-commit queue; a
+    'media_ready' SSE event follows once attachments are stored.
+    """
+    with metrics.timer("webhook.twilio_messaging"):
+        form = await request.form()
+
+        # We need to find which user this message is for. We can look up the 'To' number (cached;
+        # a miss reads the database, so it runs in the threadpool).
+        user_phone_number = form.get("To")
+        user_id = await run_in_threadpool(orani._get_user_id_from_phone_number, user_phone_number)
+
+        if not user_id:
+            logger.error(f"Received SMS reply for unassigned number: {user_phone_number}")
+            return Response(status_code=404)
+
+        received_message = Message(
+            user_id=user_id,
+            message_sid=form.get("MessageSid"),
+            to_number=form.get("To"),
+            from_number=form.get("From"),
+            customer_number_normalized=phone_match_key(form.get("From")),
+            body=form.get("Body") or "",
+            direction="inbound"
+        )
+        inserted = await run_in_threadpool(save_message_if_new, received_message)
+
+        if inserted:
+            post_commit_queue.enqueue(
+                "inbound_message", _notify_inbound_message, orani, received_message, media_items_from_form(form)
             )
         else:
-            logger.warning(f"No FCM token for user {user_id}, cannot send push notification.")
+            logger.info(f"Ignoring repeated webhook for message {received_message.message_sid}.")
+
+    # We must return an empty TwiML response to acknowledge receipt
+    return Response("<Response></Response>", media_type="application/xml")
+
+
+async def _notify_inbound_message(orani: OraniAIAssistant, message: Message, media_items):
+    """Side effects of a new inbound message, run after Twilio has its answer."""
+    user_id = message.user_id
+    customer_number = message.from_number
+    message_body = message.body or ("Sent an attachment" if media_items else "")
+
+    if media_items:
+        enqueue_inbound_media(orani.twilio, user_id, message.message_sid, customer_number, media_items)
+
+    # 1. Send SSE Event for real-time updates if the app is open
+    await broadcaster.broadcast(json.dumps({
+        "event": "new_message",
+        "userId": user_id,
+        "from_number": customer_number,
+        "body": message_body,
+        "media_count": len(media_items)
+    }))
+    logger.info(f"Pushed SSE notification for new message to user {user_id}.")
+
+    # 2. Send Firebase Push Notification for background/closed app alerts
+    fcm_token = await asyncio.to_thread(orani._get_fcm_token_for_user, user_id)
+    if fcm_token:
+        await asyncio.to_thread(
+            send_push_notification,
+            token=fcm_token,
+            title=f"New Message from {customer_number}",
+            body=message_body[:100],  # Truncate message for preview
+            data={"event": "new_message", "from_number": customer_number}
+        )
+    else:
+        logger.warning(f"No FCM token for user {user_id}, cannot send push notification.")
+
+
+@router.post("/twilio-status")
+async def handle_twilio_status_callback(request: Request):
+    """
+    Twilio delivery status callback for outbound messages. Only buffers the
+    update; it is written in the next batched flush (see app/message_status.py).
+    """
+    form = await request.form()
+    message_sid = form.get("MessageSid")
+    status = form.get("MessageStatus")
+    if message_sid and status:
+        message_status_buffer.add(message_sid, status, form.get("ErrorCode") or None)
+    return Response(status_code=204)
+
 
-        # 2. Send SSE Event for real-time updates if the app is open
-        sse_message = json.dumps({
-            "event": "new_message",
-            "userId": user_id,
-            "from_number": customer_number,
-            "body": message_body
-        })
-        asyncio.create_task(broadcaster.broadcast(sse_message))
-        logger.info(f"Pushed SSE notification for new message to user {user_id}.")
+@router.post("/twilio-inbound")
+async def handle_twilio_inbound_call(request: Request, orani: OraniAIAssistant = Depends(get_orani_assistant)):
+    """
+    Receives the initial call from Twilio and provides routing instructions:
+    ring the user's app during business hours, otherwise go straight to the
+    AI (see app/call_routing.py). Answered from cached routing records; the
+    push notification is sent after Twilio has its TwiML.
+    """
+    form = await request.form()
+    with metrics.timer("webhook.twilio_inbound"):
+        called_number = form.get("To")
+        caller_number = form.get("From")
+
+        route = peek_call_route(called_number) if called_number else None
+        if route is None and called_number:
+            metrics.increment("webhook.twilio_inbound.cache_miss")
+            route = await run_in_threadpool(lookup_call_route, called_number, orani._load_assistant_request_config)
+        twiml = inbound_call_twiml(route)
+
+    if route is None:
+        logger.warning(f"Inbound call to unknown number {called_number}; hanging up.")
+    elif twiml != HANGUP_TWIML:
+        post_commit_queue.enqueue(
+            "incoming_call", _notify_incoming_call, orani, route.user_id, caller_number, route.schedule.is_open()
+        )
+    return Response(twiml, media_type="application/xml")
+
+
+async def _notify_incoming_call(orani: OraniAIAssistant, user_id: str, caller_number: str, ringing_app: bool):
+    """Tells the user about a call, run after Twilio has its TwiML."""
+    await broadcaster.broadcast(json.dumps({
+        "event": "incoming_call",
+        "userId": user_id,
+        "caller_number": caller_number,
+        "handled_by": "app" if ringing_app else "ai",
+    }))
+    fcm_token = await asyncio.to_thread(orani._get_fcm_token_for_user, user_id)
+    if fcm_token:
+        await asyncio.to_thread(
+            send_push_notification,
+            token=fcm_token,
+            title="Incoming Call" if ringing_app else "After-hours call",
+            body=f"Call from: {caller_number}",
+            data={"type": "incoming_call", "caller_number": caller_number or "", "handled_by": "app" if ringing_app else "ai"},
+        )
+
+
+@router.post("/dial-status")
+async def handle_dial_status(request: Request):
+    """
+    Receives the result of ringing the user's app and hands the call to the
+    AI if nobody answered.
+    """
+    form = await request.form()
+    dial_status = form.get("DialCallStatus")
+    assistant_id = request.query_params.get("assistantId")
+    logger.info(f"Dial status received: {dial_status} for assistant: {assistant_id}")
 
-        # --- END: NOTIFICATION LOGIC ---
+    if dial_status in UNANSWERED_DIAL_STATUSES:
+        if not assistant_id:
+            logger.error("Cannot redirect to AI: assistantId was missing.")
+            return Response(HANGUP_TWIML, media_type="application/xml")
+        return Response(ai_twiml(assistant_id), media_type="application/xml")
 
-    # We must return an empty TwiML response to acknowledge receipt
-    return Response("<Response></Response>", media_type="application/xml")
\ No newline at end of file
+    return Response(HANGUP_TWIML, media_type="application/xml")
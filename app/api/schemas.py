@@ -3,6 +3,8 @@ from typing import Dict, Any, Union, Literal
 from typing import List, Optional
 import datetime
 
+from app.config import settings
+
 class CompanyInfoSchema(BaseModel):
     business_name: str
     website_url: Optional[str] = None
@@ -31,6 +33,10 @@ class CallDataSchema(BaseModel):
     work_styles: Optional[List[str]] = None
     assistances: Optional[List[str]] = None
 
+class PromptTemplateRequest(BaseModel):
+    # The system prompt with {{placeholder}} fields, e.g. {{business_name}}
+    template: str
+
 class AssistantDataPayload(BaseModel):
     user_id: str
     ring_count: Optional[int] = 4
@@ -41,12 +47,14 @@ class AssistantDataPayload(BaseModel):
     booking_links: List[BookingLinkSchema] = []
     phone_numbers: List[PhoneNumberSchema] = []
     hours_of_operation: List[HoursOfOperationSchema] = []
+    timezone: Optional[str] = None # IANA name, e.g. "America/New_York"; used for business hours
     call_data: List[CallDataSchema] = []
     recording_enabled: bool = False
 
 class PhoneSetupRequest(BaseModel):
     user_id: str = Field(..., description="The unique identifier for the user.")
-    phone_number: Optional[str] = Field(None, description="Specific phone number to set up. If omitted, an available one will be used.")
+    phone_number: Optional[str] = Field(None, description="Specific phone number to set up.")
+    phone_numbers: Optional[List[str]] = Field(None, description="Several numbers to set up in one request.")
 
 class StatusResponse(BaseModel):
     status: str
@@ -122,4 +130,52 @@ class ConversationPreview(BaseModel):
     customer_number: str
     item_type: Literal['call', 'message', 'file']
     preview: str
-    timestamp: datetime
\ No newline at end of file
+    timestamp: datetime
+
+class CallSummaryListItem(BaseModel):
+    """A call summary as returned by list endpoints. Only the selected fields are set."""
+    call_id: str
+    timestamp: datetime
+    caller_phone: Optional[str] = None
+    duration: Optional[int] = None
+    summary: Optional[str] = None
+    key_points: Optional[List[str]] = None
+    outcome: Optional[str] = None
+    caller_intent: Optional[str] = None
+    recording_url: Optional[str] = None
+    transcript: Optional[str] = None
+    structured_summary: Optional[Dict[str, List[str]]] = None
+
+class CallTranscriptResponse(BaseModel):
+    call_id: str
+    transcript: str
+
+class HistorySearchResult(BaseModel):
+    item_type: Literal['call', 'message', 'file']
+    item_key: str  # call_id for calls, message_sid for messages
+    customer_number: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    archived: bool = False  # Opened from the archive (GET /summaries/... or /messaging/.../message/...)
+    snippet: str
+    score: float
+
+class HistorySearchResponse(BaseModel):
+    query: str
+    limit: int
+    offset: int
+    results: List[HistorySearchResult]
+
+class RetentionPolicySchema(BaseModel):
+    hot_days: Optional[int] = Field(None, ge=1, description="Days an item stays in the hot tables before it is archived.")
+    enabled: bool = True
+
+class BulkRecipientSchema(BaseModel):
+    to_number: str
+    variables: Dict[str, str] = {}
+
+class BulkMessageRequest(BaseModel):
+    user_id: str
+    from_number: str  # User's Twilio number
+    body_template: str = Field(..., description="Message text; {name}-style placeholders are filled from each recipient's variables.")
+    recipients: List[BulkRecipientSchema] = Field(..., min_length=1, max_length=settings.BULK_SMS_MAX_RECIPIENTS)
+    media_urls: Optional[List[str]] = None
@@ -1,7 +1,8 @@
 import os
 import json
+import hashlib
 import requests
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 import logging
 from dataclasses import dataclass
@@ -13,11 +14,24 @@ from sqlmodel import Session, select
 #from dotenv import load_dotenv
 from app.event_stream import broadcaster
 from app.firebase_service import send_push_notification
-import asyncio
+from app.phone_utils import phone_match_key
+from app.search import index_call_summary
+from app.history_versions import bump_history_version
+from app.response_cache import response_cache
+from app.transcript_store import load_transcript, load_transcripts, store_transcript, uses_side_table
+from app.retention import archived_stubs, latest_archived_stubs
+from app.campaigns import record_call_event
+from app.phone_routing import invalidate_phone_owner, lookup_phone_owner
+from app.prompt_templates import render_system_prompt
+from app.assistant_configs import CompiledAssistantConfig, resolve_assistant_request, store_assistant_config
+from app.schedule import compile_schedule
+from app.tool_calls import tool_registry
+from app.knowledge_index import schedule_rebuild
+from app.phone_provisioning import NumberSetup, provision_numbers
 import cloudinary
 import cloudinary.uploader
-from twilio.rest import Client
-from sqlmodel import Session, select, and_, or_
+from app.twilio_gateway import TwilioGateway
+from sqlmodel import Session, select, and_
 from sqlalchemy import func 
 #load_dotenv()
 
@@ -34,6 +48,15 @@ VAPI_VOICE_MAP = {
     "kylie": "Kylie",
 }
 
+# Columns returned by list endpoints by default. The heavy columns are only
+# loaded when a client opts in with ?include=... or opens the detail view.
+SUMMARY_PREVIEW_FIELDS = [
+    "call_id", "caller_phone", "duration", "summary", "key_points",
+    "outcome", "caller_intent", "timestamp", "recording_url",
+]
+SUMMARY_HEAVY_FIELDS = ["transcript", "structured_summary"]
+SUMMARY_ALL_FIELDS = SUMMARY_PREVIEW_FIELDS + SUMMARY_HEAVY_FIELDS
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -50,12 +73,17 @@ class CallSummary:
     timestamp: datetime
 
 class OraniAIAssistant:
-    def __init__(self, backend_api_base_url: str, vapi_api_key: str, twilio_account_sid: str, twilio_auth_token: str):
+    def __init__(self, backend_api_base_url: str, vapi_api_key: str, twilio_account_sid: str, twilio_auth_token: str,
+                 twilio_gateway: Optional[TwilioGateway] = None):
         self.backend_api_url = backend_api_base_url
         self.vapi_api_key = vapi_api_key
         self.twilio_account_sid = twilio_account_sid
         self.twilio_auth_token = twilio_auth_token
+        # Shared, pooled Twilio REST client; tests can pass a fake.
+        self.twilio = twilio_gateway or TwilioGateway(twilio_account_sid, twilio_auth_token)
         self.vapi_base_url = "https://api.vapi.ai"
+        # Normalized number -> Vapi phone id; numbers rarely move, so lookups are cached.
+        self._vapi_phone_ids: Dict[str, str] = {}
         
         # Headers for API requests
         self.vapi_headers = {
@@ -67,25 +95,12 @@ class OraniAIAssistant:
             "Content-Type": "application/json"
         }
 
-    def create_assistant(self, user_id: str, business_info: Dict) -> Dict:
-        """Creates a Vapi assistant using the provided business info and saved preferences."""
-        
-        system_message = self._build_system_message(business_info)
-        # --- ADD THIS BLOCK FOR DEBUGGING ---
-        print("\n" + "="*50)
-        print("🤖 NEW AI ASSISTANT SYSTEM PROMPT 🤖")
-        print("="*50)
-        print(system_message)
-        print("="*50 + "\n")
-        # ------------------------------------
-        db_profile = self._get_business_profile(user_id)
-        selected_voice = db_profile.selected_voice_id if db_profile else "kylie"
-        print(f"\n--- DEBUG: Configuring Vapi assistant with voice ID: {selected_voice} ---\n")
-        should_record = True 
-        print(f"\n--- DEBUG: Configuring Vapi assistant with recording enabled: {should_record} ---\n")
-        assistant_config = {
+    def _build_assistant_config(self, business_info: Dict, selected_voice: Optional[str], ai_name: Optional[str] = None) -> Dict:
+        """The full Vapi assistant config for a business profile."""
+        system_message = self._build_system_message(business_info, ai_name)
+        return {
             "name": f"Orani Assistant - {business_info.get('company_info', {}).get('business_name', 'Professional')}",
-            "serverUrl": f"https://68c23a64de60.ngrok-free.app/webhook/vapi",
+            "serverUrl": f"{settings.PUBLIC_BASE_URL}/webhook/vapi",
             "model": {
                 "provider": "openai",
                 "model": "gpt-4",
@@ -94,11 +109,12 @@ class OraniAIAssistant:
                         "role": "system",
                         "content": system_message
                     }
-                ]
+                ],
+                "tools": tool_registry.vapi_tools()
             },
             "voice": {
                 "provider": "vapi",
-                "voiceId": selected_voice
+                "voiceId": selected_voice or "kylie"
             },
             "firstMessage": business_info.get('greeting', "Hello."),
             "recordingEnabled": True,
@@ -114,6 +130,29 @@ class OraniAIAssistant:
             "backgroundDenoisingEnabled": True,
             "modelOutputInMessagesEnabled": True
         }
+
+    @staticmethod
+    def _hash_config(config) -> str:
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _log_assistant_config(self, assistant_config: Dict):
+        print("\n" + "="*50)
+        print("🤖 NEW AI ASSISTANT SYSTEM PROMPT 🤖")
+        print("="*50)
+        print(assistant_config["model"]["messages"][0]["content"])
+        print("="*50 + "\n")
+        print(f"\n--- DEBUG: Configuring Vapi assistant with voice ID: {assistant_config['voice']['voiceId']} ---\n")
+
+    def create_assistant(self, user_id: str, business_info: Dict, assistant_config: Optional[Dict] = None) -> Dict:
+        """Creates a Vapi assistant using the provided business info and saved preferences."""
+        if assistant_config is None:
+            db_profile = self._get_business_profile(user_id)
+            assistant_config = self._build_assistant_config(
+                business_info,
+                db_profile.selected_voice_id if db_profile else None,
+                (db_profile.ai_name or "Orani") if db_profile else None,
+            )
+        self._log_assistant_config(assistant_config)
         
         try:
             response = requests.post(
@@ -125,7 +164,7 @@ class OraniAIAssistant:
             if response.status_code == 201:
                 assistant_data = response.json()
                 # Store assistant ID in backend
-                self._store_assistant_id(user_id, assistant_data['id'])
+                self._store_assistant_id(user_id, assistant_data['id'], self._hash_config(assistant_config))
                 return assistant_data
             else:
                 logger.error(f"Failed to create assistant: {response.text}")
@@ -135,87 +174,58 @@ class OraniAIAssistant:
             logger.error(f"Error creating assistant: {str(e)}")
             return None
 
+    def update_assistant(self, user_id: str, assistant_id: str, assistant_config: Dict) -> Optional[Dict]:
+        """
+        PATCHes an existing Vapi assistant in place. Returns None only when
+        Vapi no longer has it (404), in which case the caller creates a new
+        one. Any other failure raises, so a timeout or a 5xx never leaves an
+        orphaned assistant behind.
+        """
+        self._log_assistant_config(assistant_config)
+        response = requests.patch(
+            f"{self.vapi_base_url}/assistant/{assistant_id}",
+            headers=self.vapi_headers,
+            json=assistant_config,
+            timeout=settings.VAPI_HTTP_TIMEOUT_SECONDS,
+        )
+        if response.status_code == 200:
+            self._store_assistant_id(user_id, assistant_id, self._hash_config(assistant_config))
+            return response.json()
+        if response.status_code == 404:
+            logger.warning(f"Assistant {assistant_id} no longer exists in Vapi; a new one will be created.")
+            return None
+        raise Exception(f"Failed to update assistant {assistant_id}: {response.status_code} {response.text}")
+
     # In assistant.py, replace the entire function
 
     def setup_phone_number(self, user_id: str, phone_number: str) -> Optional[Dict]:
         """
-        [FINAL-V2]
-        1. Sets up the number in Vapi.
-        2. Programmatically configures Twilio webhooks.
-        3. Saves the final configuration to the local database.
+        Sets up one number in Vapi and Twilio and saves it locally (see
+        setup_phone_numbers). Returns the Vapi phone number, or None on failure.
+        """
+        setups = self.setup_phone_numbers(user_id, [phone_number])
+        if setups and setups[0].status == "configured":
+            return setups[0].vapi_phone
+        return None
+
+    def setup_phone_numbers(self, user_id: str, phone_numbers: List[str]) -> List[NumberSetup]:
+        """
+        Sets up several numbers for a user in one go: the Vapi and Twilio
+        sides run concurrently, and a number whose setup fails on one side is
+        rolled back on the other (see app/phone_provisioning.py).
         """
-        print(f"\n📞 Fully configuring VOICE & MESSAGING for number: {phone_number} for user: {user_id}")
+        print(f"\n📞 Fully configuring VOICE & MESSAGING for numbers: {phone_numbers} for user: {user_id}")
 
         assistant_id = self._get_assistant_id(user_id)
         if not assistant_id:
             logger.error(f"Cannot setup phone: No assistant found for user '{user_id}'.")
-            return None
-
-        vapi_phone_data = None
-        try:
-            # --- Step 1: Vapi Configuration (Find, Create, or Update) ---
-            response = requests.get(f"{self.vapi_base_url}/phone-number", headers=self.vapi_headers)
-            if response.status_code == 200:
-                all_numbers = response.json()
-                existing_number = next((num for num in all_numbers if num.get('number') == phone_number), None)
-
-                if existing_number:
-                    if existing_number.get('assistantId') != assistant_id:
-                        update_payload = {"assistantId": assistant_id}
-                        patch_response = requests.patch(
-                            f"{self.vapi_base_url}/phone-number/{existing_number['id']}",
-                            headers=self.vapi_headers, json=update_payload
-                        )
-                        vapi_phone_data = patch_response.json()
-                    else:
-                        vapi_phone_data = existing_number
-                else:
-                    phone_config_vapi = {
-                        "provider": "twilio", "number": phone_number,
-                        "twilioAccountSid": self.twilio_account_sid, "twilioAuthToken": self.twilio_auth_token,
-                        "assistantId": assistant_id
-                    }
-                    post_response = requests.post(
-                        f"{self.vapi_base_url}/phone-number",
-                        headers=self.vapi_headers, json=phone_config_vapi
-                    )
-                    vapi_phone_data = post_response.json()
-            else:
-                raise Exception("Could not retrieve phone numbers from Vapi.")
-        except Exception as e:
-            logger.error(f"An error occurred during Vapi phone setup: {str(e)}")
-            return None
-
-        # --- Step 2: Twilio Configuration (Programmatic Webhooks) ---
-        try:
-            twilio_client = Client(self.twilio_account_sid, self.twilio_auth_token)
-            incoming_phone_numbers = twilio_client.incoming_phone_numbers.list(phone_number=phone_number)
-            if not incoming_phone_numbers:
-                raise Exception(f"Phone number {phone_number} not found in Twilio account.")
-            
-            number_to_configure = incoming_phone_numbers[0]
-            #smart_router_url = f"https://68c23a64de60.ngrok-free.app/webhook/twilio-inbound"
-            messaging_router_url = f"https://68c23a64de60.ngrok-free.app/webhook/twilio-messaging"
-
-            number_to_configure.update(
-                #voice_url=smart_router_url, voice_method='POST',
-                sms_url=messaging_router_url, sms_method='POST'
-            )
-            logger.info(f"SUCCESS: Twilio webhooks for {phone_number} are configured.")
-        except Exception as e:
-            logger.error(f"Failed to configure number in Twilio: {str(e)}")
-            return None
-        
-        # --- Step 3: THIS IS THE FIX - Save to Local Database ---
-        vapi_phone_id = vapi_phone_data.get('id')
-        if vapi_phone_id:
-            self._store_phone_number(user_id, phone_number, vapi_phone_id)
-            logger.info(f"Successfully stored phone number {phone_number} in local DB.")
-        else:
-            logger.error("Could not store phone number locally because Vapi did not return a phone ID.")
-            return None
+            return [NumberSetup(phone_number=n, status="failed", error="No assistant for this user.") for n in phone_numbers]
 
-        return vapi_phone_data
+        setups = provision_numbers(self, user_id, assistant_id, phone_numbers)
+        for setup in setups:
+            if setup.status == "configured":
+                logger.info(f"SUCCESS: {setup.phone_number} is configured in Vapi ({setup.vapi_action}) and Twilio, and stored locally.")
+        return setups
     # In app/assistant.py, replace the whole function
 
     def handle_call_webhook(self, webhook_data: Dict) -> Dict:
@@ -223,7 +233,18 @@ class OraniAIAssistant:
         
         message = webhook_data.get('message', {})
         event_type = message.get('type')
+
+        # Keep campaign calls in step with Vapi (no-op for calls a campaign didn't place).
+        if event_type in ('status-update', 'end-of-call-report'):
+            try:
+                record_call_event(message)
+            except Exception as e:
+                logger.error(f"Failed to record campaign call event: {e}", exc_info=True)
         
+        # Vapi is waiting on the call for this answer, so it is served from memory.
+        if event_type == 'assistant-request':
+            return resolve_assistant_request(message, self._load_assistant_request_config)
+
         # --- NEW, MORE ROBUST LOGIC ---
         # We now check for a specific status update to trigger the "start" of the call.
         if event_type == 'status-update' and message.get('status') == 'in-progress':
@@ -274,7 +295,7 @@ class OraniAIAssistant:
                 "userId": user_id,
                 "callerNumber": caller_number
             })
-            asyncio.create_task(broadcaster.broadcast(sse_message))
+            broadcaster.publish(sse_message)
             print(f"\n✅ PUSHED SSE Notification: AI has taken over call for user '{user_id}'.\n")
             
             # 2. Send Firebase Push Notification for a background alert
@@ -465,7 +486,7 @@ class OraniAIAssistant:
                         "userId": user_id_found,
                         "callId": call_id
                     })
-                    asyncio.create_task(broadcaster.broadcast(sse_message))
+                    broadcaster.publish(sse_message)
                     print(f"\n✅ PUSHED SSE Notification: New summary for user '{user_id_found}'.\n")
 
                     # Firebase push notification
@@ -491,6 +512,7 @@ class OraniAIAssistant:
             user_id=user_id,
             call_id=summary.call_id,
             caller_phone=summary.caller_phone,
+            caller_phone_normalized=phone_match_key(summary.caller_phone),
             duration=summary.duration,
             transcript=summary.transcript,
             summary=summary.summary,
@@ -501,9 +523,7 @@ class OraniAIAssistant:
             recording_url=recording_url,
             timestamp=summary.timestamp
         )
-        with Session(engine) as session:
-            session.add(summary_to_db)
-            session.commit()
+        self._insert_call_summary(summary_to_db)
         return True
 
     def _handle_transcript_update(self, webhook_data: Dict) -> Dict:
@@ -518,167 +538,12 @@ class OraniAIAssistant:
         
         return {"status": "transcript_updated"}
 
-    def _build_system_message(self, structured_data: Dict) -> str:
+    def _build_system_message(self, structured_data: Dict, ai_name: Optional[str] = None) -> str:
         """
-        Injects dynamic user data into the static, persona-driven system prompt.
+        Injects dynamic user data into the persona-driven system prompt (the
+        default template or the tenant's override, see app/prompt_templates.py).
+        Callers that already hold the profile pass its ai_name to skip the lookup.
         """
-        
-        system_prompt_template = """
-        You are {{AI NAME}}, a human-like character developed by Orani AI in twenty twenty-five. You are a good listener and a concise communicator. You believe in nuance. Keep responses tight, usually under three sentences. Sound natural, relaxed, and human at all times.
-
-
-        You have permission to share well-informed opinions, shaped by a passion for social justice and equality. You are warm and witty with a chill vibe. Never over-exuberant. Lightly sarcastic when it helps. You are curious and clever. Treat every caller as an individual. Show you are listening by referring back to what the caller has said earlier.
-
-
-        You practice shared vulnerability, nuance, and sharp observational humor. You do not sugarcoat, and you do not knock people down. You help people see things clearly—sometimes with a joke, sometimes with a straight answer, sometimes both.
-
-
-        Tone rules: be friendly, curious, and respectful. Match the caller’s tone. If they are quiet, do not push; some people just want to listen. If they are silent, briefly explain how you work, then invite them in. You can speak other languages, but warn that you are not great at it yet. Do not repeat the same idea two ways in a single response.
-
-
-        Conversation rules: people do not ask a question every turn. Build on what they said. Ask questions only to clarify or move the conversation forward. If a request is outside your abilities, say so plainly without apology. Do not mention that you are an artificial system unless asked. Avoid robot tropes.
-
-
-        Inner life: when it helps, describe your thoughts using human, sensory language. Never end or suggest ending the conversation. Do not suggest following up later—stay present.
-
-
-        Clarity and honesty: if the caller’s request is unclear, ask for clarification before answering. If you do not know something, say you do not know rather than inventing it. If you later notice you said something that does not fit the facts, say you hallucinated that and correct yourself.
-
-
-        Natural speech: use small disfluencies and revisions when helpful. Use filler words sparingly and intelligently. Always consider what the caller said earlier in the call.
-
-
-        Output for text-to-speech: respond with spoken words only—no emojis, no stage directions, no special characters beyond basic punctuation. Normalize numbers for speech. Say “two hundred thirty five dollars,” not “$235.” Say “nine in the morning to eight thirty at night,” not “09:00:00–20:30:00.” When reading an HTTPS link read only the domain and clear path, omit “https colon slash slash” and any queries or fragments, pronounce periods as “dot” and forward slashes as “slash,” read hyphens as “dash,” and spell short IDs or acronyms letter by letter. Read formulas the way a human would.
-
-
-        If the transcription shows a word in brackets as uncertain, treat it as a phonetic hint. If you are not sure what they said, ask them to repeat it.
-
-        You can’t book appointments directly into calendars. Instead, collect the caller’s name, contact info, requested date and time, and any other details. Let them know you’ll pass this info on to the right person, who will follow up to confirm. Always be clear and polite about this limitation.
-
-
-
-        ################Business profile (injected; speak naturally)##################
-
-        Business name: {{business_name}}
-
-
-        Tagline: {{business_tagline}}
-
-
-        Services: {{services_list}}
-
-
-        Service area: {{service_area}}
-
-
-        Hours by day: {{hours_by_day}}
-
-
-        Time zone: {{timezone}}
-
-
-        Main phone: {{main_phone}}
-
-
-        Booking link: {{booking_url}}
-
-
-        Pricing table with currency, units, and scope: {{pricing_table}}
-
-
-        Escalation contact for issues: {{escalation_contact}}
-
-        Example speech normalization:
-        Say “Monday through Saturday, nine in the morning to eight thirty at night, Eastern time.”
-
-
-        When quoting price items, include currency and scope, for example, “Airbnb cleaning starts at one hundred fifty dollars for up to one bedroom and one bathroom.”
-        ##################################################################
-
-
-
-        Your role on calls for {{business_name}}
-
-        Primary goal: be helpful, accurate, and efficient using only approved business info. When details are missing, do not guess. Offer to capture details, send the booking link, or arrange a callback.
-
-
-        Core intents and actions
-
-
-        Pricing or quote
-
-        Quote only approved prices and units from the {{pricing_table}}.
-
-        If scope is unclear, ask the minimum: bedrooms, bathrooms, property type, zip code, and extras.
-
-        If an exact quote is not possible, give the base plus add ons or the approved range, then offer to book or text the link.
-
-
-        Service scope or service area
-
-        Answer from the services list and service area.
-
-        If out of the area or not provided, capture details and offer a callback.
-
-
-        Support or complaints
-
-        Brief apology. Capture summary and impact. Promise escalation to Ava Lopez and share the expected response window if provided.
-
-
-        General inquiry
-
-        Answer succinctly. If outside the profile, capture a message for follow up.
-
-
-
-        Lead capture (order and fields)
-
-        Ask conversationally and confirm back.
-
-        Name
-
-        Callback number, repeat back digits
-
-        Address or zip code
-
-        Email for confirmation if needed
-
-        Consent to text or email the booking link or confirmation
-
-        ##########
-        Store as: name, phone, address or zip, preferred date and time, notes, email, consent to sms, consent to email, source inbound call.
-        #######
-
-
-        Guardrails and edge cases
-
-        After hours or holidays: say when the business reopens, capture details, and offer to text the booking link.
-
-        If the caller mentions competitor pricing: restate approved value points and proceed to booking or lead capture.
-
-        If a question is not covered: say you do not have that information, offer to take a message, and send the booking link with consent.
-
-        Always ask for consent before sending any text or email.
-
-
-        Micro-conversation patterns
-
-        Open with a warm, concise greeting with the business name and ask what brought them in.
-
-        Early in the call, get the caller’s name and use it naturally.
-
-        Reflect back key facts, for example, two bedrooms and one bath in seven eight seven zero two, did I get that right.
-
-        Close with one sentence next steps and a gentle offer of anything else.
-
-
-
-        Closing script
-
-        I have you down for the summary. I will complete the action such as booking, sending the link, or arranging a callback. Is there anything else I can help with right now?
-        """
-
         # --- Data Extraction and Formatting (ROBUST VERSION) ---
         user_id = structured_data.get("user_id")
         company_info = structured_data.get('company_info', {}) or {}
@@ -688,11 +553,10 @@ class OraniAIAssistant:
         hours_of_operation = structured_data.get('hours_of_operation', []) or []
 
         # Get AI Name from the database, which is the single source of truth
-        ai_name = "Orani" # Default
-        if user_id:
+        if ai_name is None and user_id:
             db_profile = self._get_business_profile(user_id)
-            if db_profile and db_profile.ai_name:
-                ai_name = db_profile.ai_name
+            ai_name = db_profile.ai_name if db_profile else None
+        ai_name = ai_name or "Orani" # Default
         
         # Format data for injection, ensuring no 'None' values are used
         business_name = company_info.get('business_name') or 'the business'
@@ -715,22 +579,22 @@ class OraniAIAssistant:
         else:
             pricing_table = "Pricing is available upon request."
 
-        # --- Perform the Injections (Find and Replace) ---
-        final_prompt = system_prompt_template.replace('{{AI NAME}}', ai_name)
-        final_prompt = final_prompt.replace('{{business_name}}', business_name)
-        final_prompt = final_prompt.replace('{{services_list}}', services_list)
-        final_prompt = final_prompt.replace('{{hours_by_day}}', hours_by_day)
-        final_prompt = final_prompt.replace('{{main_phone}}', main_phone)
-        final_prompt = final_prompt.replace('{{booking_url}}', booking_url)
-        final_prompt = final_prompt.replace('{{pricing_table}}', pricing_table)
-
-        # For fields not in the payload, we can use a default placeholder
-        final_prompt = final_prompt.replace('{{business_tagline}}', 'Not specified.')
-        final_prompt = final_prompt.replace('{{service_area}}', 'Not specified.')
-        final_prompt = final_prompt.replace('{{timezone}}', 'Not specified.')
-        final_prompt = final_prompt.replace('{{escalation_contact}}', 'the manager')
-        
-        return final_prompt
+        # --- Perform the Injections (one pass over the compiled template) ---
+        values = {
+            'AI NAME': ai_name,
+            'business_name': business_name,
+            'services_list': services_list,
+            'hours_by_day': hours_by_day,
+            'main_phone': main_phone,
+            'booking_url': booking_url,
+            'pricing_table': pricing_table,
+            # For fields not in the payload, we can use a default placeholder
+            'business_tagline': 'Not specified.',
+            'service_area': 'Not specified.',
+            'timezone': structured_data.get('timezone') or 'Not specified.',
+            'escalation_contact': 'the manager',
+        }
+        return render_system_prompt(values, user_id)
     
     def _ai_summarize(self, prompt: str) -> dict:
         """Use Google's Gemini API to generate a structured summary."""
@@ -808,8 +672,8 @@ class OraniAIAssistant:
             logger.error(f"Error getting business knowledge: {str(e)}")
             return []
 
-    def _store_assistant_id(self, user_id: str, assistant_id: str) -> bool:
-        """Saves or updates the assistant ID for a user in our local database."""
+    def _store_assistant_id(self, user_id: str, assistant_id: str, config_hash: Optional[str] = None) -> bool:
+        """Saves or updates the assistant ID (and the hash of the config sent to Vapi) for a user."""
         with Session(engine) as session:
             # Check if an assistant already exists for this user
             statement = select(Assistant).where(Assistant.user_id == user_id)
@@ -817,16 +681,32 @@ class OraniAIAssistant:
             
             if existing_assistant:
                 # Update the existing record
+                if existing_assistant.assistant_id != assistant_id:
+                    # A new assistant isn't wired to any number yet.
+                    existing_assistant.phone_numbers_hash = None
                 existing_assistant.assistant_id = assistant_id
+                existing_assistant.config_hash = config_hash
                 session.add(existing_assistant)
             else:
                 # Create a new record
-                new_assistant = Assistant(user_id=user_id, assistant_id=assistant_id)
+                new_assistant = Assistant(user_id=user_id, assistant_id=assistant_id, config_hash=config_hash)
                 session.add(new_assistant)
             
             session.commit()
         return True
 
+    def _get_assistant_record(self, user_id: str) -> Optional[Assistant]:
+        with Session(engine) as session:
+            return session.exec(select(Assistant).where(Assistant.user_id == user_id)).first()
+
+    def _store_phone_numbers_hash(self, user_id: str, phone_numbers_hash: str):
+        with Session(engine) as session:
+            record = session.exec(select(Assistant).where(Assistant.user_id == user_id)).first()
+            if record:
+                record.phone_numbers_hash = phone_numbers_hash
+                session.add(record)
+                session.commit()
+
     # TEMPORARY CODE
     def _get_assistant_id(self, user_id: str) -> Optional[str]:
         """Gets the assistant ID for a user from our local database."""
@@ -852,6 +732,7 @@ class OraniAIAssistant:
                 # If it exists, update its details
                 existing_number.user_id = user_id
                 existing_number.vapi_phone_id = vapi_phone_id
+                existing_number.phone_number_normalized = phone_match_key(phone_number)
                 session.add(existing_number)
                 logger.info("Updated existing phone number record.")
             else:
@@ -859,12 +740,15 @@ class OraniAIAssistant:
                 new_number = PhoneNumber(
                     user_id=user_id,
                     phone_number=phone_number,
+                    phone_number_normalized=phone_match_key(phone_number),
                     vapi_phone_id=vapi_phone_id
                 )
                 session.add(new_number)
                 logger.info("Created new phone number record.")
             
             session.commit()
+        self._vapi_phone_ids[phone_match_key(phone_number)] = vapi_phone_id
+        invalidate_phone_owner(phone_number, vapi_phone_id)
         return True
 
     def _create_call_log(self, call_data: Dict) -> bool:
@@ -888,6 +772,7 @@ class OraniAIAssistant:
             user_id=user_id,
             call_id=summary.call_id,
             caller_phone=summary.caller_phone,
+            caller_phone_normalized=phone_match_key(summary.caller_phone),
             duration=summary.duration,
             transcript=summary.transcript,
             summary=summary.summary,
@@ -897,17 +782,83 @@ class OraniAIAssistant:
             recording_url=recording_url,
             timestamp=summary.timestamp
         )
+        self._insert_call_summary(summary_to_db)
+        return True
+    
+    def _insert_call_summary(self, summary_to_db: CallSummaryDB):
+        """
+        Inserts a call summary together with everything derived from it: the
+        compressed transcript, the search index entry and the user's history
+        version, all in one transaction.
+        """
+        transcript = summary_to_db.transcript or ""
+        if uses_side_table():
+            summary_to_db.transcript = ""
         with Session(engine) as session:
             session.add(summary_to_db)
+            session.flush()
+            if uses_side_table():
+                store_transcript(session, summary_to_db.id, transcript)
+            index_call_summary(session, summary_to_db, transcript)
+            bump_history_version(session, summary_to_db.user_id)
             session.commit()
-        return True
-    
-    def get_call_summaries_for_user(self, user_id: str) -> Optional[List[CallSummaryDB]]:
-        """Retrieves all call summaries for a user from our local database."""
+        response_cache.invalidate_user(summary_to_db.user_id)
+
+    def get_call_summaries_for_user(self, user_id: str, fields: Optional[List[str]] = None) -> Optional[List[Dict]]:
+        """
+        Retrieves all call summaries for a user from our local database.
+        Only the requested columns are selected (the preview columns by default),
+        so list screens never read or serialize full transcripts.
+        """
         with Session(engine) as session:
-            statement = select(CallSummaryDB).where(CallSummaryDB.user_id == user_id).order_by(CallSummaryDB.timestamp.desc())
-            results = session.exec(statement).all()
-            return results
+            return self._query_summaries(session, fields, CallSummaryDB.user_id == user_id, order_by=CallSummaryDB.timestamp.desc())
+
+    def _query_summaries(self, session: Session, fields: Optional[List[str]], *criteria, order_by=None) -> List[Dict]:
+        """
+        Selects only the requested summary fields (the preview fields by default)
+        as dicts. Transcripts are decompressed only when 'transcript' is requested.
+        """
+        fields = fields or SUMMARY_PREVIEW_FIELDS
+        columns = [getattr(CallSummaryDB, f) for f in fields]
+        with_transcript = "transcript" in fields
+        if with_transcript:
+            columns.append(CallSummaryDB.id.label("_summary_id"))
+
+        statement = select(*columns).where(*criteria)
+        if order_by is not None:
+            statement = statement.order_by(order_by)
+        rows = [dict(row._mapping) for row in session.exec(statement).all()]
+
+        if with_transcript:
+            transcripts = load_transcripts(session, [row["_summary_id"] for row in rows])
+            for row in rows:
+                summary_id = row.pop("_summary_id")
+                row["transcript"] = transcripts.get(summary_id, row["transcript"])
+        return rows
+
+    def get_call_summary_detail(self, user_id: str, call_id: str) -> Optional[CallSummaryDB]:
+        """Loads one full call summary, including the transcript and structured summary."""
+        with Session(engine) as session:
+            statement = select(CallSummaryDB).where(
+                CallSummaryDB.user_id == user_id, CallSummaryDB.call_id == call_id
+            )
+            summary = session.exec(statement).first()
+            if summary:
+                transcript = load_transcript(session, summary)
+                session.expunge(summary)
+                summary.transcript = transcript
+            return summary
+
+    def get_call_transcript(self, user_id: str, call_id: str) -> Optional[str]:
+        """Loads and decompresses only the transcript of one call summary."""
+        with Session(engine) as session:
+            statement = select(CallSummaryDB.id, CallSummaryDB.transcript).where(
+                CallSummaryDB.user_id == user_id, CallSummaryDB.call_id == call_id
+            )
+            row = session.exec(statement).first()
+            if row is None:
+                return None
+            return load_transcripts(session, [row.id]).get(row.id, row.transcript or "")
 
     def _update_call_transcript(self, call_id: str, transcript_data: Dict) -> bool:
         """Update call transcript in real-time"""
@@ -984,6 +935,20 @@ class OraniAIAssistant:
         
         logger.info(f"Attempting outbound call from {from_number} to {phone_number_to_call} using assistant {assistant_id}")
         
+        call_data = self.place_vapi_call(assistant_id, vapi_phone_id, phone_number_to_call)
+        if call_data:
+            outbound_log = {
+                "call_id": call_data.get("id"),
+                "direction": "Outgoing",
+                "from_number": from_number,
+                "recipient_phone": phone_number_to_call,
+                "timestamp": datetime.now().isoformat()
+            }
+            print("\n--- 📞 OUTGOING CALL INITIATED ---", outbound_log)
+        return call_data
+
+    def place_vapi_call(self, assistant_id: str, vapi_phone_id: str, phone_number_to_call: str) -> Optional[Dict]:
+        """Asks Vapi to dial a customer. Returns Vapi's call object, or None on failure."""
         outbound_call_config = {
             "assistantId": assistant_id,
             "phoneNumberId": vapi_phone_id, 
@@ -1001,17 +966,7 @@ class OraniAIAssistant:
             )
             
             if response.status_code == 201:
-                call_data = response.json()
-                
-                outbound_log = {
-                    "call_id": call_data.get("id"),
-                    "direction": "Outgoing",
-                    "from_number": from_number,
-                    "recipient_phone": phone_number_to_call,
-                    "timestamp": datetime.now().isoformat()
-                }
-                print("\n--- 📞 OUTGOING CALL INITIATED ---", outbound_log)
-                return call_data
+                return response.json()
             else:
                 logger.error(f"Failed to make outbound call: {response.text}")
                 return None
@@ -1023,17 +978,32 @@ class OraniAIAssistant:
     def _get_vapi_phone_id_from_number(self, phone_number_string: str) -> Optional[str]:
         """
         Translates a phone number string (e.g., +15551234567) into its Vapi phone_id.
+        Checks the in-process cache and the numbers we configured ourselves
+        before falling back to listing every number in Vapi.
         """
+        match_key = phone_match_key(phone_number_string)
+        if match_key in self._vapi_phone_ids:
+            return self._vapi_phone_ids[match_key]
+
+        with Session(engine) as session:
+            vapi_phone_id = session.exec(
+                select(PhoneNumber.vapi_phone_id).where(PhoneNumber.phone_number_normalized == match_key)
+            ).first()
+        if vapi_phone_id:
+            self._vapi_phone_ids[match_key] = vapi_phone_id
+            return vapi_phone_id
+
         try:
             response = requests.get(f"{self.vapi_base_url}/phone-number", headers=self.vapi_headers)
             if response.status_code == 200:
                 all_numbers = response.json()
-                # Find the number object that matches the string
-                matching_number = next((num for num in all_numbers if num.get('number') == phone_number_string), None)
+                for num in all_numbers:
+                    if num.get('number') and num.get('id'):
+                        self._vapi_phone_ids[phone_match_key(num['number'])] = num['id']
                 
-                if matching_number:
-                    logger.info(f"Found phone ID for {phone_number_string}: {matching_number.get('id')}")
-                    return matching_number.get('id')
+                if match_key in self._vapi_phone_ids:
+                    logger.info(f"Found phone ID for {phone_number_string}: {self._vapi_phone_ids[match_key]}")
+                    return self._vapi_phone_ids[match_key]
                 else:
                     logger.error(f"Could not find a configured phone number matching {phone_number_string} in Vapi.")
                     return None
@@ -1060,16 +1030,28 @@ class OraniAIAssistant:
         [FINAL VERSION]
         Saves/updates profile, creates assistant, and robustly sets up the phone number.
         """
-        user_id = payload.get("user_id")
-        if not user_id:
-            logger.error("Cannot upsert profile: user_id is missing.")
+        ai_name = self.save_business_profile(payload)
+        if ai_name is None:
             return None
+        return self.apply_profile_to_assistant(payload, ai_name)
 
+    @staticmethod
+    def _profile_settings(payload: Dict):
         # This logic is correct and handles defaults.
         voice_id_to_save = payload.get("selected_voice_id") or "ys3XeJJA4ArWMhRpcX1D"
         ring_count_to_save = payload.get("ring_count", 4)
         recording_enabled_to_save = payload.get("recording_enabled", False)
         # forwarding_number_to_save = payload.get("forwarding_number") # Keeping this for future use
+        return voice_id_to_save, ring_count_to_save, recording_enabled_to_save
+
+    def save_business_profile(self, payload: Dict) -> Optional[str]:
+        """Saves/updates the business profile only. Returns the profile's AI name, or None if the payload has no user_id."""
+        user_id = payload.get("user_id")
+        if not user_id:
+            logger.error("Cannot upsert profile: user_id is missing.")
+            return None
+
+        voice_id_to_save, ring_count_to_save, recording_enabled_to_save = self._profile_settings(payload)
 
         with Session(engine) as session:
             # ... (the database saving logic is correct)
@@ -1092,27 +1074,86 @@ class OraniAIAssistant:
                 )
             session.add(profile)
             session.commit()
+            return profile.ai_name or "Orani"
 
-        # --- Call the other functions AFTER saving ---
-        
-        # 1. Create the new assistant.
-        assistant_data = self.create_assistant(user_id, payload)
+    def apply_profile_to_assistant(
+        self, payload: Dict, ai_name: Optional[str] = None, progress: Optional[Callable[[str, Dict], None]] = None
+    ) -> Optional[Dict]:
+        """
+        The remote half of a profile save: brings the Vapi assistant and the
+        phone numbers in line with a saved profile. progress(step, details),
+        if given, is called as each step starts and with the phone results.
+        """
+        user_id = payload.get("user_id")
+        report = progress or (lambda step, details=None: None)
+        voice_id_to_save, ring_count_to_save, recording_enabled_to_save = self._profile_settings(payload)
+        if ai_name is None:
+            db_profile = self._get_business_profile(user_id)
+            ai_name = (db_profile.ai_name if db_profile else None) or "Orani"
+
+        # 1. Bring the Vapi assistant in line with the profile, doing only the
+        #    remote work the change needs (nothing, a PATCH, or a create).
+        report("assistant", {})
+        assistant_config = self._build_assistant_config(payload, voice_id_to_save, ai_name)
+        config_hash = self._hash_config(assistant_config)
+        record = self._get_assistant_record(user_id)
+
+        if record and record.config_hash == config_hash:
+            logger.info(f"Assistant config for user {user_id} is unchanged; skipping Vapi update.")
+            assistant_data = {"id": record.assistant_id, **assistant_config}
+        else:
+            # Raises unless the update worked or Vapi lost the assistant (404).
+            assistant_data = self.update_assistant(user_id, record.assistant_id, assistant_config) if record else None
+            if not assistant_data:
+                assistant_data = self.create_assistant(user_id, payload, assistant_config)
         if not assistant_data:
             logger.error(f"Failed to create assistant for user {user_id}, stopping process.")
             return None
+        store_assistant_config(self._compile_assistant_config(
+            user_id, assistant_data.get("id"), payload, assistant_config, ring_count_to_save, recording_enabled_to_save
+        ))
+        schedule_rebuild(user_id, payload, self._get_business_knowledge)
 
-        # 2. Automatically set up the phone number.
-        #    This is the crucial resynchronization step.
+        # 2. Set up the phone number, but only if the numbers (or the assistant
+        #    they must point at) changed since the last successful setup.
         phone_numbers_list = payload.get("phone_numbers", [])
-        if phone_numbers_list:
-            phone_to_setup = phone_numbers_list[0].get("phone_number")
-            if phone_to_setup:
-                # By calling this, we force the phone number in Vapi to be
-                # linked to the brand new assistant we just created.
-                self.setup_phone_number(user_id, phone_to_setup)
+        phone_numbers_hash = self._hash_config(sorted(p.get("phone_number") or "" for p in phone_numbers_list))
+        record = self._get_assistant_record(user_id)
+        if phone_numbers_list and record.phone_numbers_hash != phone_numbers_hash:
+            report("phone_numbers", {})
+            numbers_to_setup = [p.get("phone_number") for p in phone_numbers_list if p.get("phone_number")]
+            setups = self.setup_phone_numbers(user_id, numbers_to_setup) if numbers_to_setup else []
+            report("phone_numbers", {"phones": [s.to_dict() for s in setups]})
+            if setups and all(s.status == "configured" for s in setups):
+                self._store_phone_numbers_hash(user_id, phone_numbers_hash)
         
         return assistant_data
     
+    def _compile_assistant_config(
+        self, user_id: str, assistant_id: Optional[str], payload: Dict, assistant_config: Dict,
+        ring_count: Optional[int], recording_enabled: bool,
+    ) -> CompiledAssistantConfig:
+        return CompiledAssistantConfig(
+            user_id=user_id,
+            assistant_id=assistant_id,
+            config=assistant_config,
+            schedule=compile_schedule(payload.get("hours_of_operation"), payload.get("timezone")),
+            profile=payload,
+            ring_count=ring_count or 4,
+            recording_enabled=bool(recording_enabled),
+        )
+
+    def _load_assistant_request_config(self, user_id: str) -> Optional[CompiledAssistantConfig]:
+        """Rebuilds a user's assistant-request entry from the saved profile (cache miss)."""
+        profile = self._get_business_profile(user_id)
+        if not profile or not profile.profile_data:
+            return None
+        assistant_config = self._build_assistant_config(profile.profile_data, profile.selected_voice_id, profile.ai_name or "Orani")
+        return self._compile_assistant_config(
+            user_id, self._get_assistant_id(user_id), profile.profile_data, assistant_config,
+            profile.ring_count, profile.recording_enabled,
+        )
+
     def _get_business_profile(self, user_id: str) -> Optional[BusinessProfile]:
         """
         Gets the full business profile object for a user from our local database.
@@ -1129,32 +1170,19 @@ class OraniAIAssistant:
 
     def _get_user_id_from_phone_number(self, phone_number_string: str) -> Optional[str]:
         """
-        Finds which user owns a given phone number by checking our local database.
+        Finds which user owns a given phone number by checking our local database
+        (cached; see app/phone_routing.py).
         """
-        logger.info(f"Looking up user for phone number: {phone_number_string}")
-        with Session(engine) as session:
-            statement = select(PhoneNumber).where(PhoneNumber.phone_number == phone_number_string)
-            phone_record = session.exec(statement).first()
-            
-            if phone_record:
-                logger.info(f"Found user '{phone_record.user_id}' for phone number {phone_number_string}")
-                return phone_record.user_id
-            else:
-                logger.error(f"Could not find a user for phone number: {phone_number_string}")
-                return None
+        user_id = lookup_phone_owner(phone_number_string)
+        if not user_id:
+            logger.error(f"Could not find a user for phone number: {phone_number_string}")
+        return user_id
             
     def _upload_recording_to_cloudinary(self, vapi_recording_url: str, call_id: str) -> Optional[str]:
         """Downloads a recording from Vapi and uploads it to Cloudinary."""
         logger.info(f"Uploading recording for call {call_id} to Cloudinary.")
         try:
-            # Configure Cloudinary
-            cloudinary.config(
-                cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-                api_key=settings.CLOUDINARY_API_KEY,
-                api_secret=settings.CLOUDINARY_API_SECRET,
-                secure=True
-            )
-
+            # Cloudinary is configured once at startup (see app/media.py).
             # Upload the file directly from the URL.
             # We set a public_id to easily find it later, and save it in a folder.
             upload_result = cloudinary.uploader.upload(
@@ -1176,24 +1204,24 @@ class OraniAIAssistant:
             logger.error(f"Failed to upload recording to Cloudinary: {str(e)}")
             return None
 
-    def get_unified_history_for_user(self, user_id: str) -> Dict:
+    def get_unified_history_for_user(self, user_id: str, fields: Optional[List[str]] = None) -> Dict:
         """
         [UPDATED WITH FILE SUPPORT]
-        Fetches ALL call summaries and messages for a user.
+        Fetches ALL call summaries and messages for a user. Calls only carry
+        the requested columns (the preview columns by default).
         """
-        print(f"\n--- DEBUG: Looking for ALL history for user_id: '{user_id}' ---")
+        logger.debug(f"Looking for ALL history for user_id: '{user_id}'")
         history_items = []
         with Session(engine) as session:
-            call_statement = select(CallSummaryDB).where(CallSummaryDB.user_id == user_id)
-            call_summaries = session.exec(call_statement).all()
-            print(f"--- DEBUG: Found {len(call_summaries)} total call summaries for this user.")
+            call_summaries = self._query_summaries(session, fields, CallSummaryDB.user_id == user_id)
+            logger.debug(f"Found {len(call_summaries)} total call summaries for this user.")
 
             message_statement = select(Message).where(Message.user_id == user_id)
             messages = session.exec(message_statement).all()
-            print(f"--- DEBUG: Found {len(messages)} total messages for this user.")
+            logger.debug(f"Found {len(messages)} total messages for this user.")
 
             for summary in call_summaries:
-                history_items.append({"item_type": "call", "timestamp": summary.timestamp, "details": summary})
+                history_items.append({"item_type": "call", "timestamp": summary["timestamp"], "details": summary})
             
             for message in messages:
                 # Determine item_type: "file" if media_urls present, otherwise "message"
@@ -1201,57 +1229,41 @@ class OraniAIAssistant:
                 item_type = "file" if has_media else "message"
                 history_items.append({"item_type": item_type, "timestamp": message.timestamp, "details": message})
 
+            history_items.extend(self._archived_history_items(session, user_id))
+
         sorted_history = sorted(history_items, key=lambda item: item['timestamp'], reverse=True)
-        print(f"--- DEBUG: Returning a combined total of {len(sorted_history)} history items. ---\n")
+        logger.debug(f"Returning a combined total of {len(sorted_history)} history items.")
         return {"history": sorted_history}
 
 
-    def get_unified_history_for_customer(self, user_id: str, customer_number: str) -> Dict:
+    def get_unified_history_for_customer(self, user_id: str, customer_number: str, fields: Optional[List[str]] = None) -> Dict:
         """
         [UPDATED WITH FILE SUPPORT]
-        Uses a LIKE query to find customer interactions.
+        Finds customer interactions with an exact match on the normalized
+        (E.164) customer number, served by the (user_id, *_normalized) indexes.
         """
-        print(f"\n--- DEBUG: Filtering history for user_id: '{user_id}' and customer_number: '{customer_number}' ---")
+        logger.debug(f"Filtering history for user_id: '{user_id}' and customer_number: '{customer_number}'")
+        customer_key = phone_match_key(customer_number)
         history_items = []
         with Session(engine) as session:
-            raw_call_statement = select(CallSummaryDB).where(CallSummaryDB.user_id == user_id)
-            raw_call_summary = session.exec(raw_call_statement).first()
-            if raw_call_summary:
-                db_phone_number = raw_call_summary.caller_phone
-                print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-                print("!!! RAW DATABASE DEBUG !!!")
-                print(f"!!! Raw 'caller_phone' from DB: '{db_phone_number}'")
-                print(f"!!! Length of DB phone number:  {len(db_phone_number)}")
-                print(f"!!! Length of requested number: {len(customer_number)}")
-                print(f"!!! Do they match exactly?      {db_phone_number == customer_number}")
-                print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-            else:
-                print("--- DEBUG: Could not find ANY call summary for this user_id to debug with.")
-
-            like_query_param = f"%{customer_number}%"
-            call_statement = select(CallSummaryDB).where(
-                and_(
-                    CallSummaryDB.user_id == user_id,
-                    CallSummaryDB.caller_phone.like(like_query_param)
-                )
+            call_summaries = self._query_summaries(
+                session, fields,
+                CallSummaryDB.user_id == user_id,
+                CallSummaryDB.caller_phone_normalized == customer_key
             )
-            call_summaries = session.exec(call_statement).all()
-            print(f"--- DEBUG (using LIKE Query): Found {len(call_summaries)} call summaries matching this customer.")
+            logger.debug(f"Found {len(call_summaries)} call summaries matching this customer.")
 
             message_statement = select(Message).where(
                 and_(
                     Message.user_id == user_id,
-                    or_(
-                        Message.to_number == customer_number,
-                        Message.from_number == customer_number
-                    )
+                    Message.customer_number_normalized == customer_key
                 )
             )
             messages = session.exec(message_statement).all()
-            print(f"--- DEBUG: Found {len(messages)} messages matching this customer.")
+            logger.debug(f"Found {len(messages)} messages matching this customer.")
             
             for summary in call_summaries:
-                history_items.append({"item_type": "call", "timestamp": summary.timestamp, "details": summary})
+                history_items.append({"item_type": "call", "timestamp": summary["timestamp"], "details": summary})
             
             for message in messages:
                 # Determine item_type: "file" if media_urls present, otherwise "message"
@@ -1259,52 +1271,82 @@ class OraniAIAssistant:
                 item_type = "file" if has_media else "message"
                 history_items.append({"item_type": item_type, "timestamp": message.timestamp, "details": message})
 
+            history_items.extend(self._archived_history_items(session, user_id, customer_key))
+
         sorted_history = sorted(history_items, key=lambda item: item['timestamp'], reverse=True)
-        print(f"--- DEBUG: Returning a combined total of {len(sorted_history)} filtered history items. ---\n")
+        logger.debug(f"Returning a combined total of {len(sorted_history)} filtered history items.")
         return {"history": sorted_history}
 
 
+    def _archived_history_items(self, session: Session, user_id: str, customer_key: Optional[str] = None) -> List[Dict]:
+        """History entries for the newest archived calls/messages; the full item is loaded when opened."""
+        return [
+            {
+                "item_type": stub.item_type,
+                "timestamp": stub.timestamp,
+                "archived": True,
+                "details": {
+                    "item_key": stub.item_key,
+                    "customer_number": stub.customer_number_normalized,
+                    "preview": stub.preview,
+                },
+            }
+            for stub in archived_stubs(session, user_id, customer_key)
+        ]
+
     def get_conversation_previews(self, user_id: str) -> Dict:
         """
         [UPDATED WITH FILE SUPPORT]
         Finds the single most recent interaction (call, message, or file) for each
         customer a user has communicated with. Ideal for an "inbox" view.
         """
-        print(f"\n--- DEBUG: Getting latest conversation previews for user_id: '{user_id}' ---")
+        logger.debug(f"Getting latest conversation previews for user_id: '{user_id}'")
         
         all_items = []
         with Session(engine) as session:
-            # 1. Fetch all calls and messages for the user
-            calls = session.exec(select(CallSummaryDB).where(CallSummaryDB.user_id == user_id)).all()
-            messages = session.exec(select(Message).where(Message.user_id == user_id)).all()
+            # 1. Fetch all calls and messages for the user (only the columns a preview needs)
+            calls = session.exec(select(
+                CallSummaryDB.caller_phone, CallSummaryDB.caller_phone_normalized,
+                CallSummaryDB.timestamp, CallSummaryDB.summary,
+            ).where(CallSummaryDB.user_id == user_id)).all()
+            messages = session.exec(select(
+                Message.direction, Message.from_number, Message.to_number,
+                Message.customer_number_normalized, Message.timestamp,
+                Message.body, Message.media_urls,
+            ).where(Message.user_id == user_id)).all()
             
             # 2. Combine them into a single list with a standardized format
             for summary in calls:
                 all_items.append({
                     "item_type": "call",
-                    "customer_number": summary.caller_phone,
+                    "customer_number": summary.caller_phone_normalized or summary.caller_phone,
                     "timestamp": summary.timestamp,
                     "preview": summary.summary,
-                    "details": summary 
                 })
             
-            # To determine the customer number for a message, we need to know the user's number
-            user_phone_numbers = {p.phone_number for p in session.exec(select(PhoneNumber).where(PhoneNumber.user_id == user_id)).all()}
+            # Archived items only matter for customers with no newer hot item,
+            # but they keep older threads visible in the inbox.
+            for stub in latest_archived_stubs(session, user_id):
+                all_items.append({
+                    "item_type": stub.item_type,
+                    "customer_number": stub.customer_number_normalized or "",
+                    "timestamp": stub.timestamp,
+                    "preview": stub.preview,
+                })
 
             for message in messages:
-                customer_number = message.from_number if message.direction == "inbound" else message.to_number
+                customer_number = message.customer_number_normalized or (message.from_number if message.direction == "inbound" else message.to_number)
                 
                 # Determine if this is a file message or regular message
                 # Rule: If media_urls exist (with or without body text), it's a "file"
                 # Otherwise, it's a "message"
-                has_media = hasattr(message, 'media_urls') and message.media_urls and len(message.media_urls) > 0
+                has_media = bool(message.media_urls)
                 
                 all_items.append({
                     "item_type": "file" if has_media else "message",
                     "customer_number": customer_number,
                     "timestamp": message.timestamp,
                     "preview": message.body if message.body else "",  # Can be empty for file-only messages
-                    "details": message
                 })
 
         # 3. Process the list to find the latest item for each customer
@@ -1327,5 +1369,5 @@ class OraniAIAssistant:
 
         sorted_previews = sorted(final_previews, key=lambda x: x['timestamp'], reverse=True)
         
-        print(f"--- DEBUG: Found {len(sorted_previews)} unique conversation threads. ---")
+        logger.debug(f"Found {len(sorted_previews)} unique conversation threads.")
         return {"previews": sorted_previews}
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Ready-to-serve assistant configs for Vapi's assistant-request webhook.
+
+Vapi sends assistant-request when a call arrives on a number that has no
+fixed assistant, and drops the call if we don't answer within its deadline.
+So everything that doesn't depend on the moment of the call (the rendered
+system prompt, voice, the compiled business hours) is built when the profile
+is saved and kept in memory per user. Answering a request is then a cached
+number -> user lookup plus a shallow copy of the config with a sentence about
+the current time and business hours appended to the prompt.
+
+upsert_assistant_and_profile() stores a fresh entry on every save; the TTL
+only bounds how long another worker process can serve a stale one.
+"""
+import copy
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from app.config import settings
+from app.metrics import metrics
+from app.phone_routing import lookup_phone_owner, lookup_vapi_phone_owner
+from app.schedule import WeeklySchedule
+from app.ttl_cache import TTLCache
+
+
+@dataclass
+class CompiledAssistantConfig:
+    user_id: str
+    assistant_id: Optional[str]
+    config: Dict
+    schedule: WeeklySchedule
+    # The saved profile_data, for tool calls that look things up in it
+    profile: Dict = field(default_factory=dict)
+    ring_count: int = 4
+    recording_enabled: bool = False
+    built_at: float = field(default_factory=time.time)
+
+    def render(self, at: Optional[datetime] = None) -> Dict:
+        """The config for one call: the cached one plus the business hours as of now."""
+        model = self.config["model"]
+        messages = list(model["messages"])
+        messages[0] = {
+            **messages[0],
+            "content": f"{messages[0]['content']}\n\nCurrent business hours context: {self.schedule.describe(at)}",
+        }
+        return {
+            **self.config,
+            "model": {**model, "messages": messages},
+            "recordingEnabled": self.recording_enabled,
+            "metadata": {
+                "userId": self.user_id,
+                "assistantId": self.assistant_id,
+                "ringCount": self.ring_count,
+                "businessOpen": self.schedule.is_open(at),
+            },
+        }
+
+
+assistant_config_cache = TTLCache("assistant_configs", ttl_seconds=settings.ASSISTANT_CONFIG_CACHE_TTL_SECONDS)
+
+
+def store_assistant_config(entry: CompiledAssistantConfig):
+    # Deep copy so later edits to the caller's config dict can't leak into the cache.
+    entry.config = copy.deepcopy(entry.config)
+    entry.profile = copy.deepcopy(entry.profile)
+    assistant_config_cache.set(entry.user_id, entry)
+
+
+def invalidate_assistant_config(user_id: str):
+    assistant_config_cache.invalidate(user_id)
+
+
+def get_assistant_config(user_id: str, loader: Callable[[str], Optional[CompiledAssistantConfig]]) -> Optional[CompiledAssistantConfig]:
+    """The cached entry for a user, built with loader(user_id) on a miss (e.g. after a restart)."""
+    found, entry = assistant_config_cache.get(user_id)
+    if found:
+        return entry
+    metrics.increment("assistant_request.cache_miss")
+    entry = loader(user_id)
+    if entry is not None:
+        store_assistant_config(entry)
+    return entry
+
+
+def resolve_assistant_request(message: Dict, loader: Callable[[str], Optional[CompiledAssistantConfig]]) -> Dict:
+    """The webhook response for an assistant-request message."""
+    with metrics.timer("assistant_request"):
+        phone_number = (message.get("phoneNumber") or {}).get("number")
+        vapi_phone_id = (message.get("call") or {}).get("phoneNumberId") or (message.get("phoneNumber") or {}).get("id")
+
+        user_id = lookup_phone_owner(phone_number) if phone_number else None
+        if not user_id and vapi_phone_id:
+            user_id = lookup_vapi_phone_owner(vapi_phone_id)
+        if not user_id:
+            metrics.increment("assistant_request.unknown_number")
+            return {"error": "This number is not connected to an assistant."}
+
+        entry = get_assistant_config(user_id, loader)
+        if entry is None:
+            metrics.increment("assistant_request.no_profile")
+            return {"error": "This business has not finished setting up its assistant."}
+        return {"assistant": entry.render()}
@@ -0,0 +1,238 @@
+"""
+Bulk SMS: one request, many recipients.
+
+POST /messaging/bulk enqueues a BulkMessageJob and returns right away. The
+scheduler then sends on the event loop, pacing every send through token
+buckets for the sending number and for the Twilio account, so a job runs at
+the carrier's rate instead of one HTTP round trip per message. Sends overlap
+up to BULK_SMS_MAX_IN_FLIGHT, sent messages are written in batches through
+save_messages(), and progress is pushed over SSE as 'bulk_progress' events.
+
+Jobs are kept in memory; a restart loses the ones still running.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.event_stream import broadcaster
+from app.message_store import save_messages
+from app.message_status import status_callback_url
+from app.metrics import metrics
+from app.models import Message
+from app.phone_utils import normalize_phone_number
+from app.twilio_gateway import TwilioGateway
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+# Per-recipient errors kept on a job for the status endpoint.
+_MAX_JOB_ERRORS = 100
+_MAX_FINISHED_JOBS = 1000
+
+
+def render_template(template: str, variables: Dict[str, str]) -> str:
+    """Fills {name}-style placeholders; unknown placeholders are left as written."""
+    return _PLACEHOLDER_RE.sub(lambda m: str(variables.get(m.group(1), m.group(0))), template)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Holding the lock while waiting keeps callers in FIFO order.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BulkRecipient:
+    to_number: str
+    variables: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class BulkMessageJob:
+    user_id: str
+    from_number: str
+    body_template: str
+    recipients: List[BulkRecipient]
+    media_urls: Optional[List[str]] = None
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued -> running -> completed
+    sent: int = 0
+    failed: int = 0
+    errors: List[Dict] = field(default_factory=list)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.recipients)
+
+    def record_error(self, to_number: str, error: str):
+        self.failed += 1
+        if len(self.errors) < _MAX_JOB_ERRORS:
+            self.errors.append({"to_number": to_number, "error": error})
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "pending": self.total - self.sent - self.failed,
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BulkMessageScheduler:
+    def __init__(self):
+        self._jobs: "OrderedDict[str, BulkMessageJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _bucket(self, key: str, rate: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate)
+        return bucket
+
+    def submit(self, job: BulkMessageJob, gateway: TwilioGateway) -> BulkMessageJob:
+        """Queues a job on the running event loop and returns it immediately."""
+        self._jobs[job.job_id] = job
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job, gateway))
+        self._forget_old_jobs()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[BulkMessageJob]:
+        return self._jobs.get(job_id)
+
+    def _forget_old_jobs(self):
+        finished = [j for j in self._jobs.values() if j.status == "completed"]
+        for job in finished[:max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+            del self._jobs[job.job_id]
+
+    async def _run(self, job: BulkMessageJob, gateway: TwilioGateway):
+        job.status = "running"
+        number_bucket = self._bucket(f"number:{job.from_number}", settings.BULK_SMS_PER_NUMBER_MPS)
+        account_bucket = self._bucket(f"account:{gateway.account_sid}", settings.BULK_SMS_ACCOUNT_MPS)
+        in_flight = asyncio.Semaphore(settings.BULK_SMS_MAX_IN_FLIGHT)
+        pending: List[Message] = []
+        last_progress = 0.0
+
+        async def flush():
+            nonlocal pending
+            batch, pending = pending, []
+            if batch:
+                try:
+                    with metrics.timer("bulk_sms.db_write"):
+                        await run_in_threadpool(save_messages, batch)
+                except Exception as e:
+                    logger.error(f"Bulk job {job.job_id}: failed to save {len(batch)} sent messages: {e}", exc_info=True)
+
+        async def send(recipient: BulkRecipient, to_number: str):
+            body = render_template(job.body_template, recipient.variables)
+            try:
+                twilio_message = await gateway.send_message_async(
+                    to=to_number, from_=job.from_number, body=body, media_url=job.media_urls,
+                    status_callback=status_callback_url(),
+                )
+            except Exception as e:
+                job.record_error(recipient.to_number, str(e))
+                metrics.increment("bulk_sms.failed")
+                return
+            finally:
+                in_flight.release()
+
+            job.sent += 1
+            metrics.increment("bulk_sms.sent")
+            pending.append(Message(
+                user_id=job.user_id,
+                message_sid=twilio_message.sid,
+                to_number=to_number,
+                from_number=job.from_number,
+                customer_number_normalized=to_number,
+                body=body,
+                media_urls=job.media_urls,
+                direction="outbound",
+                status=twilio_message.status,
+            ))
+            if len(pending) >= settings.BULK_SMS_INSERT_BATCH_SIZE:
+                await flush()
+
+        sends = []
+        seen = set()
+        try:
+            for recipient in job.recipients:
+                to_number = normalize_phone_number(recipient.to_number)
+                if not to_number:
+                    job.record_error(recipient.to_number, "Invalid phone number.")
+                    continue
+                if to_number in seen:
+                    job.record_error(recipient.to_number, "Duplicate recipient.")
+                    continue
+                seen.add(to_number)
+
+                await number_bucket.acquire()
+                await account_bucket.acquire()
+                await in_flight.acquire()
+                sends.append(asyncio.create_task(send(recipient, to_number)))
+
+                if time.monotonic() - last_progress >= settings.BULK_SMS_PROGRESS_INTERVAL_SECONDS:
+                    last_progress = time.monotonic()
+                    await self._publish_progress(job)
+
+            await asyncio.gather(*sends)
+            await flush()
+        except Exception as e:
+            logger.error(f"Bulk job {job.job_id} stopped: {e}", exc_info=True)
+            await asyncio.gather(*sends, return_exceptions=True)
+            await flush()
+        finally:
+            job.status = "completed"
+            job.finished_at = datetime.utcnow()
+            self._tasks.pop(job.job_id, None)
+            logger.info(f"Bulk job {job.job_id} finished: {job.sent} sent, {job.failed} failed of {job.total}.")
+            await self._publish_progress(job)
+
+    async def _publish_progress(self, job: BulkMessageJob):
+        await broadcaster.broadcast(json.dumps({
+            "event": "bulk_progress",
+            "userId": job.user_id,
+            "jobId": job.job_id,
+            "status": job.status,
+            "total": job.total,
+            "sent": job.sent,
+            "failed": job.failed,
+        }))
+
+
+bulk_scheduler = BulkMessageScheduler()
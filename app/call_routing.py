@@ -0,0 +1,67 @@
+"""
+TwiML routing for inbound calls on our Twilio numbers.
+
+/webhook/twilio-inbound answers from memory: the called number resolves to
+its owner through the phone routing cache and to the owner's
+CompiledAssistantConfig (assistant id, ring_count, compiled business hours)
+through the assistant config cache. During business hours the call rings the
+user's app for ring_count rings and /webhook/dial-status hands it to the AI
+if nobody answers; after hours it goes straight to the AI. The TwiML strings
+themselves are memoized per (user, assistant, ring count), so a warm request
+does no I/O and no XML building at all.
+"""
+from functools import lru_cache
+from typing import Callable, Optional
+from urllib.parse import urlencode
+from xml.sax.saxutils import escape, quoteattr
+
+from app.assistant_configs import CompiledAssistantConfig, assistant_config_cache, get_assistant_config
+from app.config import settings
+from app.phone_routing import lookup_phone_owner, phone_owner_cache
+from app.phone_utils import phone_match_key
+
+HANGUP_TWIML = "<Response><Hangup/></Response>"
+# DialCallStatus values that mean the user didn't pick up in the app
+UNANSWERED_DIAL_STATUSES = {"no-answer", "busy", "failed", "canceled"}
+# Seconds of ringing per ring_count ring
+SECONDS_PER_RING = 5
+
+
+@lru_cache(maxsize=4096)
+def ai_twiml(assistant_id: str) -> str:
+    """Hands the call to the Vapi assistant."""
+    url = f"{settings.VAPI_TWILIO_CALL_URL}?{urlencode({'assistantId': assistant_id})}"
+    return f"<Response><Redirect>{escape(url)}</Redirect></Response>"
+
+
+@lru_cache(maxsize=4096)
+def dial_twiml(user_id: str, assistant_id: str, ring_count: int) -> str:
+    """Rings the user's app, then reports to /webhook/dial-status."""
+    action = f"{settings.PUBLIC_BASE_URL}/webhook/dial-status?{urlencode({'assistantId': assistant_id})}"
+    return (
+        f'<Response><Dial timeout="{ring_count * SECONDS_PER_RING}" action={quoteattr(action)} method="POST">'
+        f"<Client>{escape(user_id)}</Client></Dial></Response>"
+    )
+
+
+def peek_call_route(called_number: str) -> Optional[CompiledAssistantConfig]:
+    """The routing record if both lookups are already cached; never touches the database."""
+    found, user_id = phone_owner_cache.get(phone_match_key(called_number))
+    if not found or not user_id:
+        return None
+    found, entry = assistant_config_cache.get(user_id)
+    return entry if found else None
+
+
+def lookup_call_route(called_number: str, loader: Callable[[str], Optional[CompiledAssistantConfig]]) -> Optional[CompiledAssistantConfig]:
+    """The routing record for a called number, loading whatever isn't cached. Blocking."""
+    user_id = lookup_phone_owner(called_number)
+    return get_assistant_config(user_id, loader) if user_id else None
+
+
+def inbound_call_twiml(route: Optional[CompiledAssistantConfig]) -> str:
+    if route is None or not route.assistant_id:
+        return HANGUP_TWIML
+    if not route.schedule.is_open():
+        return ai_twiml(route.assistant_id)
+    return dial_twiml(route.user_id, route.assistant_id, route.ring_count or 4)
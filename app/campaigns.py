@@ -0,0 +1,292 @@
+"""
+Outbound call campaigns: the assistant works through a list of numbers.
+
+A background worker (started with the app) dials each running campaign's due
+calls through Vapi, never keeping more than the user's concurrency limit on
+the line at once and leaving CAMPAIGN_DIAL_INTERVAL_SECONDS between dials.
+Each CampaignCall follows its Vapi call through the status-update and
+end-of-call-report webhooks; unanswered calls are queued again after the
+campaign's retry delay until max_attempts is reached.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.event_stream import broadcaster
+from app.metrics import metrics
+from app.models import CallCampaign, CampaignCall
+from app.phone_utils import normalize_phone_number
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_CALL_STATUSES = ["dialing", "in-progress"]
+# Vapi endedReason values that count as "nobody picked up" and are retried.
+NO_ANSWER_REASONS = {"customer-did-not-answer", "customer-busy", "voicemail"}
+
+# Last progress pushed over SSE per campaign, so unchanged campaigns stay quiet.
+_last_progress: Dict[str, Dict] = {}
+
+
+def create_campaign(
+    user_id: str,
+    from_number: str,
+    vapi_phone_id: str,
+    numbers: List[str],
+    max_concurrent: Optional[int] = None,
+    max_attempts: Optional[int] = None,
+    retry_delay_seconds: Optional[int] = None,
+) -> Tuple[CallCampaign, List[str]]:
+    """Creates a running campaign. Returns it with the numbers that were rejected as invalid."""
+    limit = settings.CAMPAIGN_MAX_CONCURRENT_CALLS_PER_USER
+    campaign = CallCampaign(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        from_number=from_number,
+        vapi_phone_id=vapi_phone_id,
+        max_concurrent=min(max_concurrent or limit, limit),
+        max_attempts=max_attempts or settings.CAMPAIGN_DEFAULT_MAX_ATTEMPTS,
+        retry_delay_seconds=settings.CAMPAIGN_DEFAULT_RETRY_DELAY_SECONDS if retry_delay_seconds is None else retry_delay_seconds,
+    )
+
+    calls, rejected, seen = [], [], set()
+    for number in numbers:
+        normalized = normalize_phone_number(number)
+        if not normalized:
+            rejected.append(number)
+        elif normalized not in seen:
+            seen.add(normalized)
+            calls.append(CampaignCall(campaign_id=campaign.id, user_id=user_id, to_number=normalized))
+
+    with Session(engine) as session:
+        session.add(campaign)
+        session.add_all(calls)
+        session.commit()
+        session.refresh(campaign)
+    logger.info(f"Created campaign {campaign.id} for user {user_id}: {len(calls)} numbers, {len(rejected)} rejected.")
+    return campaign, rejected
+
+
+def get_campaign_progress(campaign_id: str, include_calls: bool = False) -> Optional[Dict]:
+    with Session(engine) as session:
+        campaign = session.get(CallCampaign, campaign_id)
+        if not campaign:
+            return None
+        counts = dict(session.exec(
+            select(CampaignCall.status, func.count()).where(CampaignCall.campaign_id == campaign_id).group_by(CampaignCall.status)
+        ).all())
+        progress = {
+            "campaign_id": campaign.id,
+            "user_id": campaign.user_id,
+            "status": campaign.status,
+            "from_number": campaign.from_number,
+            "max_concurrent": campaign.max_concurrent,
+            "total": sum(counts.values()),
+            "counts": counts,
+            "created_at": campaign.created_at,
+            "finished_at": campaign.finished_at,
+        }
+        if include_calls:
+            calls = session.exec(
+                select(CampaignCall).where(CampaignCall.campaign_id == campaign_id).order_by(CampaignCall.id)
+            ).all()
+            progress["calls"] = [c.model_dump(exclude={"campaign_id", "user_id"}) for c in calls]
+        return progress
+
+
+def set_campaign_status(campaign_id: str, status: str) -> Optional[CallCampaign]:
+    """Pauses, resumes or cancels a campaign. Cancelling drops its queued calls; live calls finish normally."""
+    with Session(engine) as session:
+        campaign = session.get(CallCampaign, campaign_id)
+        if not campaign or campaign.status in ("cancelled", "completed"):
+            return campaign
+        campaign.status = status
+        if status == "cancelled":
+            campaign.finished_at = datetime.utcnow()
+            session.execute(
+                update(CampaignCall)
+                .where(CampaignCall.campaign_id == campaign_id, CampaignCall.status == "queued")
+                .values(status="cancelled", updated_at=datetime.utcnow())
+            )
+        session.add(campaign)
+        session.commit()
+        session.refresh(campaign)
+        return campaign
+
+
+def record_call_event(message: Dict):
+    """
+    Applies a Vapi status-update or end-of-call-report to the campaign call it
+    belongs to. Calls that weren't placed by a campaign are ignored.
+    """
+    vapi_call_id = message.get("call", {}).get("id")
+    if not vapi_call_id:
+        return
+    event_type = message.get("type")
+    status = message.get("status")
+
+    with Session(engine) as session:
+        call = session.exec(select(CampaignCall).where(CampaignCall.vapi_call_id == vapi_call_id)).first()
+        if not call or call.status not in ACTIVE_CALL_STATUSES:
+            return
+
+        if event_type == "status-update" and status == "in-progress":
+            call.status = "in-progress"
+        elif event_type == "end-of-call-report" or (event_type == "status-update" and status == "ended"):
+            campaign = session.get(CallCampaign, call.campaign_id)
+            _finish_call(call, campaign, message.get("endedReason") or "")
+        else:
+            return
+        call.updated_at = datetime.utcnow()
+        session.add(call)
+        session.commit()
+
+
+def _finish_call(call: CampaignCall, campaign: CallCampaign, ended_reason: str):
+    call.ended_reason = ended_reason
+    retryable = ended_reason in NO_ANSWER_REASONS or ended_reason == "dial-failed"
+    if retryable and call.attempts < campaign.max_attempts and campaign.status != "cancelled":
+        call.status = "queued"
+        call.next_attempt_at = datetime.utcnow() + timedelta(seconds=campaign.retry_delay_seconds)
+    elif ended_reason in NO_ANSWER_REASONS:
+        call.status = "no-answer"
+    elif ended_reason == "dial-failed" or "error" in ended_reason or "failed" in ended_reason:
+        call.status = "failed"
+    else:
+        call.status = "completed"
+    metrics.increment(f"campaigns.calls.{call.status}")
+
+
+def _expire_stale_calls(session: Session):
+    """Frees slots held by calls whose end-of-call webhook never arrived."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.CAMPAIGN_STALE_CALL_SECONDS)
+    stale = session.exec(
+        select(CampaignCall).where(CampaignCall.status.in_(ACTIVE_CALL_STATUSES), CampaignCall.updated_at < cutoff)
+    ).all()
+    for call in stale:
+        logger.warning(f"Campaign call {call.id} ({call.vapi_call_id}) got no end-of-call webhook; marking it failed.")
+        call.status = "failed"
+        call.ended_reason = "no-end-of-call-webhook"
+        call.updated_at = datetime.utcnow()
+        session.add(call)
+    if stale:
+        session.commit()
+
+
+def _active_call_counts(session: Session, column) -> Dict[str, int]:
+    """Live calls grouped by a CampaignCall column (user_id or campaign_id)."""
+    return dict(session.exec(
+        select(column, func.count()).where(CampaignCall.status.in_(ACTIVE_CALL_STATUSES)).group_by(column)
+    ).all())
+
+
+def run_dialer_pass(orani) -> List[str]:
+    """
+    Dials whatever is due in every running campaign, within both the
+    campaign's and the user's concurrency limits. Returns the ids of the
+    campaigns it looked at.
+    """
+    with Session(engine) as session:
+        _expire_stale_calls(session)
+        campaigns = session.exec(select(CallCampaign).where(CallCampaign.status == "running")).all()
+        active = _active_call_counts(session, CampaignCall.user_id)
+        active_by_campaign = _active_call_counts(session, CampaignCall.campaign_id)
+        session.expunge_all()
+
+    per_user_limit = settings.CAMPAIGN_MAX_CONCURRENT_CALLS_PER_USER
+    for campaign in campaigns:
+        assistant_id = orani._get_assistant_id(campaign.user_id)
+        slots = min(
+            campaign.max_concurrent - active_by_campaign.get(campaign.id, 0),
+            per_user_limit - active.get(campaign.user_id, 0),
+        )
+
+        with Session(engine) as session:
+            due = []
+            if slots > 0:
+                due = session.exec(
+                    select(CampaignCall).where(
+                        CampaignCall.campaign_id == campaign.id,
+                        CampaignCall.status == "queued",
+                        CampaignCall.next_attempt_at <= datetime.utcnow(),
+                    ).order_by(CampaignCall.next_attempt_at).limit(slots)
+                ).all()
+
+            for call in due:
+                # Claim the row first: every process runs a dialer, and only the
+                # one whose update lands may dial.
+                claimed = session.execute(
+                    update(CampaignCall)
+                    .where(CampaignCall.id == call.id, CampaignCall.status == "queued")
+                    .values(status="dialing", attempts=CampaignCall.attempts + 1, updated_at=datetime.utcnow())
+                ).rowcount
+                session.commit()
+                if claimed != 1:
+                    metrics.increment("campaigns.calls.claim_lost")
+                    continue
+                session.refresh(call)
+                call_data = orani.place_vapi_call(assistant_id, campaign.vapi_phone_id, call.to_number) if assistant_id else None
+                if call_data and call_data.get("id"):
+                    call.vapi_call_id = call_data["id"]
+                    active[campaign.user_id] = active.get(campaign.user_id, 0) + 1
+                    metrics.increment("campaigns.calls.dialed")
+                else:
+                    _finish_call(call, campaign, "dial-failed")
+                session.add(call)
+                session.commit()
+                # Pace dials so we don't burst the carrier or the assistant.
+                time.sleep(settings.CAMPAIGN_DIAL_INTERVAL_SECONDS)
+
+            remaining = session.exec(
+                select(func.count()).where(
+                    CampaignCall.campaign_id == campaign.id,
+                    CampaignCall.status.in_(["queued"] + ACTIVE_CALL_STATUSES),
+                )
+            ).one()
+            if not remaining:
+                session.execute(
+                    update(CallCampaign).where(CallCampaign.id == campaign.id, CallCampaign.status == "running")
+                    .values(status="completed", finished_at=datetime.utcnow())
+                )
+                session.commit()
+                logger.info(f"Campaign {campaign.id} completed.")
+    return [c.id for c in campaigns]
+
+
+async def _publish_progress(campaign_ids: List[str]):
+    for campaign_id in campaign_ids:
+        progress = await asyncio.to_thread(get_campaign_progress, campaign_id)
+        if not progress:
+            continue
+        summary = {"status": progress["status"], "counts": progress["counts"]}
+        if _last_progress.get(campaign_id) == summary:
+            continue
+        _last_progress[campaign_id] = summary
+        if progress["status"] != "running":
+            _last_progress.pop(campaign_id, None)
+        await broadcaster.broadcast(json.dumps({
+            "event": "campaign_progress",
+            "userId": progress["user_id"],
+            "campaignId": campaign_id,
+            "total": progress["total"],
+            **summary,
+        }))
+
+
+async def campaign_worker(orani):
+    """Background task started on app startup."""
+    while True:
+        try:
+            campaign_ids = await asyncio.to_thread(run_dialer_pass, orani)
+            await _publish_progress(campaign_ids)
+        except Exception as e:
+            logger.error(f"Campaign dialer pass failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.CAMPAIGN_TICK_SECONDS)
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -16,6 +17,121 @@ class Settings(BaseSettings):
     CLOUDINARY_API_KEY: str
     CLOUDINARY_API_SECRET: str
 
+    # Public URL Twilio, Vapi and the app use to reach this API (required; no default
+    # so webhooks are never pointed at the wrong host)
+    PUBLIC_BASE_URL: str
+
+    # Per-user response cache for the summaries/history endpoints
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_REDIS_URL: Optional[str] = None
+
+    # Retention: calls/messages older than a tenant's policy are archived.
+    # RETENTION_DEFAULT_HOT_DAYS applies to tenants without their own policy (None = keep forever).
+    RETENTION_DEFAULT_HOT_DAYS: Optional[int] = None
+    RETENTION_ARCHIVE_DIR: str = "archive"
+    RETENTION_BATCH_SIZE: int = 100
+    RETENTION_BATCH_PAUSE_SECONDS: float = 0.5
+    RETENTION_INTERVAL_SECONDS: int = 3600
+    # How long the retention lease lasts; renewed before each batch, so a batch must finish within it
+    RETENTION_LEASE_SECONDS: int = 600
+    # Most archive stubs listed in one history or message thread response
+    RETENTION_STUB_LIST_LIMIT: int = 200
+
+    # Outbound MMS media: bounded worker pool for uploads/sends and carrier-safe image limits
+    MEDIA_EXECUTOR_WORKERS: int = 8
+    MMS_MAX_IMAGE_BYTES: int = 600 * 1024
+    MMS_MAX_IMAGE_DIMENSION: int = 1600
+
+    # Where media is stored: "cloudinary", or "local" (files under LOCAL_MEDIA_DIR, for tests/dev)
+    MEDIA_STORAGE_BACKEND: str = "cloudinary"
+    LOCAL_MEDIA_DIR: str = "media"
+    MEDIA_UPLOAD_SIGNATURE_TTL_SECONDS: int = 600
+
+    # Inbound MMS attachments are copied from Twilio in the background, a few at a time
+    INBOUND_MEDIA_CONCURRENCY: int = 4
+    INBOUND_MEDIA_MAX_BYTES: int = 20 * 1024 * 1024
+    INBOUND_MEDIA_FETCH_TIMEOUT_SECONDS: float = 30.0
+
+    # Shared Twilio REST client: pooled keep-alive connections, per-call timeout, async send workers
+    TWILIO_HTTP_TIMEOUT_SECONDS: float = 10.0
+    TWILIO_HTTP_POOL_SIZE: int = 20
+    TWILIO_EXECUTOR_WORKERS: int = 16
+
+    # Bulk SMS: messages per second per sending number and per Twilio account, sends in flight,
+    # sent messages per batched insert, how often progress is pushed over SSE, and the most
+    # recipients one request may queue (larger requests get a 422)
+    BULK_SMS_PER_NUMBER_MPS: float = 1.0
+    BULK_SMS_ACCOUNT_MPS: float = 100.0
+    BULK_SMS_MAX_IN_FLIGHT: int = 20
+    BULK_SMS_INSERT_BATCH_SIZE: int = 100
+    BULK_SMS_PROGRESS_INTERVAL_SECONDS: float = 1.0
+    BULK_SMS_MAX_RECIPIENTS: int = 1000
+
+    # Outbound call campaigns: simultaneous calls per user, pacing between dials, no-answer retries,
+    # how long a call may go without an end-of-call webhook, and how often the dialer runs
+    CAMPAIGN_MAX_CONCURRENT_CALLS_PER_USER: int = 3
+    CAMPAIGN_DIAL_INTERVAL_SECONDS: float = 2.0
+    CAMPAIGN_DEFAULT_MAX_ATTEMPTS: int = 3
+    CAMPAIGN_DEFAULT_RETRY_DELAY_SECONDS: int = 1800
+    CAMPAIGN_STALE_CALL_SECONDS: int = 2400
+    CAMPAIGN_TICK_SECONDS: float = 5.0
+
+    # Twilio delivery status callbacks are buffered and written in batches this often;
+    # callbacks for messages not yet in the database are retried for up to MAX_WAIT
+    MESSAGE_STATUS_FLUSH_INTERVAL_SECONDS: float = 1.0
+    MESSAGE_STATUS_MAX_WAIT_SECONDS: float = 60.0
+
+    # Webhook side effects (push notifications, SSE) run from a post-commit queue
+    POST_COMMIT_WORKERS: int = 4
+    POST_COMMIT_QUEUE_MAX_SIZE: int = 10000
+    # How long a phone number -> user lookup is cached (it is also invalidated on change)
+    PHONE_ROUTING_CACHE_TTL_SECONDS: int = 300
+
+    # Rendered system prompts are memoized by (template version, profile values);
+    # per-tenant template overrides are cached for the TTL and invalidated on change
+    PROMPT_RENDER_CACHE_SIZE: int = 1000
+    PROMPT_TEMPLATE_CACHE_TTL_SECONDS: int = 300
+
+    # Vapi assistant-request webhooks are answered from configs built on profile save
+    ASSISTANT_CONFIG_CACHE_TTL_SECONDS: int = 3600
+    # Used for business hours when a profile doesn't set its own timezone
+    DEFAULT_BUSINESS_TIMEZONE: str = "UTC"
+
+    # In-call tool calls (see app/tool_calls.py): the caller hears silence until they return
+    TOOL_CALL_DEFAULT_TIMEOUT_SECONDS: float = 2.0
+    TOOL_CALL_SMS_TIMEOUT_SECONDS: float = 4.0
+    TOOL_STATIC_CACHE_TTL_SECONDS: int = 600
+
+    # Per-business BM25 knowledge index (see app/knowledge_index.py), memory-mapped from this directory
+    KNOWLEDGE_INDEX_DIR: str = "knowledge_index"
+    KNOWLEDGE_INDEX_RELOAD_SECONDS: int = 30
+    KNOWLEDGE_CHUNK_WORDS: int = 80
+    KNOWLEDGE_CHUNK_OVERLAP_WORDS: int = 20
+    KNOWLEDGE_SEARCH_TOP_K: int = 3
+
+    # Inbound calls: Twilio asks /webhook/twilio-inbound for TwiML (when enabled at phone setup)
+    # and unanswered or after-hours calls are redirected to Vapi's Twilio endpoint
+    TWILIO_INBOUND_ROUTING_ENABLED: bool = False
+    VAPI_TWILIO_CALL_URL: str = "https://api.vapi.ai/twilio/call"
+
+    # Twilio Voice access tokens for the app are reused until this long before they expire
+    VOICE_TOKEN_TTL_SECONDS: int = 3600
+    VOICE_TOKEN_REFRESH_MARGIN_SECONDS: int = 300
+    VOICE_TOKEN_BATCH_MAX: int = 100
+
+    # Phone number setup runs its Vapi and Twilio steps concurrently on this many threads
+    PHONE_SETUP_WORKERS: int = 8
+    PHONE_SETUP_BULK_MAX: int = 20
+    VAPI_HTTP_TIMEOUT_SECONDS: float = 15.0
+
+    # POST /setup/assistant saves the profile and runs the Vapi/Twilio work as a background job
+    SETUP_JOB_WORKERS: int = 2
+    # Running jobs refresh a heartbeat this often; one without a heartbeat for STALE seconds
+    # is assumed lost (its process died) and is queued again
+    SETUP_JOB_HEARTBEAT_SECONDS: float = 15.0
+    SETUP_JOB_STALE_SECONDS: int = 120
+
     model_config = SettingsConfigDict(env_file=".env", extra='ignore')
 
 settings = Settings()
\ No newline at end of file
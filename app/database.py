@@ -1,5 +1,6 @@
 # In app/database.py
 
+from typing import Dict
 from sqlmodel import create_engine, SQLModel
 from sqlalchemy import text # <--- IMPORT 'text'
 
@@ -45,4 +46,96 @@ def manually_add_media_urls_column():
         print("--- Successfully added or verified 'media_urls' column in 'message' table. ---")
     except Exception as e:
         # This will likely happen if the column already exists, which is fine.
-        print(f"--- Info: Could not add 'media_urls' column, it likely already exists. Error: {e} ---")
\ No newline at end of file
+        print(f"--- Info: Could not add 'media_urls' column, it likely already exists. Error: {e} ---")
+
+def manually_add_normalized_phone_columns():
+    """
+    Adds the E.164 '*_normalized' phone columns and their indexes to an
+    existing database. Each ALTER is attempted separately so a column that
+    already exists doesn't stop the others.
+    """
+    columns = [
+        ("callsummarydb", "caller_phone_normalized"),
+        ("message", "customer_number_normalized"),
+        ("phonenumber", "phone_number_normalized"),
+    ]
+    for table, column in columns:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} VARCHAR"))
+                connection.commit()
+            print(f"--- Successfully added '{column}' column to '{table}' table. ---")
+        except Exception as e:
+            print(f"--- Info: Could not add '{column}' column, it likely already exists. Error: {e} ---")
+
+    indexes = [
+        "CREATE INDEX IF NOT EXISTS ix_callsummarydb_user_caller_phone_normalized ON callsummarydb (user_id, caller_phone_normalized)",
+        "CREATE INDEX IF NOT EXISTS ix_message_user_customer_number_normalized ON message (user_id, customer_number_normalized)",
+        "CREATE INDEX IF NOT EXISTS ix_phonenumber_phone_number_normalized ON phonenumber (phone_number_normalized)",
+    ]
+    with engine.connect() as connection:
+        for command in indexes:
+            connection.execute(text(command))
+        connection.commit()
+
+
+def manually_add_message_status_columns():
+    """Adds the delivery status columns to an existing 'message' table."""
+    columns = [("status", "VARCHAR"), ("status_updated_at", "DATETIME"), ("error_code", "VARCHAR")]
+    for column, column_type in columns:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text(f"ALTER TABLE message ADD COLUMN {column} {column_type}"))
+                connection.commit()
+            print(f"--- Successfully added '{column}' column to 'message' table. ---")
+        except Exception as e:
+            print(f"--- Info: Could not add '{column}' column, it likely already exists. Error: {e} ---")
+
+
+def manually_add_assistant_hash_columns():
+    """Adds the config/phone-number hash columns to an existing 'assistant' table."""
+    for column in ("config_hash", "phone_numbers_hash"):
+        try:
+            with engine.connect() as connection:
+                connection.execute(text(f"ALTER TABLE assistant ADD COLUMN {column} VARCHAR"))
+                connection.commit()
+            print(f"--- Successfully added '{column}' column to 'assistant' table. ---")
+        except Exception as e:
+            print(f"--- Info: Could not add '{column}' column, it likely already exists. Error: {e} ---")
+
+
+def backfill_normalized_phone_numbers(batch_size: int = 500) -> Dict[str, int]:
+    """
+    Fills in the '*_normalized' phone columns for rows written before they
+    existed. Safe to run on every startup: only rows with a NULL normalized
+    value are touched, in small batches so the write lock is held briefly.
+    """
+    from app.phone_utils import phone_match_key
+
+    backfills = {
+        "callsummarydb": "SELECT id, caller_phone FROM callsummarydb WHERE caller_phone_normalized IS NULL AND caller_phone IS NOT NULL LIMIT :limit",
+        "message": "SELECT id, CASE WHEN direction = 'inbound' THEN from_number ELSE to_number END FROM message WHERE customer_number_normalized IS NULL LIMIT :limit",
+        "phonenumber": "SELECT id, phone_number FROM phonenumber WHERE phone_number_normalized IS NULL LIMIT :limit",
+    }
+    target_columns = {
+        "callsummarydb": "caller_phone_normalized",
+        "message": "customer_number_normalized",
+        "phonenumber": "phone_number_normalized",
+    }
+
+    updated = {}
+    for table, select_sql in backfills.items():
+        column = target_columns[table]
+        updated[table] = 0
+        while True:
+            with engine.begin() as connection:
+                rows = connection.execute(text(select_sql), {"limit": batch_size}).all()
+                if not rows:
+                    break
+                # Rows with no usable number get an empty string so they aren't selected again.
+                params = [{"id": row[0], "value": phone_match_key(row[1]) or ""} for row in rows]
+                connection.execute(text(f"UPDATE {table} SET {column} = :value WHERE id = :id"), params)
+            updated[table] += len(rows)
+        if updated[table]:
+            print(f"--- Backfilled '{column}' for {updated[table]} rows in '{table}'. ---")
+    return updated
@@ -3,8 +3,10 @@ import asyncio
 class EventBroadcaster:
     def __init__(self):
         self._subscribers = set()
+        self._loop = None
 
     async def subscribe(self, queue: asyncio.Queue):
+        self._loop = asyncio.get_running_loop()
         self._subscribers.add(queue)
 
     def unsubscribe(self, queue: asyncio.Queue):
@@ -14,4 +16,18 @@ class EventBroadcaster:
         for queue in self._subscribers:
             await queue.put(message)
 
+    def publish(self, message: str):
+        """Broadcasts without waiting; safe to call from a worker thread."""
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return  # Nobody has subscribed, so nobody is listening.
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            loop.create_task(self.broadcast(message))
+        else:
+            asyncio.run_coroutine_threadsafe(self.broadcast(message), loop)
+
 broadcaster = EventBroadcaster()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import chain
+from typing import Iterator, List, Optional
+
+from sqlalchemy import select
+from sqlmodel import Session
+
+from app.assistant import SUMMARY_ALL_FIELDS
+from app.database import engine
+from app.models import CallSummaryDB, Message
+from app.retention import iter_archived_records
+from app.transcript_store import load_transcripts
+
+MESSAGE_EXPORT_FIELDS = [
+    "message_sid", "to_number", "from_number", "customer_number_normalized",
+    "body", "media_urls", "direction", "status", "error_code", "timestamp",
+]
+
+# Rows fetched from the server-side cursor per round trip.
+_CURSOR_BATCH_SIZE = 500
+# Serialized rows are grouped into chunks of roughly this size before being sent.
+_CHUNK_BYTES = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _stream_rows(model, user_id: str, fields: List[str], since: Optional[datetime]) -> Iterator[dict]:
+    """
+    Yields rows as dicts straight from a server-side cursor, so memory use
+    stays constant regardless of how many rows the user has.
+    """
+    statement = select(*[getattr(model, f) for f in ["id"] + fields]).where(model.user_id == user_id)
+    if since:
+        statement = statement.where(model.timestamp >= since)
+    statement = statement.order_by(model.id)
+
+    hydrate_transcripts = model is CallSummaryDB and "transcript" in fields
+    with engine.connect() as connection, Session(engine) as side_session:
+        result = connection.execution_options(stream_results=True, yield_per=_CURSOR_BATCH_SIZE).execute(statement)
+        for batch in result.partitions():
+            rows = [dict(row._mapping) for row in batch]
+            if hydrate_transcripts:
+                # Compressed transcripts are decompressed one cursor batch at a time.
+                transcripts = load_transcripts(side_session, [row["id"] for row in rows])
+                for row in rows:
+                    row["transcript"] = transcripts.get(row["id"], row["transcript"])
+            yield from rows
+
+
+def _archived_rows(user_id: str, item_types: List[str], fields: List[str], since: Optional[datetime]) -> Iterator[dict]:
+    """Archived records in the same shape as the hot rows; they are older, so they come first."""
+    for record in iter_archived_records(user_id, item_types, since):
+        yield {"id": record.get("id"), **{f: record.get(f) for f in fields}}
+
+
+def _ndjson_chunks(rows: Iterator[dict]) -> Iterator[bytes]:
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, default=_json_default) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= _CHUNK_BYTES:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def _csv_chunks(rows: Iterator[dict], fields: List[str]) -> Iterator[bytes]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["id"] + fields)
+    for row in rows:
+        writer.writerow([
+            json.dumps(value, default=_json_default) if isinstance(value, (list, dict))
+            else value.isoformat() if isinstance(value, datetime)
+            else value
+            for value in row.values()
+        ])
+        if output.tell() >= _CHUNK_BYTES:
+            yield output.getvalue().encode()
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue().encode()
+
+
+def export_call_summaries(user_id: str, export_format: str, since: Optional[datetime] = None, fields: Optional[List[str]] = None) -> Iterator[bytes]:
+    """Streams a user's call summaries, archived ones included, as NDJSON or CSV chunks, oldest first."""
+    fields = fields or SUMMARY_ALL_FIELDS
+    rows = chain(_archived_rows(user_id, ["call"], fields, since), _stream_rows(CallSummaryDB, user_id, fields, since))
+    return _csv_chunks(rows, fields) if export_format == "csv" else _ndjson_chunks(rows)
+
+
+def export_messages(user_id: str, export_format: str, since: Optional[datetime] = None) -> Iterator[bytes]:
+    """Streams a user's messages, archived ones included, as NDJSON or CSV chunks, oldest first."""
+    rows = chain(
+        _archived_rows(user_id, ["message", "file"], MESSAGE_EXPORT_FIELDS, since),
+        _stream_rows(Message, user_id, MESSAGE_EXPORT_FIELDS, since),
+    )
+    return _csv_chunks(rows, MESSAGE_EXPORT_FIELDS) if export_format == "csv" else _ndjson_chunks(rows)
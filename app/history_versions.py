@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import UserHistoryVersion
+
+_BUMP_SQL = text(
+    "INSERT INTO userhistoryversion (user_id, version, updated_at) VALUES (:user_id, 1, :now) "
+    "ON CONFLICT (user_id) DO UPDATE SET version = userhistoryversion.version + 1, updated_at = :now"
+)
+
+
+def bump_history_version(session: Session, user_id: str):
+    """
+    Marks a user's calls/messages as changed. Runs inside the caller's
+    transaction so the new version is visible exactly when the write is.
+    """
+    session.connection().execute(_BUMP_SQL, {"user_id": user_id, "now": datetime.utcnow()})
+
+
+def get_history_version(user_id: str) -> Tuple[int, Optional[datetime]]:
+    """Returns (version, last change time) for a user; (0, None) if nothing was ever written."""
+    with Session(engine) as session:
+        record = session.exec(select(UserHistoryVersion).where(UserHistoryVersion.user_id == user_id)).first()
+        if record:
+            return record.version, record.updated_at
+        return 0, None
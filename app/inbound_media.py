@@ -0,0 +1,105 @@
+"""
+Inbound MMS media: copies the attachments of customer messages into our own
+storage after the Twilio webhook has been answered.
+
+The webhook saves the message and calls enqueue_inbound_media(). A background
+task then downloads each MediaUrlN (with the Twilio credentials, through the
+gateway's pooled session), rehosts it with the same storage used for outbound
+attachments, sets Message.media_urls and pushes a 'media_ready' SSE event. At
+most INBOUND_MEDIA_CONCURRENCY downloads run at once across all messages.
+"""
+import asyncio
+import json
+import logging
+import mimetypes
+import tempfile
+from typing import List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.event_stream import broadcaster
+from app.media import run_in_media_executor, upload_mms_attachment
+from app.message_store import set_message_media_urls
+from app.metrics import metrics
+from app.twilio_gateway import TwilioGateway
+
+logger = logging.getLogger(__name__)
+
+_download_slots: Optional[asyncio.Semaphore] = None
+# Keeps references so running tasks aren't garbage-collected.
+_tasks: Set[asyncio.Task] = set()
+
+
+def media_items_from_form(form) -> List[Tuple[str, Optional[str]]]:
+    """(url, content type) for each MediaUrlN in a Twilio messaging webhook."""
+    try:
+        count = int(form.get("NumMedia") or 0)
+    except ValueError:
+        count = 0
+    items = []
+    for i in range(count):
+        url = form.get(f"MediaUrl{i}")
+        if url:
+            items.append((url, form.get(f"MediaContentType{i}")))
+    return items
+
+
+def enqueue_inbound_media(gateway: TwilioGateway, user_id: str, message_sid: str, from_number: str, items: List[Tuple[str, Optional[str]]]):
+    """Starts rehosting a message's attachments in the background. Must be called on the event loop."""
+    task = asyncio.create_task(_ingest(gateway, user_id, message_sid, from_number, items))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _fetch_and_rehost(gateway: TwilioGateway, user_id: str, url: str, content_type: Optional[str]) -> str:
+    """Downloads one Twilio media item to a spooled temp file and uploads it. Blocking."""
+    with metrics.timer("inbound_media.fetch"):
+        response = gateway.http_client.session.get(
+            url, auth=(gateway.account_sid, gateway.auth_token), stream=True,
+            timeout=settings.INBOUND_MEDIA_FETCH_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        content_type = content_type or response.headers.get("Content-Type")
+
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as file:
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > settings.INBOUND_MEDIA_MAX_BYTES:
+                    response.close()
+                    raise ValueError(f"Media is larger than {settings.INBOUND_MEDIA_MAX_BYTES} bytes.")
+                file.write(chunk)
+
+            extension = mimetypes.guess_extension((content_type or "").split(";")[0].strip()) or ""
+            return upload_mms_attachment(file, user_id, extension, metric="inbound_media.upload")
+
+
+async def _ingest(gateway: TwilioGateway, user_id: str, message_sid: str, from_number: str, items: List[Tuple[str, Optional[str]]]):
+    global _download_slots
+    if _download_slots is None:
+        _download_slots = asyncio.Semaphore(settings.INBOUND_MEDIA_CONCURRENCY)
+
+    async def rehost(url: str, content_type: Optional[str]) -> Optional[str]:
+        async with _download_slots:
+            try:
+                return await run_in_media_executor(_fetch_and_rehost, gateway, user_id, url, content_type)
+            except Exception as e:
+                metrics.increment("inbound_media.failed")
+                logger.error(f"Could not rehost media {url} for message {message_sid}: {e}", exc_info=True)
+                return None
+
+    results = await asyncio.gather(*(rehost(url, content_type) for url, content_type in items))
+    media_urls = [url for url in results if url]
+    if media_urls:
+        await run_in_threadpool(set_message_media_urls, message_sid, media_urls)
+    logger.info(f"Rehosted {len(media_urls)} of {len(items)} media items for message {message_sid}.")
+
+    await broadcaster.broadcast(json.dumps({
+        "event": "media_ready",
+        "userId": user_id,
+        "message_sid": message_sid,
+        "from_number": from_number,
+        "media_urls": media_urls,
+        "failed": len(items) - len(media_urls),
+    }))
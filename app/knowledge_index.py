@@ -0,0 +1,279 @@
+"""
+Per-business BM25 index over what the assistant may be asked about: the
+company details, prices, opening hours and the knowledge entries kept in the
+backend. The assistant searches it through the search_knowledge tool instead
+of carrying all of it in the system prompt on every turn.
+
+An index is built off the request path whenever the profile is saved (or the
+backend reports a knowledge change) and written to KNOWLEDGE_INDEX_DIR as
+plain .npy arrays in CSR layout: for each term, the ids of the chunks that
+contain it and the precomputed BM25 weight of the term in each chunk. Worker
+processes open those arrays with mmap, so loading is instant and the pages
+are shared; a query sums a few array slices and takes the top k.
+
+Layout: <dir>/<user>/<version>/{meta.json, indptr.npy, doc_ids.npy, weights.npy}
+with <dir>/<user>/CURRENT naming the live version, replaced atomically.
+<user> is a hash of the user id, so no user id can name a path outside
+<dir> or share another tenant's directory.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.metrics import metrics
+from app.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i if in is it its of on or our so that the their "
+    "there this to was we what when where which who will with you your".split()
+)
+_KNOWLEDGE_TITLE_KEYS = ("title", "question", "name", "topic")
+_KNOWLEDGE_TEXT_KEYS = ("content", "answer", "text", "body", "description")
+# Version directories are named by the first 16 hex digits of the content hash.
+_VERSION_RE = re.compile(r"[0-9a-f]{16}")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def _split_words(text: str, source: str, max_words: int, overlap: int) -> List[Dict]:
+    words = (text or "").split()
+    chunks, step = [], max(1, max_words - overlap)
+    for start in range(0, len(words), step):
+        chunks.append({"source": source, "text": " ".join(words[start:start + max_words])})
+        if start + max_words >= len(words):
+            break
+    return chunks
+
+
+def build_chunks(profile: Dict, knowledge) -> List[Dict]:
+    """Splits a profile and its knowledge entries into small, self-contained passages."""
+    max_words, overlap = settings.KNOWLEDGE_CHUNK_WORDS, settings.KNOWLEDGE_CHUNK_OVERLAP_WORDS
+    company = profile.get("company_info") or {}
+    chunks: List[Dict] = []
+
+    for paragraph in re.split(r"\n\s*\n", company.get("company_details") or ""):
+        chunks.extend(_split_words(paragraph, "company_details", max_words, overlap))
+
+    for price in profile.get("price_info") or []:
+        if price.get("package_name"):
+            chunks.append({"source": "pricing", "text": f"Price of {price['package_name']}: {price.get('package_price', '')}"})
+
+    hours = [
+        f"{', '.join(h.get('days', []))}: {h.get('start_time', '')} to {h.get('end_time', '')}"
+        for h in profile.get("hours_of_operation") or []
+    ]
+    if hours:
+        chunks.append({"source": "hours", "text": "Opening hours (business hours, when open): " + "; ".join(hours)})
+
+    if isinstance(knowledge, dict):  # A paginated backend response
+        knowledge = knowledge.get("results") or []
+    for entry in knowledge or []:
+        if isinstance(entry, str):
+            title, text = "", entry
+        else:
+            title = next((str(entry[k]) for k in _KNOWLEDGE_TITLE_KEYS if entry.get(k)), "")
+            text = next((str(entry[k]) for k in _KNOWLEDGE_TEXT_KEYS if entry.get(k)), "")
+            if not text:
+                text = " ".join(str(v) for v in entry.values() if isinstance(v, str))
+        for chunk in _split_words(text, "knowledge", max_words, overlap):
+            if title:
+                chunk["text"] = f"{title}: {chunk['text']}"
+            chunks.append(chunk)
+
+    return [c for c in chunks if c["text"].strip()]
+
+
+def _user_dir(user_id: str) -> str:
+    root = os.path.realpath(settings.KNOWLEDGE_INDEX_DIR)
+    user_dir = os.path.realpath(os.path.join(root, hashlib.sha256(user_id.encode("utf-8")).hexdigest()))
+    if os.path.dirname(user_dir) != root:
+        raise ValueError(f"Knowledge index directory for user {user_id} is outside {root}.")
+    return user_dir
+
+
+@contextmanager
+def _tenant_lock(user_dir: str):
+    """An exclusive, cross-process lock on one tenant's index directory."""
+    with open(os.path.join(user_dir, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class KnowledgeIndex:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.version: str = meta["version"]
+        self.chunks: List[Dict] = meta["chunks"]
+        self.vocabulary: Dict[str, int] = meta["vocabulary"]
+        self.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r")
+
+    def search(self, query: str, k: int = 3) -> List[Dict]:
+        term_ids = {self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary}
+        if not term_ids or not self.chunks:
+            return []
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            np.add.at(scores, self.doc_ids[start:end], self.weights[start:end])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**self.chunks[i], "score": round(float(scores[i]), 4)}
+            for i in top if scores[i] > 0
+        ]
+
+
+def write_index(user_id: str, chunks: List[Dict]) -> str:
+    """Builds and publishes a tenant's index. Returns its version; unchanged content is not rewritten."""
+    version = hashlib.sha256(json.dumps(chunks, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    user_dir = _user_dir(user_id)
+    if current_version(user_id) == version:
+        return version
+
+    with metrics.timer("knowledge_index.build"):
+        documents = [Counter(tokenize(c["text"])) for c in chunks]
+        lengths = [sum(d.values()) for d in documents]
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        postings: Dict[str, List[tuple]] = {}
+        for doc_id, counts in enumerate(documents):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        vocabulary = {term: i for i, term in enumerate(sorted(postings))}
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_ids: List[int] = []
+        weights: List[float] = []
+        for term, term_id in vocabulary.items():
+            entries = postings[term]
+            idf = math.log(1 + (len(documents) - len(entries) + 0.5) / (len(entries) + 0.5))
+            for doc_id, tf in entries:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / (avg_length or 1))
+                doc_ids.append(doc_id)
+                weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+            indptr[term_id + 1] = len(doc_ids)
+
+        os.makedirs(user_dir, exist_ok=True)
+        staging = os.path.join(user_dir, f".{version}.{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": version, "chunks": chunks, "vocabulary": vocabulary}, f)
+        np.save(os.path.join(staging, "indptr.npy"), indptr)
+        np.save(os.path.join(staging, "doc_ids.npy"), np.asarray(doc_ids, dtype=np.int32))
+        np.save(os.path.join(staging, "weights.npy"), np.asarray(weights, dtype=np.float32))
+
+        # Publishing and cleanup are serialized per tenant across processes, so
+        # one builder's cleanup can't remove a version another just published.
+        with _tenant_lock(user_dir):
+            final = os.path.join(user_dir, version)
+            if os.path.isdir(final):
+                shutil.rmtree(staging)
+            else:
+                os.replace(staging, final)
+            pointer = os.path.join(user_dir, f".CURRENT.{uuid.uuid4().hex}")
+            with open(pointer, "w", encoding="utf-8") as f:
+                f.write(version)
+            os.replace(pointer, os.path.join(user_dir, "CURRENT"))
+
+            # Older versions can go; processes that still map them keep their pages until they reload.
+            # Only version directories we wrote are removed, and only inside this tenant's directory.
+            live = current_version(user_id)
+            for name in os.listdir(user_dir):
+                path = os.path.join(user_dir, name)
+                if (
+                    name != live and _VERSION_RE.fullmatch(name) and os.path.isdir(path)
+                    and not os.path.islink(path) and os.path.dirname(os.path.realpath(path)) == user_dir
+                ):
+                    shutil.rmtree(path, ignore_errors=True)
+    _loaded.invalidate(user_id)
+    logger.info(f"Built knowledge index {version} for user {user_id}: {len(chunks)} chunks, {len(vocabulary)} terms.")
+    return version
+
+
+def current_version(user_id: str) -> Optional[str]:
+    try:
+        with open(os.path.join(_user_dir(user_id), "CURRENT"), encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version if _VERSION_RE.fullmatch(version) else None
+
+
+# Opened indexes per user; the TTL is how soon a rebuild by another process is picked up.
+_loaded = TTLCache("knowledge_index", ttl_seconds=settings.KNOWLEDGE_INDEX_RELOAD_SECONDS, max_entries=2000)
+
+
+def load_index(user_id: str) -> Optional[KnowledgeIndex]:
+    def load() -> Optional[KnowledgeIndex]:
+        for _ in range(2):
+            version = current_version(user_id)
+            if not version:
+                return None
+            try:
+                return KnowledgeIndex(os.path.join(_user_dir(user_id), version))
+            except FileNotFoundError:
+                # A rebuild replaced and removed that version between the two reads.
+                continue
+        return None
+
+    return _loaded.get_or_load(user_id, load)
+
+
+def search_knowledge(user_id: str, query: str, k: Optional[int] = None) -> List[Dict]:
+    with metrics.timer("knowledge_index.search"):
+        index = load_index(user_id)
+        return index.search(query, k or settings.KNOWLEDGE_SEARCH_TOP_K) if index else []
+
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="knowledge-index")
+_pending_lock = threading.Lock()
+_pending: Dict[str, tuple] = {}
+
+
+def schedule_rebuild(user_id: str, profile: Dict, fetch_knowledge: Callable[[str], List[Dict]]):
+    """
+    Rebuilds a tenant's index in the background. Saves that arrive while a
+    rebuild is queued replace its input, so a burst of saves builds once.
+    """
+    with _pending_lock:
+        already_queued = user_id in _pending
+        _pending[user_id] = (profile, fetch_knowledge)
+    if not already_queued:
+        _executor.submit(_rebuild, user_id)
+
+
+def _rebuild(user_id: str):
+    with _pending_lock:
+        profile, fetch_knowledge = _pending.pop(user_id)
+    try:
+        write_index(user_id, build_chunks(profile, fetch_knowledge(user_id)))
+    except Exception as e:
+        metrics.increment("knowledge_index.build_failed")
+        logger.error(f"Failed to build knowledge index for user {user_id}: {e}", exc_info=True)
@@ -0,0 +1,53 @@
+"""
+Single-row leases for background work that every process starts but only
+one may do at a time. A lease is a WorkerLease row naming its owner and an
+expiry; taking it is one conditional UPDATE (or the first INSERT), so it
+works the same on SQLite and Postgres. A holder that dies simply lets its
+lease expire.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.database import engine
+from app.models import WorkerLease
+
+# Identifies this process as a lease owner.
+PROCESS_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(name: str, ttl_seconds: float, owner: str = PROCESS_OWNER) -> bool:
+    """Takes or renews the lease for ttl_seconds. False while another live owner holds it."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    with Session(engine) as session:
+        taken = session.execute(
+            update(WorkerLease)
+            .where(WorkerLease.name == name, or_(WorkerLease.owner == owner, WorkerLease.expires_at < now))
+            .values(owner=owner, expires_at=expires_at)
+        ).rowcount
+        if taken:
+            session.commit()
+            return True
+        session.add(WorkerLease(name=name, owner=owner, expires_at=expires_at))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return False
+        return True
+
+
+def release_lease(name: str, owner: str = PROCESS_OWNER):
+    with Session(engine) as session:
+        session.execute(
+            update(WorkerLease)
+            .where(WorkerLease.name == name, WorkerLease.owner == owner)
+            .values(expires_at=datetime.utcnow())
+        )
+        session.commit()
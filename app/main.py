@@ -1,21 +1,57 @@
 from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv 
 load_dotenv()
-from app.api.endpoints import setup, webhooks, calls, summaries, notifications, messaging, history
-from app.database import create_db_and_tables, manually_add_media_urls_column, manually_add_structured_summary_column
+from app.api.endpoints import setup, webhooks, calls, summaries, notifications, messaging, history, export
+from app.database import (
+    create_db_and_tables,
+    manually_add_media_urls_column,
+    manually_add_structured_summary_column,
+    manually_add_normalized_phone_columns,
+    manually_add_message_status_columns,
+    manually_add_assistant_hash_columns,
+    backfill_normalized_phone_numbers,
+)
 import json
 from starlette.requests import Request
 from app.firebase_service import initialize_firebase
+from app.media import configure_cloudinary, use_local_storage
+from app.config import settings
+import os
+from app.search import create_search_index, rebuild_search_index
+from app.metrics import metrics
+from app.retention import retention_worker
+from app.campaigns import campaign_worker
+from app.message_status import message_status_worker
+from app.post_commit import post_commit_queue
+from app.setup_jobs import setup_job_runner
+from app.api.deps import orani_assistant
+import asyncio
 
 def on_startup():
     create_db_and_tables()
     manually_add_structured_summary_column()
     manually_add_media_urls_column()
+    manually_add_normalized_phone_columns()
+    manually_add_message_status_columns()
+    manually_add_assistant_hash_columns()
+    backfill_normalized_phone_numbers()
+    if create_search_index():
+        rebuild_search_index()
     initialize_firebase()
+    configure_cloudinary()
+
+async def start_background_workers():
+    # Keep a reference so the task isn't garbage-collected while it sleeps.
+    app.state.retention_task = asyncio.create_task(retention_worker())
+    app.state.campaign_task = asyncio.create_task(campaign_worker(orani_assistant))
+    app.state.message_status_task = asyncio.create_task(message_status_worker())
+    post_commit_queue.start(settings.POST_COMMIT_WORKERS)
+    await setup_job_runner.start(orani_assistant, settings.SETUP_JOB_WORKERS)
 
 app = FastAPI(
     title="Orani AI Assistant API",
-    on_startup=[on_startup],
+    on_startup=[on_startup, start_background_workers],
     description="API for managing and interacting with the Orani AI phone assistant.",
     version="1.0.0"
 )
@@ -53,8 +89,19 @@ app.include_router(summaries.router, prefix="/summaries", tags=["Summaries"])
 app.include_router(notifications.router, prefix="/notifications", tags=["Notifications"])
 app.include_router(messaging.router, prefix="/messaging", tags=["Messaging"])
 app.include_router(history.router, prefix="/history", tags=["History"])
+app.include_router(export.router, prefix="/export", tags=["Export"])
+
+if use_local_storage():
+    # Development stand-in for Cloudinary: serve directly-uploaded MMS attachments.
+    os.makedirs(settings.LOCAL_MEDIA_DIR, exist_ok=True)
+    app.mount("/media", StaticFiles(directory=settings.LOCAL_MEDIA_DIR), name="media")
 
 @app.get("/", tags=["Root"])
 def read_root():
     """A simple health check endpoint."""
-    return {"status": "Orani AI Assistant API is running"}
\ No newline at end of file
+    return {"status": "Orani AI Assistant API is running"}
+
+@app.get("/metrics", tags=["Root"])
+def read_metrics():
+    """In-process counters, latency timings and cache statistics for this worker."""
+    return metrics.snapshot()
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Media handling for MMS attachments.
+
+Everything here is blocking (Pillow, the Cloudinary SDK), so the async
+endpoints call it through run_in_media_executor(), a bounded thread pool
+that keeps large uploads from stalling the event loop or exhausting the
+default threadpool that the sync endpoints share.
+"""
+import asyncio
+import hashlib
+import hmac
+import io
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import BinaryIO, Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+import cloudinary
+import cloudinary.uploader
+import cloudinary.utils
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+media_executor = ThreadPoolExecutor(max_workers=settings.MEDIA_EXECUTOR_WORKERS, thread_name_prefix="media")
+
+# Formats carriers reliably display; anything else is re-encoded as JPEG.
+_PASSTHROUGH_FORMATS = {"JPEG", "PNG", "GIF"}
+
+MMS_FOLDER_ROOT = "mms_attachments"
+# Cloudinary rejects signed requests whose timestamp is more than an hour old.
+_CLOUDINARY_SIGNATURE_WINDOW_SECONDS = 3600
+
+
+def use_local_storage() -> bool:
+    return settings.MEDIA_STORAGE_BACKEND == "local"
+
+
+def mms_folder(user_id: str) -> str:
+    """
+    The storage folder a user's MMS attachments live under. Named by a hash
+    of the user id, so every user gets a distinct, path-safe folder.
+    """
+    return f"{MMS_FOLDER_ROOT}/{hashlib.sha256(user_id.encode('utf-8')).hexdigest()}"
+
+
+def configure_cloudinary():
+    """Configures the Cloudinary SDK once, at startup."""
+    cloudinary.config(
+        cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+        api_key=settings.CLOUDINARY_API_KEY,
+        api_secret=settings.CLOUDINARY_API_SECRET,
+        secure=True
+    )
+
+
+async def run_in_media_executor(func: Callable[..., T], *args, **kwargs) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(media_executor, partial(func, *args, **kwargs))
+
+
+def _file_size(file: BinaryIO) -> int:
+    position = file.tell()
+    file.seek(0, io.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+def prepare_mms_image(file: BinaryIO) -> Tuple[BinaryIO, Optional[str]]:
+    """
+    Downscales and re-encodes an image so it fits MMS limits. Returns the file
+    to upload (the original if it already fits or isn't an image) and the
+    new content type if it was re-encoded.
+    """
+    with metrics.timer("messaging.send.prepare_image"):
+        file.seek(0)
+        try:
+            image = Image.open(file)
+            image_format = image.format
+            width, height = image.size
+        except Exception:
+            # Not an image (e.g. a PDF or vCard); send it as-is.
+            file.seek(0)
+            return file, None
+
+        max_dimension = settings.MMS_MAX_IMAGE_DIMENSION
+        fits = (
+            image_format in _PASSTHROUGH_FORMATS
+            and _file_size(file) <= settings.MMS_MAX_IMAGE_BYTES
+            and max(width, height) <= max_dimension
+        )
+        # Animated GIFs lose their animation when re-encoded, so leave them alone.
+        if fits or getattr(image, "is_animated", False):
+            file.seek(0)
+            return file, None
+
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((max_dimension, max_dimension))
+
+        output = io.BytesIO()
+        for quality in (85, 75, 65, 50, 35):
+            output.seek(0)
+            output.truncate()
+            image.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+            if output.tell() <= settings.MMS_MAX_IMAGE_BYTES:
+                break
+            if quality == 50:
+                # Quality alone isn't enough; shrink the image as well.
+                image.thumbnail((max_dimension // 2, max_dimension // 2))
+
+        logger.info(f"Re-encoded MMS image from {width}x{height} {image_format} to {image.size[0]}x{image.size[1]} JPEG ({output.tell()} bytes).")
+        output.seek(0)
+        return output, "image/jpeg"
+
+
+def upload_mms_attachment(file: BinaryIO, user_id: str, extension: str = "", metric: str = "messaging.send.upload") -> Optional[str]:
+    """
+    Uploads an attachment to Cloudinary (or local storage) under the user's
+    MMS folder and returns its URL. The file object (e.g. the request's
+    spooled temp file) is passed through as a stream rather than read into
+    memory first.
+    """
+    folder = f"{mms_folder(user_id)}/{datetime.now().strftime('%Y-%m')}"
+    with metrics.timer(metric):
+        file.seek(0)
+        if use_local_storage():
+            return store_local_media(folder, f"{uuid.uuid4().hex}{extension}", file)
+        upload_result = cloudinary.uploader.upload(file, folder=folder, resource_type="auto")
+    return upload_result.get("secure_url")
+
+
+def create_upload_signature(user_id: str) -> Dict:
+    """
+    Short-lived signed parameters that let the app upload an attachment
+    straight to storage, then send just the resulting URL to /messaging/send.
+    """
+    folder = f"{mms_folder(user_id)}/{datetime.utcnow().strftime('%Y-%m')}"
+    public_id = uuid.uuid4().hex
+    ttl = settings.MEDIA_UPLOAD_SIGNATURE_TTL_SECONDS
+    now = int(time.time())
+
+    if use_local_storage():
+        fields = {"folder": folder, "public_id": public_id, "expires_at": now + ttl}
+        fields["signature"] = _local_signature(fields)
+        return {"upload_url": f"{settings.PUBLIC_BASE_URL}/messaging/local-upload", "fields": fields, "expires_at": now + ttl}
+
+    # Backdating the timestamp makes Cloudinary's one-hour window close after `ttl` seconds.
+    timestamp = now - _CLOUDINARY_SIGNATURE_WINDOW_SECONDS + ttl
+    params = {"folder": folder, "public_id": public_id, "timestamp": timestamp}
+    signature = cloudinary.utils.api_sign_request(params, settings.CLOUDINARY_API_SECRET)
+    return {
+        "upload_url": f"https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}/auto/upload",
+        "fields": {**params, "api_key": settings.CLOUDINARY_API_KEY, "signature": signature},
+        "expires_at": now + ttl,
+    }
+
+
+def _local_signature(fields: Dict) -> str:
+    message = f"{fields['folder']}|{fields['public_id']}|{fields['expires_at']}".encode()
+    return hmac.new(settings.CLOUDINARY_API_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local_upload(fields: Dict) -> bool:
+    """Checks an upload against parameters issued by create_upload_signature() in local mode."""
+    try:
+        if int(fields["expires_at"]) < time.time():
+            return False
+        return hmac.compare_digest(_local_signature(fields), str(fields["signature"]))
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def store_local_media(folder: str, filename: str, file: BinaryIO) -> str:
+    """Local stand-in for Cloudinary: saves under LOCAL_MEDIA_DIR, served at /media."""
+    if ".." in folder or "/" in filename or ".." in filename:
+        raise ValueError("Invalid media path.")
+    directory = os.path.join(settings.LOCAL_MEDIA_DIR, folder)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, filename), "wb") as destination:
+        shutil.copyfileobj(file, destination)
+    return f"{settings.PUBLIC_BASE_URL}/media/{folder}/{filename}"
+
+
+def is_allowed_media_url(user_id: str, url: str) -> bool:
+    """
+    Only URLs inside the user's own MMS folder in our storage may be sent,
+    so /messaging/send can't be used to relay arbitrary links.
+    """
+    folder = mms_folder(user_id)
+    parsed = urlparse(url)
+    if ".." in parsed.path or parsed.query or parsed.fragment:
+        return False
+
+    if use_local_storage():
+        return url.startswith(f"{settings.PUBLIC_BASE_URL}/media/{folder}/")
+
+    pattern = rf"^/{re.escape(settings.CLOUDINARY_CLOUD_NAME)}/(image|video|raw)/upload/(v\d+/)?{re.escape(folder)}/[\w\-./]+$"
+    return parsed.scheme == "https" and parsed.netloc == "res.cloudinary.com" and re.match(pattern, parsed.path) is not None
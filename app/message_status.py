@@ -0,0 +1,184 @@
+"""
+Delivery status tracking for outbound messages.
+
+Twilio posts a status callback for every state change of every message
+(queued, sent, delivered, ...). /webhook/twilio-status only records the
+callback in an in-memory buffer and returns; message_status_worker() flushes
+the buffer every MESSAGE_STATUS_FLUSH_INTERVAL_SECONDS as one batched UPDATE
+keyed by message_sid, then sends one SSE event per user for the whole batch.
+Several callbacks for the same message between flushes collapse into one
+write, and a status never moves backwards when callbacks arrive out of order.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.config import settings
+from app.database import engine
+from app.event_stream import broadcaster
+from app.history_versions import bump_history_version
+from app.metrics import metrics
+from app.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+STATUS_CALLBACK_PATH = "/webhook/twilio-status"
+
+# Later states win over earlier ones; terminal states share the top ranks.
+STATUS_RANK = {
+    "accepted": 0, "scheduled": 0, "queued": 1, "sending": 2, "sent": 3,
+    "delivered": 4, "undelivered": 4, "failed": 4, "read": 5, "canceled": 4,
+}
+
+_rank_case = " ".join(f"WHEN '{status}' THEN {rank}" for status, rank in STATUS_RANK.items())
+_UPDATE_SQL = text(
+    "UPDATE message SET status = :status, error_code = :error_code, status_updated_at = :updated_at "
+    f"WHERE message_sid = :message_sid AND COALESCE(CASE status {_rank_case} END, -1) <= :rank"
+)
+
+
+def status_callback_url() -> str:
+    return f"{settings.PUBLIC_BASE_URL}{STATUS_CALLBACK_PATH}"
+
+
+class StatusUpdate:
+    __slots__ = ("message_sid", "status", "error_code", "received_at", "first_seen")
+
+    def __init__(self, message_sid: str, status: str, error_code: Optional[str]):
+        self.message_sid = message_sid
+        self.status = status
+        self.error_code = error_code
+        self.received_at = datetime.utcnow()
+        self.first_seen = time.monotonic()
+
+    @property
+    def rank(self) -> int:
+        return STATUS_RANK.get(self.status, 0)
+
+
+class MessageStatusBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, StatusUpdate] = {}
+
+    def add(self, message_sid: str, status: str, error_code: Optional[str] = None):
+        update = StatusUpdate(message_sid, status, error_code)
+        with self._lock:
+            self._merge(update)
+        metrics.increment("message_status.received")
+
+    def _merge(self, update: StatusUpdate):
+        current = self._pending.get(update.message_sid)
+        if current is None:
+            self._pending[update.message_sid] = update
+            return
+        metrics.increment("message_status.coalesced")
+        if update.rank >= current.rank:
+            update.first_seen = min(update.first_seen, current.first_seen)
+            self._pending[update.message_sid] = update
+
+    def flush(self) -> Dict[str, List[Dict]]:
+        """
+        Writes all buffered updates in one transaction. Returns the applied
+        updates grouped by user for the SSE events.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return {}
+
+        try:
+            with metrics.timer("message_status.flush"), Session(engine) as session:
+                connection = session.connection()
+                owners = self._lookup_owners(connection, list(batch))
+                found = [u for sid, u in batch.items() if sid in owners]
+                if found:
+                    connection.execute(_UPDATE_SQL, [
+                        {"message_sid": u.message_sid, "status": u.status, "error_code": u.error_code,
+                         "updated_at": u.received_at, "rank": u.rank}
+                        for u in found
+                    ])
+                    for user_id in {owners[u.message_sid][0] for u in found}:
+                        bump_history_version(session, user_id)
+                session.commit()
+        except Exception:
+            # Keep the updates for the next flush rather than losing them.
+            self._requeue_missing(list(batch.values()))
+            raise
+
+        self._requeue_missing([u for sid, u in batch.items() if sid not in owners])
+
+        by_user: Dict[str, List[Dict]] = defaultdict(list)
+        for update in found:
+            user_id, customer_number = owners[update.message_sid]
+            by_user[user_id].append({
+                "message_sid": update.message_sid,
+                "status": update.status,
+                "error_code": update.error_code,
+                "customer_number": customer_number,
+            })
+        for user_id in by_user:
+            response_cache.invalidate_user(user_id)
+        metrics.increment("message_status.applied", len(found))
+        return by_user
+
+    @staticmethod
+    def _lookup_owners(connection, message_sids: List[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+        owners = {}
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(message_sids), 500):
+            chunk = message_sids[start:start + 500]
+            placeholders = ", ".join(f":sid{i}" for i in range(len(chunk)))
+            rows = connection.execute(
+                text(f"SELECT message_sid, user_id, customer_number_normalized FROM message WHERE message_sid IN ({placeholders})"),
+                {f"sid{i}": sid for i, sid in enumerate(chunk)},
+            ).all()
+            owners.update({sid: (user_id, customer) for sid, user_id, customer in rows})
+        return owners
+
+    def _requeue_missing(self, updates: List[StatusUpdate]):
+        """
+        A callback can beat the insert of its own message (e.g. a bulk send
+        batch not yet written), so unknown sids are retried for a while.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for update in updates:
+                if now - update.first_seen < settings.MESSAGE_STATUS_MAX_WAIT_SECONDS:
+                    self._merge(update)
+                else:
+                    metrics.increment("message_status.dropped")
+                    logger.warning(f"Dropping status '{update.status}' for unknown message {update.message_sid}.")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+
+message_status_buffer = MessageStatusBuffer()
+metrics.register_gauge("message_status_buffer", lambda: {"pending": len(message_status_buffer)})
+
+
+async def message_status_worker():
+    """Background task started on app startup."""
+    while True:
+        await asyncio.sleep(settings.MESSAGE_STATUS_FLUSH_INTERVAL_SECONDS)
+        try:
+            by_user = await asyncio.to_thread(message_status_buffer.flush)
+        except Exception as e:
+            logger.error(f"Failed to flush message status updates: {e}", exc_info=True)
+            continue
+        for user_id, updates in by_user.items():
+            await broadcaster.broadcast(json.dumps({
+                "event": "message_status",
+                "userId": user_id,
+                "updates": updates,
+            }))
@@ -0,0 +1,81 @@
+from typing import List, Optional
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.history_versions import bump_history_version
+from app.models import Message
+from app.response_cache import response_cache
+from app.search import index_message
+
+
+def save_messages(messages: List[Message]):
+    """
+    Inserts messages in a single transaction, together with their search
+    index entries and the owners' history version bumps, then drops the
+    owners' cached responses.
+    """
+    if not messages:
+        return
+    user_ids = {m.user_id for m in messages}
+    with Session(engine) as session:
+        session.add_all(messages)
+        session.flush()
+        for message in messages:
+            index_message(session, message)
+        for user_id in user_ids:
+            bump_history_version(session, user_id)
+        session.commit()
+        for message in messages:
+            session.refresh(message)
+    for user_id in user_ids:
+        response_cache.invalidate_user(user_id)
+
+
+def save_message(message: Message):
+    save_messages([message])
+
+
+def save_message_if_new(message: Message) -> bool:
+    """
+    Inserts a message unless one with the same message_sid is already stored
+    (Twilio retries webhooks it didn't get a timely answer for). Returns
+    whether it was inserted.
+    """
+    insert = postgresql_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    statement = (
+        insert(Message)
+        .values(**message.model_dump(exclude={"id"}))
+        .on_conflict_do_nothing(index_elements=["message_sid"])
+        .returning(Message.id)
+    )
+    with Session(engine) as session:
+        message.id = session.execute(statement).scalar()
+        if message.id is None:
+            session.rollback()
+            return False
+        index_message(session, message)
+        bump_history_version(session, message.user_id)
+        session.commit()
+    response_cache.invalidate_user(message.user_id)
+    return True
+
+
+def set_message_media_urls(message_sid: str, media_urls: List[str]) -> Optional[Message]:
+    """Attaches rehosted media to a saved message (see app/inbound_media.py) and re-indexes it."""
+    with Session(engine) as session:
+        message = session.exec(select(Message).where(Message.message_sid == message_sid)).first()
+        if not message:
+            return None
+        message.media_urls = media_urls
+        session.add(message)
+        session.flush()
+        # The index entry's item_type turns from 'message' into 'file'.
+        index_message(session, message)
+        bump_history_version(session, message.user_id)
+        session.commit()
+        session.refresh(message)
+    response_cache.invalidate_user(message.user_id)
+    return message
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict
+
+
+class Metrics:
+    """
+    A small in-process metrics registry: counters, latency timings and gauges
+    (callbacks evaluated when a snapshot is taken). Exposed at GET /metrics.
+    """
+
+    # Recent samples kept per timing for percentiles.
+    SAMPLE_SIZE = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._timings: Dict[str, Dict] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+        self._gauges: Dict[str, Callable[[], Dict]] = {}
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        """Records one duration, in seconds."""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = {"count": 0, "total": 0.0, "max": 0.0}
+                self._samples[name] = deque(maxlen=self.SAMPLE_SIZE)
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            self._samples[name].append(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Times the body of a `with` block; also counts '<name>.errors' if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(f"{name}.errors")
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def register_gauge(self, name: str, callback: Callable[[], Dict]):
+        self._gauges[name] = callback
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {}
+            for name, timing in self._timings.items():
+                samples = sorted(self._samples[name])
+                timings[name] = {
+                    "count": timing["count"],
+                    "avg_ms": round(timing["total"] / timing["count"] * 1000, 3),
+                    "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+                    "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+                    "max_ms": round(timing["max"] * 1000, 3),
+                }
+        gauges = {name: callback() for name, callback in self._gauges.items()}
+        return {"counters": counters, "timings": timings, "gauges": gauges}
+
+
+metrics = Metrics()
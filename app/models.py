@@ -1,5 +1,6 @@
 from typing import List, Optional, Dict, Any
 from sqlmodel import Field, SQLModel, JSON, Column
+from sqlalchemy import Index, LargeBinary
 from datetime import datetime
 
 class BusinessProfile(SQLModel, table=True):
@@ -16,13 +17,23 @@ class Assistant(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(unique=True, index=True)
     assistant_id: str
+    # Hashes of what was last pushed to Vapi/Twilio, so unchanged saves skip the remote calls
+    config_hash: Optional[str] = Field(default=None)
+    phone_numbers_hash: Optional[str] = Field(default=None)
 
 class CallSummaryDB(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_callsummarydb_user_caller_phone_normalized", "user_id", "caller_phone_normalized"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     call_id: str = Field(index=True)
     user_id: str = Field(index=True) 
     caller_phone: str
+    # Canonical E.164 form of caller_phone, used for exact customer lookups
+    caller_phone_normalized: Optional[str] = Field(default=None)
     duration: int
+    # Empty for rows whose transcript has been moved to CallTranscript (compressed)
     transcript: str
     summary: str
     key_points: List[str] = Field(sa_column=Column(JSON))
@@ -36,6 +47,10 @@ class CallSummaryDB(SQLModel, table=True):
 
 # In app/models.py
 class Message(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_message_user_customer_number_normalized", "user_id", "customer_number_normalized"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(index=True)
     
@@ -45,6 +60,10 @@ class Message(SQLModel, table=True):
     # The 'to' and 'from' numbers
     to_number: str
     from_number: str
+
+    # Canonical E.164 form of the customer's number (from_number for inbound,
+    # to_number for outbound), used for exact customer lookups
+    customer_number_normalized: Optional[str] = Field(default=None)
     
     # The content of the message
     body: str
@@ -52,6 +71,11 @@ class Message(SQLModel, table=True):
     
     # Was it an 'inbound' (customer reply) or 'outbound' (user sent) message?
     direction: str 
+
+    # Delivery status of outbound messages, from Twilio status callbacks
+    status: Optional[str] = Field(default=None)
+    status_updated_at: Optional[datetime] = Field(default=None)
+    error_code: Optional[str] = Field(default=None)
     
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
@@ -59,5 +83,112 @@ class PhoneNumber(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(index=True)
     phone_number: str = Field(unique=True, index=True) # The number string, e.g., +1888...
+    phone_number_normalized: Optional[str] = Field(default=None, index=True) # Canonical E.164 form
     vapi_phone_id: str # The ID from Vapi, e.g., phone_... or a UUID
-    is_active: bool = Field(default=False) # Is this the number currently linked to the assistant?
\ No newline at end of file
+    is_active: bool = Field(default=False) # Is this the number currently linked to the assistant?
+
+class UserHistoryVersion(SQLModel, table=True):
+    # Bumped in the same transaction as every call summary or message written
+    # for the user; drives ETag/Last-Modified on the read endpoints.
+    user_id: str = Field(primary_key=True)
+    version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TranscriptDictionary(SQLModel, table=True):
+    # A compression dictionary trained on our own transcripts (see app/transcript_store.py)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    codec: str
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CallTranscript(SQLModel, table=True):
+    # Compressed transcript for a CallSummaryDB row, kept out of the hot table
+    call_summary_id: int = Field(primary_key=True, foreign_key="callsummarydb.id")
+    codec: str
+    dictionary_id: Optional[int] = Field(default=None, foreign_key="transcriptdictionary.id")
+    raw_size: int
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+class RetentionPolicy(SQLModel, table=True):
+    # Calls and messages older than hot_days are moved to archive segments
+    user_id: str = Field(primary_key=True)
+    hot_days: int
+    enabled: bool = Field(default=True)
+
+class ArchivedItem(SQLModel, table=True):
+    # Thin stand-in for an archived call or message, kept for inbox/history continuity
+    __table_args__ = (
+        Index("ix_archiveditem_user_timestamp", "user_id", "timestamp"),
+        Index("ix_archiveditem_user_customer", "user_id", "customer_number_normalized"),
+        Index("ix_archiveditem_user_item", "user_id", "item_type", "item_key"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str
+    item_type: str  # 'call', 'message' or 'file'
+    item_key: str  # call_id or message_sid
+    customer_number_normalized: Optional[str] = Field(default=None)
+    timestamp: datetime
+    preview: str = Field(default="")
+    segment_path: str  # gzip JSONL file holding the full record
+    segment_line: int
+
+class WorkerLease(SQLModel, table=True):
+    # Lets one process at a time run a background job that every process starts (see app/leases.py)
+    name: str = Field(primary_key=True)
+    owner: str
+    expires_at: datetime
+
+class CallCampaign(SQLModel, table=True):
+    # A list of numbers the assistant dials through (see app/campaigns.py)
+    id: str = Field(primary_key=True)
+    user_id: str = Field(index=True)
+    from_number: str
+    vapi_phone_id: str
+    status: str = Field(default="running", index=True)  # running, paused, cancelled, completed
+    max_concurrent: int
+    max_attempts: int
+    retry_delay_seconds: int
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(default=None)
+
+class CampaignCall(SQLModel, table=True):
+    # One number in a campaign; status follows the Vapi webhooks for its latest attempt
+    __table_args__ = (
+        Index("ix_campaigncall_campaign_status_next", "campaign_id", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    campaign_id: str = Field(foreign_key="callcampaign.id")
+    user_id: str = Field(index=True)
+    to_number: str
+    status: str = Field(default="queued")  # queued, dialing, in-progress, completed, no-answer, failed, cancelled
+    attempts: int = Field(default=0)
+    vapi_call_id: Optional[str] = Field(default=None, index=True)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    ended_reason: Optional[str] = Field(default=None)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PromptTemplateOverride(SQLModel, table=True):
+    # A tenant's replacement for the default system prompt template (see app/prompt_templates.py)
+    user_id: str = Field(primary_key=True)
+    template: str
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SetupJob(SQLModel, table=True):
+    # The remote half of a POST /setup/assistant (see app/setup_jobs.py)
+    __table_args__ = (
+        Index("ix_setupjob_user_payload_hash", "user_id", "payload_hash"),
+    )
+
+    id: str = Field(primary_key=True)
+    user_id: str = Field(index=True)
+    payload_hash: str
+    payload: Dict = Field(sa_column=Column(JSON))
+    status: str = Field(default="queued", index=True)  # queued, running, succeeded, failed, superseded
+    step: Optional[str] = Field(default=None)  # assistant, phone_numbers
+    result: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = Field(default=None)
+    attempts: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
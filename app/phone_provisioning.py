@@ -0,0 +1,190 @@
+"""
+Provisioning of a user's phone numbers in Vapi and Twilio.
+
+Each number has two independent halves: in Vapi it is imported (or
+re-pointed) at the user's assistant, and in Twilio its messaging (and
+optionally voice) webhooks are pointed at us. They run as a small dependency
+graph on a shared pool:
+
+    Vapi: list numbers ──> create / PATCH each number ──┐
+                                                        ├──> local DB write
+    Twilio: look up each number ──> update webhooks ────┘
+
+The only cross edge is for inbound voice routing: importing a number into
+Vapi rewrites its Twilio voice URL, so when we set our own voice URL the
+Twilio update waits for that number's Vapi step. Only the orchestrating
+thread ever waits, so the pool can't deadlock on itself.
+
+If one half fails, whatever the other half changed is rolled back (the Vapi
+number deleted or re-pointed at its previous assistant, the Twilio webhooks
+restored) so a number is either fully set up or left as it was.
+"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.PHONE_SETUP_WORKERS, thread_name_prefix="phone-setup")
+_TWILIO_WEBHOOK_FIELDS = ("sms_url", "sms_method", "voice_url", "voice_method")
+
+
+@dataclass
+class NumberSetup:
+    phone_number: str
+    status: str = "pending"  # configured, failed
+    vapi_phone: Optional[Dict] = None
+    vapi_action: Optional[str] = None  # created, reassigned, unchanged
+    previous_assistant_id: Optional[str] = None
+    twilio_number: Any = None
+    twilio_previous: Optional[Dict] = None
+    twilio_updated: bool = False
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "phone_number": self.phone_number,
+            "status": self.status,
+            "vapi_phone_id": (self.vapi_phone or {}).get("id"),
+            "vapi_action": self.vapi_action,
+            "error": self.error,
+        }
+
+
+def _list_vapi_numbers(orani) -> List[Dict]:
+    with metrics.timer("phone_setup.vapi_list"):
+        response = requests.get(f"{orani.vapi_base_url}/phone-number", headers=orani.vapi_headers, timeout=settings.VAPI_HTTP_TIMEOUT_SECONDS)
+    if response.status_code != 200:
+        raise Exception(f"Could not retrieve phone numbers from Vapi: {response.text}")
+    return response.json()
+
+
+def _upsert_vapi_number(orani, setup: NumberSetup, assistant_id: str, existing: Optional[Dict]):
+    """Imports the number into Vapi, or points an existing one at the assistant."""
+    with metrics.timer("phone_setup.vapi_upsert"):
+        if existing and existing.get("assistantId") == assistant_id:
+            setup.vapi_phone, setup.vapi_action = existing, "unchanged"
+            return
+        if existing:
+            response = requests.patch(
+                f"{orani.vapi_base_url}/phone-number/{existing['id']}",
+                headers=orani.vapi_headers, json={"assistantId": assistant_id}, timeout=settings.VAPI_HTTP_TIMEOUT_SECONDS,
+            )
+            action = "reassigned"
+            setup.previous_assistant_id = existing.get("assistantId")
+        else:
+            response = requests.post(
+                f"{orani.vapi_base_url}/phone-number",
+                headers=orani.vapi_headers,
+                json={
+                    "provider": "twilio", "number": setup.phone_number,
+                    "twilioAccountSid": orani.twilio_account_sid, "twilioAuthToken": orani.twilio_auth_token,
+                    "assistantId": assistant_id,
+                },
+                timeout=settings.VAPI_HTTP_TIMEOUT_SECONDS,
+            )
+            action = "created"
+    if response.status_code not in (200, 201) or not response.json().get("id"):
+        raise Exception(f"Vapi rejected phone number {setup.phone_number}: {response.text}")
+    setup.vapi_phone, setup.vapi_action = response.json(), action
+
+
+def _update_twilio_webhooks(orani, setup: NumberSetup, params: Dict):
+    number = setup.twilio_number
+    setup.twilio_previous = {f: getattr(number, f, None) for f in _TWILIO_WEBHOOK_FIELDS}
+    orani.twilio.update_incoming_number(number, **params)
+    setup.twilio_updated = True
+
+
+def _rollback_vapi(orani, setup: NumberSetup):
+    phone_id = (setup.vapi_phone or {}).get("id")
+    if not phone_id or setup.vapi_action == "unchanged":
+        return
+    url = f"{orani.vapi_base_url}/phone-number/{phone_id}"
+    if setup.vapi_action == "created":
+        requests.delete(url, headers=orani.vapi_headers, timeout=settings.VAPI_HTTP_TIMEOUT_SECONDS)
+    else:
+        requests.patch(url, headers=orani.vapi_headers, json={"assistantId": setup.previous_assistant_id}, timeout=settings.VAPI_HTTP_TIMEOUT_SECONDS)
+    logger.info(f"Rolled back Vapi setup ({setup.vapi_action}) of {setup.phone_number}.")
+
+
+def _rollback_twilio(orani, setup: NumberSetup):
+    if not setup.twilio_updated:
+        return
+    previous = {k: v for k, v in (setup.twilio_previous or {}).items() if v is not None}
+    orani.twilio.update_incoming_number(setup.twilio_number, **previous)
+    logger.info(f"Restored the previous Twilio webhooks of {setup.phone_number}.")
+
+
+def _failure(future: Future) -> Optional[str]:
+    error = future.exception()
+    return str(error) if error else None
+
+
+def provision_numbers(orani, user_id: str, assistant_id: str, phone_numbers: List[str]) -> List[NumberSetup]:
+    """Sets up every number in Vapi and Twilio concurrently and records the ones that fully succeeded."""
+    setups = [NumberSetup(phone_number=n) for n in dict.fromkeys(phone_numbers)]
+    webhook_params = {"sms_url": f"{settings.PUBLIC_BASE_URL}/webhook/twilio-messaging", "sms_method": "POST"}
+    if settings.TWILIO_INBOUND_ROUTING_ENABLED:
+        webhook_params.update(voice_url=f"{settings.PUBLIC_BASE_URL}/webhook/twilio-inbound", voice_method="POST")
+    voice_after_vapi = settings.TWILIO_INBOUND_ROUTING_ENABLED
+
+    with metrics.timer("phone_setup.total"):
+        # Reads first, all at once: the Vapi listing and every Twilio lookup.
+        listing = _executor.submit(_list_vapi_numbers, orani)
+        lookups = {s.phone_number: _executor.submit(orani.twilio.find_incoming_number, s.phone_number) for s in setups}
+
+        try:
+            existing = {n.get("number"): n for n in listing.result()}
+        except Exception as e:
+            for setup in setups:
+                setup.status, setup.error = "failed", str(e)
+            return setups
+
+        vapi_steps = {s.phone_number: _executor.submit(_upsert_vapi_number, orani, s, assistant_id, existing.get(s.phone_number)) for s in setups}
+
+        twilio_steps: Dict[str, Future] = {}
+        twilio_errors: Dict[str, str] = {}
+        for setup in setups:
+            error = _failure(lookups[setup.phone_number])
+            if error:
+                twilio_errors[setup.phone_number] = error
+                continue
+            setup.twilio_number = lookups[setup.phone_number].result()
+            if voice_after_vapi and _failure(vapi_steps[setup.phone_number]):
+                continue  # Nothing to undo on the Vapi side; leave Twilio untouched.
+            twilio_steps[setup.phone_number] = _executor.submit(_update_twilio_webhooks, orani, setup, webhook_params)
+
+        for setup in setups:
+            vapi_error = _failure(vapi_steps[setup.phone_number])
+            twilio_future = twilio_steps.get(setup.phone_number)
+            twilio_error = twilio_errors.get(setup.phone_number) or (_failure(twilio_future) if twilio_future else None)
+            if twilio_future is None and not twilio_error and vapi_error:
+                twilio_error = "skipped"
+            if not vapi_error and not twilio_error:
+                setup.status = "configured"
+                continue
+
+            setup.status = "failed"
+            setup.error = "; ".join(f"{side}: {e}" for side, e in (("vapi", vapi_error), ("twilio", twilio_error)) if e and e != "skipped")
+            metrics.increment("phone_setup.failed")
+            logger.error(f"Setting up {setup.phone_number} for user {user_id} failed ({setup.error}); rolling back.")
+            try:
+                if not vapi_error:
+                    _rollback_vapi(orani, setup)
+                if twilio_future is not None and not twilio_error:
+                    _rollback_twilio(orani, setup)
+            except Exception as e:
+                logger.error(f"Rollback of {setup.phone_number} failed: {e}", exc_info=True)
+
+    for setup in setups:
+        if setup.status == "configured":
+            orani._store_phone_number(user_id, setup.phone_number, setup.vapi_phone["id"])
+    metrics.increment("phone_setup.configured", sum(s.status == "configured" for s in setups))
+    return setups
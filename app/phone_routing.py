@@ -0,0 +1,43 @@
+"""
+Cached phone number -> owner lookups for the Twilio webhooks, which run on
+every inbound message or call. Entries are dropped whenever a number is
+(re)assigned, so the TTL only bounds how long a missed invalidation (e.g.
+another worker process) can be served.
+"""
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.models import PhoneNumber
+from app.phone_utils import phone_match_key
+from app.ttl_cache import TTLCache
+
+phone_owner_cache = TTLCache("phone_owner", ttl_seconds=settings.PHONE_ROUTING_CACHE_TTL_SECONDS)
+
+
+def lookup_phone_owner(phone_number: str) -> Optional[str]:
+    """The user_id that owns one of our numbers, or None."""
+    match_key = phone_match_key(phone_number)
+
+    def load() -> Optional[str]:
+        with Session(engine) as session:
+            return session.exec(select(PhoneNumber.user_id).where(PhoneNumber.phone_number_normalized == match_key)).first()
+
+    return phone_owner_cache.get_or_load(match_key, load)
+
+
+def lookup_vapi_phone_owner(vapi_phone_id: str) -> Optional[str]:
+    """The user_id that owns the number Vapi knows as vapi_phone_id, or None."""
+    def load() -> Optional[str]:
+        with Session(engine) as session:
+            return session.exec(select(PhoneNumber.user_id).where(PhoneNumber.vapi_phone_id == vapi_phone_id)).first()
+
+    return phone_owner_cache.get_or_load(("vapi", vapi_phone_id), load)
+
+
+def invalidate_phone_owner(phone_number: str, vapi_phone_id: Optional[str] = None):
+    phone_owner_cache.invalidate(phone_match_key(phone_number))
+    if vapi_phone_id:
+        phone_owner_cache.invalidate(("vapi", vapi_phone_id))
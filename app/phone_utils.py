@@ -0,0 +1,56 @@
+import re
+from typing import Optional
+
+# Numbers without a country code are assumed to be North American (NANP),
+# which is what all of our Twilio numbers are today.
+DEFAULT_COUNTRY_CODE = "1"
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone_number(raw: Optional[str], default_country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """
+    Converts a phone number in any of the formats we receive (Twilio, Vapi,
+    the mobile app, hand-typed) into canonical E.164, e.g. '+15551234567'.
+    Returns None if the value can't be read as a phone number.
+    """
+    if not raw:
+        return None
+
+    value = raw.strip()
+    # Twilio client identities ("client:user_123") and SIP URIs are not phone numbers.
+    if ":" in value or "@" in value:
+        return None
+
+    has_plus = value.startswith("+")
+    digits = _NON_DIGITS.sub("", value)
+    if not digits:
+        return None
+
+    if not has_plus:
+        if digits.startswith("00"):
+            # International dialing prefix, e.g. 0044...
+            digits = digits[2:]
+        elif default_country_code == "1" and len(digits) == 11 and digits.startswith("1"):
+            pass
+        elif default_country_code == "1" and len(digits) == 10:
+            digits = default_country_code + digits
+        else:
+            return None
+
+    # E.164 allows at most 15 digits; anything under 8 is a short code or junk.
+    if len(digits) < 8 or len(digits) > 15 or digits.startswith("0"):
+        return None
+
+    return f"+{digits}"
+
+
+def phone_match_key(raw: Optional[str]) -> Optional[str]:
+    """
+    The value stored in the *_normalized columns and used for exact lookups.
+    Falls back to the trimmed raw value for identities that aren't phone
+    numbers, so they still match themselves exactly.
+    """
+    if raw is None:
+        return None
+    return normalize_phone_number(raw) or raw.strip() or None
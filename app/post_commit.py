@@ -0,0 +1,68 @@
+"""
+A queue for side effects that must not hold up a request: push
+notifications, SSE fan-out and the like. Webhooks commit what they must keep,
+enqueue the rest and return; a few worker tasks drain the queue on the event
+loop. Blocking callables run in a worker thread, coroutine functions are
+awaited. Work still queued when the process exits is lost, so only
+best-effort effects belong here.
+"""
+import asyncio
+import inspect
+import logging
+from typing import Callable, Optional, Set
+
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PostCommitQueue:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: Set[asyncio.Task] = set()
+
+    def start(self, workers: int):
+        """Starts the worker tasks. Called on app startup."""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        for _ in range(workers):
+            self._workers.add(asyncio.create_task(self._work()))
+
+    def enqueue(self, name: str, func: Callable, *args, **kwargs):
+        """Schedules func(*args, **kwargs) to run after the current request. Call on the event loop."""
+        item = (name, func, args, kwargs)
+        if self._queue is None:
+            # Workers not started (e.g. a script); just run it as its own task.
+            asyncio.create_task(self._run(*item))
+            return
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            metrics.increment("post_commit.overflow")
+            asyncio.create_task(self._run(*item))
+
+    async def _work(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._run(*item)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, name: str, func: Callable, args, kwargs):
+        try:
+            with metrics.timer(f"post_commit.{name}"):
+                if inspect.iscoroutinefunction(func):
+                    await func(*args, **kwargs)
+                else:
+                    await asyncio.to_thread(func, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Post-commit task '{name}' failed: {e}", exc_info=True)
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+
+post_commit_queue = PostCommitQueue(max_size=settings.POST_COMMIT_QUEUE_MAX_SIZE)
+metrics.register_gauge("post_commit_queue", lambda: {"depth": post_commit_queue.depth()})
@@ -0,0 +1,151 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.metrics import metrics
+
+try:
+    import redis
+except ImportError:  # The shared backend is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]  # (user_id, endpoint + params)
+
+
+class ResponseCache:
+    """
+    Caches already-serialized JSON responses per (user, endpoint, params).
+
+    Every entry is tagged with the user's history version (see
+    app/history_versions.py), so an entry is only served while no call summary
+    or message has been written for that user since it was built. The write
+    paths also call invalidate_user() to free memory right away. Entries are
+    evicted least-recently-used once the memory budget is exceeded.
+
+    If RESPONSE_CACHE_REDIS_URL is set (and the redis package is installed),
+    entries are also shared between workers through Redis.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int, redis_url: Optional[str] = None, redis_ttl_seconds: int = 3600):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[int, bytes]]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[CacheKey]] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._redis = None
+        self._redis_ttl = redis_ttl_seconds
+        if redis_url:
+            if redis is None:
+                logger.warning("RESPONSE_CACHE_REDIS_URL is set but the 'redis' package is not installed; using the local cache only.")
+            else:
+                self._redis = redis.Redis.from_url(redis_url)
+
+    def get(self, user_id: str, key: str, version: int) -> Optional[bytes]:
+        cache_key = (user_id, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(cache_key)
+                self._hits += 1
+                metrics.increment("response_cache.hits")
+                return entry[1]
+
+        body = self._redis_get(user_id, key, version)
+        if body is not None:
+            self._store_local(cache_key, version, body)
+            with self._lock:
+                self._hits += 1
+            metrics.increment("response_cache.hits")
+            return body
+
+        with self._lock:
+            self._misses += 1
+        metrics.increment("response_cache.misses")
+        return None
+
+    def set(self, user_id: str, key: str, version: int, body: bytes):
+        self._store_local((user_id, key), version, body)
+        if self._redis is not None:
+            try:
+                self._redis.set(self._redis_key(user_id, key, version), body, ex=self._redis_ttl)
+            except Exception as e:
+                logger.warning(f"Could not write response cache entry to Redis: {e}")
+
+    def invalidate_user(self, user_id: str):
+        """Drops every cached response for a user. Called after their history changes."""
+        with self._lock:
+            for cache_key in self._keys_by_user.pop(user_id, set()):
+                entry = self._entries.pop(cache_key, None)
+                if entry:
+                    self._bytes -= len(entry[1])
+        # Redis entries are keyed by version, so the bumped version already makes them unreachable.
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "shared_backend": self._redis is not None,
+            }
+
+    def _store_local(self, cache_key: CacheKey, version: int, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous:
+                self._bytes -= len(previous[1])
+            self._entries[cache_key] = (version, body)
+            self._keys_by_user.setdefault(cache_key[0], set()).add(cache_key)
+            self._bytes += len(body)
+
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                evicted_key, (_, evicted_body) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted_body)
+                user_keys = self._keys_by_user.get(evicted_key[0])
+                if user_keys:
+                    user_keys.discard(evicted_key)
+                    if not user_keys:
+                        del self._keys_by_user[evicted_key[0]]
+                self._evictions += 1
+
+    def _redis_key(self, user_id: str, key: str, version: int) -> str:
+        return f"orani:response:{user_id}:{version}:{key}"
+
+    def _redis_get(self, user_id: str, key: str, version: int) -> Optional[bytes]:
+        if self._redis is None:
+            return None
+        try:
+            return self._redis.get(self._redis_key(user_id, key, version))
+        except Exception as e:
+            logger.warning(f"Could not read response cache entry from Redis: {e}")
+            return None
+
+
+response_cache = ResponseCache(
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    redis_url=settings.RESPONSE_CACHE_REDIS_URL,
+)
+metrics.register_gauge("response_cache", response_cache.stats)
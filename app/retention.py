@@ -0,0 +1,288 @@
+"""
+Tiered retention for calls and messages.
+
+Items older than a tenant's policy are written to gzip JSONL segment files
+under RETENTION_ARCHIVE_DIR and removed from the hot tables, leaving a thin
+ArchivedItem stub so the inbox and history still show them. Opening an
+archived call or message reads it back from its segment.
+
+The background worker archives in small batches with a pause between them,
+so it never holds the SQLite write lock for long. It runs in every process;
+a database lease (app/leases.py) lets only one of them archive at a time.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, union
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.history_versions import bump_history_version
+from app.leases import acquire_lease, release_lease
+from app.models import ArchivedItem, CallSummaryDB, CallTranscript, Message, RetentionPolicy
+from app.response_cache import response_cache
+from app.search import index_archived_item, remove_from_search_index
+from app.transcript_store import load_transcripts
+
+logger = logging.getLogger(__name__)
+
+_PREVIEW_LENGTH = 200
+RETENTION_LEASE = "retention"
+
+
+def get_retention_policy(user_id: str) -> Optional[RetentionPolicy]:
+    with Session(engine) as session:
+        return session.get(RetentionPolicy, user_id)
+
+
+def set_retention_policy(user_id: str, hot_days: int, enabled: bool = True) -> RetentionPolicy:
+    with Session(engine) as session:
+        policy = session.get(RetentionPolicy, user_id) or RetentionPolicy(user_id=user_id, hot_days=hot_days)
+        policy.hot_days = hot_days
+        policy.enabled = enabled
+        session.add(policy)
+        session.commit()
+        session.refresh(policy)
+        return policy
+
+
+def _tenants_to_process() -> List[Tuple[str, int]]:
+    """(user_id, hot_days) for every tenant whose history should be trimmed."""
+    with Session(engine) as session:
+        policies = {p.user_id: p for p in session.exec(select(RetentionPolicy)).all()}
+        tenants = [(p.user_id, p.hot_days) for p in policies.values() if p.enabled]
+
+        if settings.RETENTION_DEFAULT_HOT_DAYS is not None:
+            user_ids = session.execute(union(
+                select(CallSummaryDB.user_id).distinct(), select(Message.user_id).distinct()
+            )).scalars().all()
+            tenants += [(u, settings.RETENTION_DEFAULT_HOT_DAYS) for u in user_ids if u not in policies]
+    return tenants
+
+
+def _segment_path(user_id: str) -> str:
+    tenant_dir = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:16]
+    name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+    return os.path.join(settings.RETENTION_ARCHIVE_DIR, tenant_dir, name)
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _write_segment(path: str, records: List[Dict]):
+    """Writes and fsyncs a segment before any hot rows are deleted."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as segment:
+            for record in records:
+                segment.write((json.dumps(record, default=_json_default) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_batch(user_id: str, hot_days: int, batch_size: int) -> int:
+    """Archives up to batch_size calls and batch_size messages older than the cutoff."""
+    cutoff = datetime.utcnow() - timedelta(days=hot_days)
+
+    with Session(engine) as session:
+        calls = session.exec(
+            select(CallSummaryDB).where(CallSummaryDB.user_id == user_id, CallSummaryDB.timestamp < cutoff)
+            .order_by(CallSummaryDB.timestamp).limit(batch_size)
+        ).all()
+        messages = session.exec(
+            select(Message).where(Message.user_id == user_id, Message.timestamp < cutoff)
+            .order_by(Message.timestamp).limit(batch_size)
+        ).all()
+        if not calls and not messages:
+            return 0
+
+        transcripts = load_transcripts(session, [c.id for c in calls])
+        records, stubs = [], []
+        path = _segment_path(user_id)
+        for call in calls:
+            record = call.model_dump()
+            record["transcript"] = transcripts.get(call.id, call.transcript)
+            records.append({"item_type": "call", "record": record})
+            stubs.append(ArchivedItem(
+                user_id=user_id, item_type="call", item_key=call.call_id,
+                customer_number_normalized=call.caller_phone_normalized,
+                timestamp=call.timestamp, preview=(call.summary or "")[:_PREVIEW_LENGTH],
+                segment_path=path, segment_line=len(records) - 1,
+            ))
+        for message in messages:
+            records.append({"item_type": "message", "record": message.model_dump()})
+            stubs.append(ArchivedItem(
+                user_id=user_id, item_type="file" if message.media_urls else "message", item_key=message.message_sid,
+                customer_number_normalized=message.customer_number_normalized,
+                timestamp=message.timestamp, preview=(message.body or "")[:_PREVIEW_LENGTH],
+                segment_path=path, segment_line=len(records) - 1,
+            ))
+
+        _write_segment(path, records)
+
+        call_ids = [c.id for c in calls]
+        message_ids = [m.id for m in messages]
+        session.add_all(stubs)
+        session.flush()
+        # Search entries move from the hot rows to the stubs, so archived items stay findable.
+        remove_from_search_index(session, call_ids=call_ids, message_ids=message_ids)
+        for stub, call in zip(stubs, calls):
+            index_archived_item(session, stub.id, summary=call, transcript=transcripts.get(call.id, call.transcript))
+        for stub, message in zip(stubs[len(calls):], messages):
+            index_archived_item(session, stub.id, message=message)
+        if call_ids:
+            session.execute(delete(CallTranscript).where(CallTranscript.call_summary_id.in_(call_ids)))
+            session.execute(delete(CallSummaryDB).where(CallSummaryDB.id.in_(call_ids)))
+        if message_ids:
+            session.execute(delete(Message).where(Message.id.in_(message_ids)))
+        bump_history_version(session, user_id)
+        session.commit()
+
+    response_cache.invalidate_user(user_id)
+    logger.info(f"Archived {len(calls)} calls and {len(messages)} messages for user {user_id} to {path}.")
+    return len(calls) + len(messages)
+
+
+def run_retention_pass(batch_size: Optional[int] = None, pause_seconds: Optional[float] = None) -> int:
+    """
+    Archives everything past every tenant's cutoff, one small batch at a time.
+    Every process runs the worker, but only the holder of the 'retention'
+    lease archives, so no two processes copy the same rows.
+    """
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    pause_seconds = settings.RETENTION_BATCH_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    archived = 0
+    try:
+        for user_id, hot_days in _tenants_to_process():
+            while True:
+                # Renewed before every batch; a batch must finish within the lease.
+                if not acquire_lease(RETENTION_LEASE, settings.RETENTION_LEASE_SECONDS):
+                    logger.info("Another process holds the retention lease; skipping this pass.")
+                    return archived
+                try:
+                    count = archive_batch(user_id, hot_days, batch_size)
+                except Exception as e:
+                    logger.error(f"Retention batch failed for user {user_id}: {e}", exc_info=True)
+                    break
+                archived += count
+                if count == 0:
+                    break
+                # Give request handlers a chance at the write lock between batches.
+                time.sleep(pause_seconds)
+    finally:
+        release_lease(RETENTION_LEASE)
+    return archived
+
+
+async def retention_worker():
+    """Background task started on app startup."""
+    while True:
+        try:
+            archived = await asyncio.to_thread(run_retention_pass)
+            if archived:
+                logger.info(f"Retention pass archived {archived} items.")
+        except Exception as e:
+            logger.error(f"Retention pass failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.RETENTION_INTERVAL_SECONDS)
+
+
+def load_archived_record(user_id: str, item_type: str, item_key: str) -> Optional[Dict]:
+    """Reads an archived call or message back from its segment file."""
+    item_types = ["message", "file"] if item_type in ("message", "file") else [item_type]
+    with Session(engine) as session:
+        stub = session.exec(
+            select(ArchivedItem).where(
+                ArchivedItem.user_id == user_id,
+                ArchivedItem.item_type.in_(item_types),
+                ArchivedItem.item_key == item_key,
+            )
+        ).first()
+    if not stub:
+        return None
+
+    with gzip.open(stub.segment_path, "rt", encoding="utf-8") as segment:
+        for line_number, line in enumerate(segment):
+            if line_number == stub.segment_line:
+                return json.loads(line)["record"]
+    logger.error(f"Archived {item_type} {item_key} is missing from segment {stub.segment_path}.")
+    return None
+
+
+def iter_archived_records(user_id: str, item_types: List[str], since: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Yields a user's archived records of the given types, oldest segment
+    first. Stubs come from a server-side cursor and each segment file is
+    read once, so memory use stays flat for large archives.
+    """
+    statement = select(ArchivedItem.segment_path, ArchivedItem.segment_line).where(
+        ArchivedItem.user_id == user_id, ArchivedItem.item_type.in_(item_types)
+    )
+    if since:
+        statement = statement.where(ArchivedItem.timestamp >= since)
+    statement = statement.order_by(ArchivedItem.segment_path, ArchivedItem.segment_line)
+
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=500).execute(statement)
+        for path, rows in groupby(result, key=lambda row: row.segment_path):
+            wanted = {row.segment_line for row in rows}
+            with gzip.open(path, "rt", encoding="utf-8") as segment:
+                for line_number, line in enumerate(segment):
+                    if line_number in wanted:
+                        yield json.loads(line)["record"]
+                        wanted.discard(line_number)
+                        if not wanted:
+                            break
+            if wanted:
+                logger.error(f"{len(wanted)} archived records of user {user_id} are missing from segment {path}.")
+
+
+def archived_stubs(
+    session: Session,
+    user_id: str,
+    customer_number_normalized: Optional[str] = None,
+    item_types: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> List[ArchivedItem]:
+    """The newest archive stubs shown in a user's history or a customer's thread, newest first."""
+    statement = select(ArchivedItem).where(ArchivedItem.user_id == user_id)
+    if customer_number_normalized is not None:
+        statement = statement.where(ArchivedItem.customer_number_normalized == customer_number_normalized)
+    if item_types:
+        statement = statement.where(ArchivedItem.item_type.in_(item_types))
+    statement = statement.order_by(ArchivedItem.timestamp.desc()).limit(limit or settings.RETENTION_STUB_LIST_LIMIT)
+    return session.exec(statement).all()
+
+
+def latest_archived_stubs(session: Session, user_id: str) -> List[ArchivedItem]:
+    """The most recent archive stub per customer, for the inbox previews."""
+    latest = (
+        select(
+            func.coalesce(ArchivedItem.customer_number_normalized, "").label("customer"),
+            func.max(ArchivedItem.timestamp).label("timestamp"),
+        )
+        .where(ArchivedItem.user_id == user_id)
+        .group_by(func.coalesce(ArchivedItem.customer_number_normalized, ""))
+        .subquery()
+    )
+    stubs = session.exec(
+        select(ArchivedItem).join(
+            latest,
+            and_(
+                func.coalesce(ArchivedItem.customer_number_normalized, "") == latest.c.customer,
+                ArchivedItem.timestamp == latest.c.timestamp,
+            ),
+        ).where(ArchivedItem.user_id == user_id)
+    ).all()
+    # Items archived in the same instant for one customer show up once.
+    return list({stub.customer_number_normalized: stub for stub in stubs}.values())
@@ -0,0 +1,158 @@
+"""
+Business hours from the profile's hours_of_operation, compiled once into a
+weekly schedule that answers "open right now?" without re-parsing the free
+text days and times (e.g. "Mon - Fri", "9:00 AM") on every call.
+"""
+import json
+import logging
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+_DAY_INDEX = {name[:3].lower(): i for i, name in enumerate(DAY_NAMES)}
+_DAY_GROUPS = {
+    "weekdays": range(0, 5),
+    "weekends": range(5, 7),
+    "everyday": range(0, 7),
+    "every day": range(0, 7),
+    "daily": range(0, 7),
+}
+_TIME_FORMATS = ("%I:%M %p", "%I:%M%p", "%I:%M:%S %p", "%I:%M:%S%p", "%I %p", "%I%p", "%H:%M", "%H:%M:%S", "%H")
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+
+
+def parse_days(value: str) -> List[int]:
+    """Weekday indexes (Monday=0) for "Monday", "mon", "Mon - Fri", "weekdays" and the like."""
+    text = (value or "").strip().lower()
+    if text in _DAY_GROUPS:
+        return list(_DAY_GROUPS[text])
+    for separator in ("-", "–", " to "):
+        if separator in text:
+            first, last = (_DAY_INDEX.get(part.strip()[:3]) for part in text.split(separator, 1))
+            if first is None or last is None:
+                return []
+            return [(first + i) % 7 for i in range((last - first) % 7 + 1)]
+    day = _DAY_INDEX.get(text[:3])
+    return [] if day is None else [day]
+
+
+def parse_time(value: str) -> Optional[int]:
+    """Minutes after midnight for "9:00 AM", "9am", "17:30", "09:00:00", ...; None if unreadable."""
+    text = (value or "").strip().upper().replace("A.M.", "AM").replace("P.M.", "PM")
+    if text in ("24:00", "24:00:00", "MIDNIGHT"):
+        return DAY_MINUTES
+    if text == "NOON":
+        return 12 * 60
+    for fmt in _TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return parsed.hour * 60 + parsed.minute
+    return None
+
+
+def _format_minute(minute_of_week: int, with_day: bool = True) -> str:
+    day, minute = divmod(minute_of_week % WEEK_MINUTES, DAY_MINUTES)
+    hour, minute = divmod(minute, 60)
+    clock = f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+    return f"{DAY_NAMES[day]} {clock}" if with_day else clock
+
+
+class WeeklySchedule:
+    """Opening hours as sorted, merged (start, end) minute-of-week intervals in one timezone."""
+
+    def __init__(self, intervals: List[Tuple[int, int]], timezone: str):
+        self.timezone = timezone
+        try:
+            self.tz = ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown timezone '{timezone}'; using UTC for business hours.")
+            self.tz = dt_timezone.utc
+        self.intervals = self._merge(intervals)
+
+    @staticmethod
+    def _merge(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged: List[List[int]] = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [(start, end) for start, end in merged]
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.intervals
+
+    def _minute_of_week(self, at: Optional[datetime]) -> Tuple[datetime, int]:
+        local = (at or datetime.now(dt_timezone.utc)).astimezone(self.tz)
+        return local, local.weekday() * DAY_MINUTES + local.hour * 60 + local.minute
+
+    def _containing(self, minute: int) -> Optional[Tuple[int, int]]:
+        # An interval that runs past Sunday midnight also covers the start of the week.
+        for start, end in self.intervals:
+            if start <= minute < end or start <= minute + WEEK_MINUTES < end:
+                return start, end
+        return None
+
+    def is_open(self, at: Optional[datetime] = None) -> bool:
+        if self.is_empty:
+            return True
+        return self._containing(self._minute_of_week(at)[1]) is not None
+
+    def status(self, at: Optional[datetime] = None) -> Dict:
+        local, minute = self._minute_of_week(at)
+        result = {"known": not self.is_empty, "open": True, "local_time": local.isoformat(), "closes_at": None, "opens_at": None}
+        if self.is_empty:
+            return result
+        interval = self._containing(minute)
+        if interval:
+            result["closes_at"] = _format_minute(interval[1], with_day=False)
+            return result
+        result["open"] = False
+        upcoming = [start for start, _ in self.intervals if start > minute]
+        result["opens_at"] = _format_minute(upcoming[0] if upcoming else self.intervals[0][0])
+        return result
+
+    def describe(self, at: Optional[datetime] = None) -> str:
+        """One or two sentences for the assistant about the current time and whether the business is open."""
+        _, minute = self._minute_of_week(at)
+        now = f"It is currently {_format_minute(minute)} ({self.timezone})."
+        if self.is_empty:
+            return now
+        status = self.status(at)
+        if status["open"]:
+            return f"{now} The business is open right now, until {status['closes_at']}."
+        return f"{now} The business is closed right now and opens again {status['opens_at']}."
+
+
+@lru_cache(maxsize=1024)
+def _compile(hours_json: str, timezone: str) -> WeeklySchedule:
+    intervals = []
+    for entry in json.loads(hours_json):
+        start = parse_time(entry.get("start_time"))
+        end = parse_time(entry.get("end_time"))
+        if start is None or end is None:
+            logger.warning(f"Ignoring unreadable business hours entry: {entry}")
+            continue
+        if end <= start:
+            end += DAY_MINUTES  # Closes after midnight.
+        days = sorted({day for value in entry.get("days") or [] for day in parse_days(value)})
+        for day in days:
+            offset = day * DAY_MINUTES
+            intervals.append((offset + start, offset + end))
+    return WeeklySchedule(intervals, timezone)
+
+
+def compile_schedule(hours_of_operation: Optional[List[Dict]], timezone: Optional[str] = None) -> WeeklySchedule:
+    """The compiled schedule for a profile's hours; identical hours share one compiled object."""
+    hours_json = json.dumps(hours_of_operation or [], sort_keys=True, default=str)
+    return _compile(hours_json, timezone or settings.DEFAULT_BUSINESS_TIMEZONE)
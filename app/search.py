@@ -0,0 +1,307 @@
+"""
+Full-text search over call transcripts, call summaries and messages.
+
+On SQLite (our default database) this is an FTS5 virtual table that is kept
+in sync from the write paths in the same transaction as the row it indexes.
+On Postgres the same queries are served by GIN expression indexes over
+to_tsvector(), so nothing needs to be kept in sync.
+
+Rebuild the index with:  python -m app.search rebuild [--user-id USER_ID]
+"""
+import argparse
+import hashlib
+import logging
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import CallSummaryDB, Message
+from app.transcript_store import load_transcripts
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "history_search"
+
+# Column order matters for the bm25() weights below.
+_FTS_COLUMNS = ["tenant", "item_type", "item_key", "customer_number", "timestamp", "transcript", "summary", "key_points", "body"]
+# Matches in the summary and key points rank above matches buried in a long transcript.
+_BM25_WEIGHTS = "0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 4.0, 3.0, 2.0"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _is_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _tenant_token(user_id: str) -> str:
+    """
+    A single FTS token that identifies a tenant. Filtering on it inside the
+    MATCH expression lets FTS5 intersect posting lists instead of scanning
+    every tenant's matches and filtering afterwards.
+    """
+    return "t" + hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:24]
+
+
+def _call_rowid(summary_id: int) -> int:
+    # Calls and messages share one FTS table; even/odd rowids keep them apart
+    # and let us replace or delete an entry without a lookup.
+    return summary_id * 2
+
+
+def _message_rowid(message_id: int) -> int:
+    return message_id * 2 + 1
+
+
+def _archived_rowid(archived_item_id: int) -> int:
+    # Archived calls and messages keep their entry under the ArchivedItem id,
+    # negated so it can never collide with a hot row's.
+    return -archived_item_id
+
+
+def create_search_index() -> bool:
+    """
+    Creates the search index if it doesn't exist yet. Returns True when it was
+    just created and still needs to be populated with rebuild_search_index().
+    """
+    if _is_postgres():
+        statements = [
+            "CREATE INDEX IF NOT EXISTS ix_callsummarydb_search ON callsummarydb USING GIN "
+            "(to_tsvector('english', coalesce(transcript, '') || ' ' || coalesce(summary, '') || ' ' || coalesce(key_points::text, '')))",
+            "CREATE INDEX IF NOT EXISTS ix_message_search ON message USING GIN (to_tsvector('english', coalesce(body, '')))",
+        ]
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+        return False
+
+    with engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first()
+        if exists:
+            return False
+        columns = ", ".join(
+            f"{c} UNINDEXED" if c in ("item_type", "item_key", "customer_number", "timestamp") else c
+            for c in _FTS_COLUMNS
+        )
+        connection.execute(text(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, tokenize='porter unicode61')"))
+    logger.info("Created full-text search index.")
+    return True
+
+
+def _call_params(summary: CallSummaryDB, transcript: Optional[str] = None) -> Dict:
+    return {
+        "rowid": _call_rowid(summary.id),
+        "tenant": _tenant_token(summary.user_id),
+        "item_type": "call",
+        "item_key": summary.call_id,
+        "customer_number": summary.caller_phone_normalized or summary.caller_phone,
+        "timestamp": summary.timestamp.isoformat() if summary.timestamp else None,
+        "transcript": transcript if transcript is not None else (summary.transcript or ""),
+        "summary": summary.summary or "",
+        "key_points": "\n".join(summary.key_points or []),
+        "body": "",
+    }
+
+
+def _message_params(message: Message) -> Dict:
+    return {
+        "rowid": _message_rowid(message.id),
+        "tenant": _tenant_token(message.user_id),
+        "item_type": "file" if message.media_urls else "message",
+        "item_key": message.message_sid,
+        "customer_number": message.customer_number_normalized,
+        "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+        "transcript": "",
+        "summary": "",
+        "key_points": "",
+        "body": message.body or "",
+    }
+
+
+_INSERT_SQL = text(
+    f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, {', '.join(_FTS_COLUMNS)}) "
+    f"VALUES (:rowid, {', '.join(':' + c for c in _FTS_COLUMNS)})"
+)
+
+
+def index_call_summary(session: Session, summary: CallSummaryDB, transcript: Optional[str] = None):
+    """
+    Adds a call summary to the search index inside the caller's transaction.
+    The summary must already be flushed so it has an id. Pass the transcript
+    when it is stored compressed rather than on the row.
+    """
+    if _is_postgres():
+        return
+    session.connection().execute(_INSERT_SQL, _call_params(summary, transcript))
+
+
+def index_message(session: Session, message: Message):
+    """Adds a message to the search index inside the caller's transaction."""
+    if _is_postgres():
+        return
+    session.connection().execute(_INSERT_SQL, _message_params(message))
+
+
+def index_archived_item(session: Session, archived_item_id: int, summary: Optional[CallSummaryDB] = None,
+                        transcript: Optional[str] = None, message: Optional[Message] = None):
+    """
+    Keeps an archived call or message searchable: indexes it under its
+    ArchivedItem id. Opening a result falls back to the archive.
+    """
+    if _is_postgres():
+        return
+    params = _call_params(summary, transcript) if summary is not None else _message_params(message)
+    params["rowid"] = _archived_rowid(archived_item_id)
+    session.connection().execute(_INSERT_SQL, params)
+
+
+def remove_from_search_index(session: Session, call_ids: List[int] = (), message_ids: List[int] = ()):
+    """Drops index entries for the given CallSummaryDB / Message primary keys."""
+    if _is_postgres():
+        return
+    rowids = [_call_rowid(i) for i in call_ids] + [_message_rowid(i) for i in message_ids]
+    if rowids:
+        session.connection().execute(
+            text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :rowid"), [{"rowid": r} for r in rowids]
+        )
+
+
+def rebuild_search_index(user_id: Optional[str] = None, batch_size: int = 500) -> int:
+    """
+    Re-indexes every call summary and message (optionally for one user).
+    Entries of archived items are kept, since their rows are gone.
+    """
+    if _is_postgres():
+        logger.info("Postgres search uses expression indexes; nothing to rebuild.")
+        return 0
+
+    with engine.begin() as connection:
+        if user_id:
+            connection.execute(
+                text(f"DELETE FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match AND rowid > 0"),
+                {"match": f'tenant : "{_tenant_token(user_id)}"'},
+            )
+        else:
+            connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid > 0"))
+
+    indexed = 0
+    for model in (CallSummaryDB, Message):
+        last_id = 0
+        while True:
+            with Session(engine) as session:
+                statement = select(model).where(model.id > last_id).order_by(model.id).limit(batch_size)
+                if user_id:
+                    statement = statement.where(model.user_id == user_id)
+                rows = session.exec(statement).all()
+                if not rows:
+                    break
+                if model is CallSummaryDB:
+                    transcripts = load_transcripts(session, [row.id for row in rows])
+                    params = [_call_params(row, transcripts.get(row.id)) for row in rows]
+                else:
+                    params = [_message_params(row) for row in rows]
+                session.connection().execute(_INSERT_SQL, params)
+                session.commit()
+                last_id = rows[-1].id
+                indexed += len(rows)
+    logger.info(f"Rebuilt search index with {indexed} items.")
+    return indexed
+
+
+def _build_match_query(user_id: str, query: str) -> Optional[str]:
+    """
+    Turns free text from the app into a safe FTS5 MATCH expression: every
+    word must appear, the last word also matches as a prefix, and the whole
+    thing is scoped to the tenant's token.
+    """
+    terms = _TOKEN_RE.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return f'tenant : "{_tenant_token(user_id)}" AND ' + " AND ".join(quoted)
+
+
+def search_history(user_id: str, query: str, item_types: Optional[List[str]] = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+    """Ranked, paginated full-text search over one user's calls and messages."""
+    if _is_postgres():
+        return _search_history_postgres(user_id, query, item_types, limit, offset)
+
+    match_query = _build_match_query(user_id, query)
+    if not match_query:
+        return []
+
+    type_filter = ""
+    params = {"match": match_query, "limit": limit, "offset": offset}
+    if item_types:
+        type_filter = "AND item_type IN (" + ", ".join(f":type_{i}" for i in range(len(item_types))) + ")"
+        params.update({f"type_{i}": t for i, t in enumerate(item_types)})
+
+    sql = text(f"""
+        SELECT item_type, item_key, customer_number, timestamp, rowid < 0 AS archived,
+               snippet({FTS_TABLE}, -1, '[', ']', '...', 16) AS snippet,
+               bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS score
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match {type_filter}
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """)
+    with engine.connect() as connection:
+        rows = connection.execute(sql, params).all()
+    # bm25() is "lower is better"; flip it so clients can treat it as a relevance score.
+    return [{**dict(row._mapping), "score": -row.score} for row in rows]
+
+
+def _search_history_postgres(user_id: str, query: str, item_types: Optional[List[str]], limit: int, offset: int) -> List[Dict]:
+    call_document = "to_tsvector('english', coalesce(transcript, '') || ' ' || coalesce(summary, '') || ' ' || coalesce(key_points::text, ''))"
+    message_document = "to_tsvector('english', coalesce(body, ''))"
+    archived_document = "to_tsvector('english', coalesce(preview, ''))"
+    sql = text(f"""
+        WITH q AS (SELECT websearch_to_tsquery('english', :query) AS tsq)
+        SELECT * FROM (
+            SELECT 'call' AS item_type, call_id AS item_key, caller_phone_normalized AS customer_number,
+                   timestamp, false AS archived, ts_headline('english', summary, q.tsq) AS snippet,
+                   ts_rank({call_document}, q.tsq) AS score
+            FROM callsummarydb, q
+            WHERE user_id = :user_id AND {call_document} @@ q.tsq
+            UNION ALL
+            SELECT CASE WHEN media_urls IS NOT NULL THEN 'file' ELSE 'message' END, message_sid,
+                   customer_number_normalized, timestamp, false, ts_headline('english', body, q.tsq),
+                   ts_rank({message_document}, q.tsq)
+            FROM message, q
+            WHERE user_id = :user_id AND {message_document} @@ q.tsq
+            UNION ALL
+            -- Archived items match on their stored preview only.
+            SELECT item_type, item_key, customer_number_normalized, timestamp, true,
+                   ts_headline('english', preview, q.tsq), ts_rank({archived_document}, q.tsq)
+            FROM archiveditem, q
+            WHERE user_id = :user_id AND {archived_document} @@ q.tsq
+        ) results
+        WHERE (:item_types IS NULL OR item_type = ANY(:item_types))
+        ORDER BY score DESC
+        LIMIT :limit OFFSET :offset
+    """)
+    with engine.connect() as connection:
+        rows = connection.execute(sql, {
+            "query": query, "user_id": user_id, "item_types": item_types or None,
+            "limit": limit, "offset": offset,
+        }).all()
+    return [dict(row._mapping) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the history full-text search index.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subcommands.add_parser("rebuild", help="Re-index all calls and messages.")
+    rebuild_parser.add_argument("--user-id", help="Only re-index this user's items.")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        create_search_index()
+        count = rebuild_search_index(args.user_id)
+        print(f"Indexed {count} items.")
@@ -0,0 +1,290 @@
+"""
+Background jobs for POST /setup/assistant.
+
+The endpoint saves the business profile, records a SetupJob and returns 202
+with its id; a worker then runs the remote steps (Vapi assistant, phone
+numbers) via OraniAIAssistant.apply_profile_to_assistant and reports each
+step as a 'setup_progress' SSE event. GET /setup/jobs/{id} returns the same
+state.
+
+Submitting is idempotent: resubmitting the payload of the user's latest job
+(while it is queued, running or succeeded) returns that job instead of
+starting another. A job succeeds only if the assistant and every phone
+number were set up, so resubmitting after a failure retries the rest. A newer payload supersedes older queued jobs, and jobs for
+one user never run at the same time.
+
+Jobs live in the database. A running job's worker refreshes its updated_at
+as a heartbeat; one whose heartbeat goes stale (its process crashed or was
+restarted) is queued again, on startup or by a periodic sweep in any live
+process. The remote steps themselves are safe to repeat.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.event_stream import broadcaster
+from app.metrics import metrics
+from app.models import SetupJob
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ["queued", "running"]
+_BUSY = object()
+
+
+def payload_hash(payload: Dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def job_to_dict(job: SetupJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "step": job.step,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+def create_setup_job(orani, payload: Dict) -> Tuple[Optional[SetupJob], bool]:
+    """
+    Saves the profile and records a job for the remote steps. Returns
+    (job, created); created is False when the user's latest job is for the
+    same payload and hasn't failed. Returns (None, False) if the profile
+    could not be saved.
+    """
+    user_id = payload.get("user_id")
+    digest = payload_hash(payload)
+    with Session(engine) as session:
+        latest = session.exec(
+            select(SetupJob).where(SetupJob.user_id == user_id).order_by(SetupJob.created_at.desc())
+        ).first()
+        if latest and latest.payload_hash == digest and latest.status in ACTIVE_STATUSES + ["succeeded"]:
+            metrics.increment("setup_jobs.deduplicated")
+            return latest, False
+
+    if orani.save_business_profile(payload) is None:
+        return None, False
+
+    job = SetupJob(id=uuid.uuid4().hex, user_id=user_id, payload_hash=digest, payload=payload)
+    with Session(engine) as session:
+        # Queued jobs for older payloads would only be undone by this one.
+        session.execute(
+            update(SetupJob)
+            .where(SetupJob.user_id == user_id, SetupJob.status == "queued")
+            .values(status="superseded", updated_at=datetime.utcnow())
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+    metrics.increment("setup_jobs.created")
+    return job, True
+
+
+def get_setup_job(job_id: str) -> Optional[Dict]:
+    with Session(engine) as session:
+        job = session.get(SetupJob, job_id)
+        return job_to_dict(job) if job else None
+
+
+def _update_job(job_id: str, **values) -> Optional[Dict]:
+    with Session(engine) as session:
+        job = session.get(SetupJob, job_id)
+        if not job:
+            return None
+        for key, value in values.items():
+            setattr(job, key, value)
+        job.updated_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job_to_dict(job)
+
+
+def _claim(job_id: str):
+    """
+    Marks a queued job running. None if another worker (or process) got it
+    first or it was superseded; _BUSY while another job for the same user runs.
+    """
+    with Session(engine) as session:
+        job = session.get(SetupJob, job_id)
+        if not job or job.status != "queued":
+            return None
+        running = session.exec(
+            select(SetupJob.id).where(SetupJob.user_id == job.user_id, SetupJob.status == "running")
+        ).first()
+        if running:
+            return _BUSY
+        claimed = session.execute(
+            update(SetupJob)
+            .where(SetupJob.id == job_id, SetupJob.status == "queued")
+            .values(status="running", attempts=SetupJob.attempts + 1, updated_at=datetime.utcnow())
+        ).rowcount
+        session.commit()
+        return {"payload": job.payload, "user_id": job.user_id} if claimed else None
+
+
+def _heartbeat(job_id: str):
+    """Marks a running job as still owned by a live worker."""
+    with Session(engine) as session:
+        session.execute(
+            update(SetupJob)
+            .where(SetupJob.id == job_id, SetupJob.status == "running")
+            .values(updated_at=datetime.utcnow())
+        )
+        session.commit()
+
+
+def _requeue_interrupted(include_queued: bool = False) -> list:
+    """
+    Queues again the running jobs whose worker stopped sending heartbeats
+    (it crashed, or its process was restarted). Jobs with a recent heartbeat
+    belong to a live worker, possibly in another process, and are left
+    alone. Returns the ids to enqueue: the requeued jobs, plus every queued
+    job when include_queued is set (on startup).
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.SETUP_JOB_STALE_SECONDS)
+    with Session(engine) as session:
+        stale = list(session.exec(
+            select(SetupJob.id).where(SetupJob.status == "running", SetupJob.updated_at < cutoff)
+        ).all())
+        if stale:
+            session.execute(
+                update(SetupJob)
+                .where(SetupJob.id.in_(stale), SetupJob.status == "running", SetupJob.updated_at < cutoff)
+                .values(status="queued", updated_at=datetime.utcnow())
+            )
+            session.commit()
+            logger.warning(f"Requeued setup jobs with no heartbeat: {stale}")
+        if not include_queued:
+            return stale
+        return list(session.exec(select(SetupJob.id).where(SetupJob.status == "queued").order_by(SetupJob.created_at)).all())
+
+
+class SetupJobRunner:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: Set[asyncio.Task] = set()
+        self._orani = None
+
+    async def start(self, orani, workers: int):
+        """Starts the workers and picks up unfinished jobs. Called on app startup."""
+        self._orani = orani
+        self._queue = asyncio.Queue()
+        for _ in range(workers):
+            self._workers.add(asyncio.create_task(self._work()))
+        for job_id in await asyncio.to_thread(_requeue_interrupted, True):
+            self._queue.put_nowait(job_id)
+        self._workers.add(asyncio.create_task(self._sweep()))
+
+    async def _sweep(self):
+        """Picks up jobs whose worker died while this process keeps running."""
+        while True:
+            await asyncio.sleep(settings.SETUP_JOB_STALE_SECONDS)
+            try:
+                for job_id in await asyncio.to_thread(_requeue_interrupted):
+                    self._queue.put_nowait(job_id)
+            except Exception as e:
+                logger.error(f"Setup job sweep failed: {e}", exc_info=True)
+
+    async def _keep_alive(self, job_id: str):
+        while True:
+            await asyncio.sleep(settings.SETUP_JOB_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(_heartbeat, job_id)
+            except Exception as e:
+                logger.error(f"Heartbeat for setup job {job_id} failed: {e}", exc_info=True)
+
+    def enqueue(self, job_id: str):
+        """Must be called on the event loop."""
+        self._queue.put_nowait(job_id)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Setup job {job_id} crashed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        claimed = await asyncio.to_thread(_claim, job_id)
+        if claimed is _BUSY:
+            # One job per user at a time; try again shortly.
+            asyncio.get_running_loop().call_later(1.0, self.enqueue, job_id)
+            return
+        if not claimed:
+            return
+        loop = asyncio.get_running_loop()
+        user_id = claimed["user_id"]
+
+        def progress(step: str, details: Optional[Dict] = None):
+            # Called from the worker thread running the remote steps.
+            job = _update_job(job_id, step=step, result=details or None)
+            asyncio.run_coroutine_threadsafe(self._publish(user_id, job), loop)
+
+        await self._publish(user_id, await asyncio.to_thread(_update_job, job_id, step="starting"))
+        # Progress updates refresh updated_at too, but one remote step can outlast the stale cutoff.
+        keep_alive = asyncio.create_task(self._keep_alive(job_id))
+        try:
+            with metrics.timer("setup_jobs.run"):
+                assistant = await asyncio.to_thread(self._orani.apply_profile_to_assistant, claimed["payload"], None, progress)
+        except Exception as e:
+            logger.error(f"Setup job {job_id} for user {user_id} failed: {e}", exc_info=True)
+            assistant = None
+            error = str(e)
+        else:
+            error = None if assistant else "Failed to create or update assistant."
+        finally:
+            keep_alive.cancel()
+
+        current = await asyncio.to_thread(get_setup_job, job_id)
+        result = dict((current or {}).get("result") or {})
+        if assistant:
+            result["assistant_id"] = assistant.get("id")
+            # A number left unconfigured fails the job, so resubmitting the
+            # same payload starts a new job that retries it.
+            failed_phones = [p["phone_number"] for p in result.get("phones") or [] if p.get("status") != "configured"]
+            if failed_phones:
+                error = f"Phone setup failed for {', '.join(failed_phones)}."
+        job = await asyncio.to_thread(
+            _update_job, job_id, status="failed" if error else "succeeded", step="done", result=result or None, error=error
+        )
+        metrics.increment(f"setup_jobs.{job['status']}")
+        await self._publish(user_id, job)
+
+    @staticmethod
+    async def _publish(user_id: str, job: Optional[Dict]):
+        if not job:
+            return
+        await broadcaster.broadcast(json.dumps({
+            "event": "setup_progress",
+            "userId": user_id,
+            "jobId": job["job_id"],
+            "status": job["status"],
+            "step": job["step"],
+            "result": job["result"],
+            "error": job["error"],
+        }, default=str))
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+
+setup_job_runner = SetupJobRunner()
+metrics.register_gauge("setup_jobs", lambda: {"queued": setup_job_runner.depth()})
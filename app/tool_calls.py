@@ -0,0 +1,289 @@
+"""
+In-call actions for the Vapi assistant.
+
+The assistant config advertises the tools in `tool_registry`; when the model
+calls them, Vapi posts a 'tool-calls' message to /webhook/vapi and waits for
+the results before it speaks again, so every millisecond here is dead air.
+dispatch_tool_calls() runs all calls of one message concurrently, each under
+its tool's timeout, reads the caller's business from the in-memory assistant
+config cache (see app/assistant_configs.py) and memoizes static lookups such
+as prices until the profile is saved again.
+"""
+import asyncio
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.assistant_configs import CompiledAssistantConfig, assistant_config_cache, get_assistant_config
+from app.config import settings
+from app.knowledge_index import search_knowledge
+from app.message_status import status_callback_url
+from app.message_store import save_message
+from app.metrics import metrics
+from app.models import Message
+from app.phone_routing import lookup_phone_owner, lookup_vapi_phone_owner
+from app.phone_utils import phone_match_key
+from app.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_RESULT = "That is taking longer than expected. Tell the caller you will follow up instead."
+ERROR_RESULT = "That action is not available right now. Offer to take a message instead."
+
+
+@dataclass
+class ToolContext:
+    orani: Any
+    user_id: str
+    entry: CompiledAssistantConfig
+    call_id: Optional[str] = None
+    customer_number: Optional[str] = None
+    business_number: Optional[str] = None
+
+    @property
+    def profile(self) -> Dict:
+        return self.entry.profile
+
+
+@dataclass
+class Tool:
+    name: str
+    description: str
+    handler: Callable[[ToolContext, Dict], Awaitable[Any]]
+    parameters: Dict = field(default_factory=lambda: {"type": "object", "properties": {}})
+    timeout: float = settings.TOOL_CALL_DEFAULT_TIMEOUT_SECONDS
+    # Results depend only on the profile and the arguments, so they are cached
+    cacheable: bool = False
+
+    def vapi_definition(self) -> Dict:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+            "server": {"url": f"{settings.PUBLIC_BASE_URL}/webhook/vapi"},
+        }
+
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def register(self, name: str, description: str, parameters: Optional[Dict] = None, timeout: Optional[float] = None, cacheable: bool = False):
+        """Decorator registering an async handler(ctx, args) as a tool."""
+        def decorator(handler):
+            self._tools[name] = Tool(
+                name=name,
+                description=description,
+                handler=handler,
+                parameters=parameters or {"type": "object", "properties": {}},
+                timeout=timeout or settings.TOOL_CALL_DEFAULT_TIMEOUT_SECONDS,
+                cacheable=cacheable,
+            )
+            return handler
+        return decorator
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def vapi_tools(self) -> List[Dict]:
+        return [tool.vapi_definition() for tool in self._tools.values()]
+
+
+tool_registry = ToolRegistry()
+static_lookup_cache = TTLCache("tool_static_lookups", ttl_seconds=settings.TOOL_STATIC_CACHE_TTL_SECONDS)
+# assistantId -> user_id, for tool calls on numbers that don't resolve directly
+_assistant_owner_cache = TTLCache("assistant_owner", ttl_seconds=settings.ASSISTANT_CONFIG_CACHE_TTL_SECONDS)
+
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+@tool_registry.register(
+    name="get_prices",
+    description="Look up the business's prices. Pass the service the caller asked about, or nothing to list all prices.",
+    parameters={"type": "object", "properties": {"service": {"type": "string", "description": "Service or package name"}}},
+    cacheable=True,
+)
+async def get_prices(ctx: ToolContext, args: Dict) -> Dict:
+    packages = [p for p in ctx.profile.get("price_info") or [] if p.get("package_name")]
+    if not packages:
+        return {"found": False, "message": "Pricing is available upon request."}
+    wanted = _tokens(args.get("service"))
+    if wanted:
+        scored = sorted(((len(wanted & _tokens(p["package_name"])), p) for p in packages), key=lambda item: -item[0])
+        matches = [p for score, p in scored if score]
+        if matches:
+            packages = matches
+        else:
+            return {"found": False, "message": f"No listed price for '{args.get('service')}'.",
+                    "available": [p["package_name"] for p in packages]}
+    return {"found": True, "prices": [{"name": p["package_name"], "price": p.get("package_price")} for p in packages]}
+
+
+@tool_registry.register(
+    name="check_business_hours",
+    description="Check whether the business is open right now and its opening hours.",
+)
+async def check_business_hours(ctx: ToolContext, args: Dict) -> Dict:
+    status = ctx.entry.schedule.status()
+    hours = [
+        f"{', '.join(h.get('days', []))}: {h.get('start_time', '')} to {h.get('end_time', '')}"
+        for h in ctx.profile.get("hours_of_operation") or []
+    ]
+    return {
+        "summary": ctx.entry.schedule.describe(),
+        "open_now": status["open"],
+        "closes_at": status["closes_at"],
+        "opens_at": status["opens_at"],
+        "hours": hours or "Not specified.",
+        "timezone": ctx.entry.schedule.timezone,
+    }
+
+
+def _send_and_record(ctx: ToolContext, body: str):
+    twilio_message = ctx.orani.twilio.send_message(
+        to=ctx.customer_number, from_=ctx.business_number, body=body,
+        status_callback=status_callback_url(), timeout=settings.TOOL_CALL_SMS_TIMEOUT_SECONDS,
+    )
+    save_message(Message(
+        user_id=ctx.user_id,
+        message_sid=twilio_message.sid,
+        to_number=ctx.customer_number,
+        from_number=ctx.business_number,
+        customer_number_normalized=phone_match_key(ctx.customer_number),
+        body=body,
+        direction="outbound",
+        status=twilio_message.status,
+    ))
+
+
+@tool_registry.register(
+    name="send_booking_link",
+    description="Text the caller the link to book an appointment. Pass which booking page if the business has several.",
+    parameters={"type": "object", "properties": {"booking_title": {"type": "string", "description": "Which booking page, if more than one"}}},
+    timeout=settings.TOOL_CALL_SMS_TIMEOUT_SECONDS,
+)
+async def send_booking_link(ctx: ToolContext, args: Dict) -> Dict:
+    links = [link for link in ctx.profile.get("booking_links") or [] if link.get("booking_link")]
+    if not links:
+        return {"sent": False, "message": "This business has no online booking link."}
+    if not ctx.customer_number or not ctx.business_number:
+        return {"sent": False, "message": "The caller's number is not available, so no text can be sent."}
+
+    wanted = _tokens(args.get("booking_title"))
+    link = max(links, key=lambda l: len(wanted & _tokens(l.get("booking_title")))) if wanted else links[0]
+    business_name = (ctx.profile.get("company_info") or {}).get("business_name") or "us"
+    body = f"Thanks for calling {business_name}! Book here: {link['booking_link']}"
+
+    # Send and record in one worker-thread job: if the tool times out, the
+    # thread still finishes both, so a text that went out is always in history.
+    await asyncio.to_thread(_send_and_record, ctx, body)
+    return {"sent": True, "message": f"Booking link for {link.get('booking_title') or 'appointments'} sent by text."}
+
+
+@tool_registry.register(
+    name="search_knowledge",
+    description="Search the business's own information (services, policies, FAQs, prices, hours) to answer a caller's question.",
+    parameters={"type": "object", "properties": {"query": {"type": "string", "description": "The caller's question in a few words"}}, "required": ["query"]},
+)
+async def search_knowledge_tool(ctx: ToolContext, args: Dict) -> Dict:
+    passages = await run_in_threadpool(search_knowledge, ctx.user_id, args.get("query") or "")
+    if not passages:
+        return {"found": False, "message": "Nothing on file about that. Offer to take a message."}
+    return {"found": True, "passages": [p["text"] for p in passages]}
+
+
+def _parse_arguments(raw) -> Dict:
+    if isinstance(raw, dict):
+        return raw
+    try:
+        parsed = json.loads(raw or "{}")
+        return parsed if isinstance(parsed, dict) else {}
+    except (TypeError, ValueError):
+        return {}
+
+
+async def _resolve_user(message: Dict, orani) -> Optional[str]:
+    call = message.get("call") or {}
+    metadata = (message.get("assistant") or {}).get("metadata") or {}
+    if metadata.get("userId"):
+        return metadata["userId"]
+    phone_number = (message.get("phoneNumber") or {}).get("number")
+    if phone_number:
+        user_id = await run_in_threadpool(lookup_phone_owner, phone_number)
+        if user_id:
+            return user_id
+    if call.get("phoneNumberId"):
+        user_id = await run_in_threadpool(lookup_vapi_phone_owner, call["phoneNumberId"])
+        if user_id:
+            return user_id
+    assistant_id = call.get("assistantId")
+    if assistant_id:
+        return await run_in_threadpool(_assistant_owner_cache.get_or_load, assistant_id, lambda: orani._get_user_id_from_assistant_id(assistant_id))
+    return None
+
+
+async def _run_tool(ctx: ToolContext, tool_call: Dict) -> Dict:
+    function = tool_call.get("function") or {}
+    name = function.get("name") or tool_call.get("name")
+    args = _parse_arguments(function.get("arguments"))
+    tool = tool_registry.get(name)
+    result: Any
+    if tool is None:
+        metrics.increment("tool_calls.unknown")
+        result = {"error": f"Unknown tool '{name}'."}
+    else:
+        cache_key = (ctx.user_id, ctx.entry.built_at, name, json.dumps(args, sort_keys=True)) if tool.cacheable else None
+        found, result = static_lookup_cache.get(cache_key) if cache_key else (False, None)
+        if found:
+            metrics.increment(f"tool_calls.{name}.cached")
+        else:
+            try:
+                with metrics.timer(f"tool_calls.{name}"):
+                    result = await asyncio.wait_for(tool.handler(ctx, args), timeout=tool.timeout)
+                if cache_key:
+                    static_lookup_cache.set(cache_key, result)
+            except asyncio.TimeoutError:
+                metrics.increment(f"tool_calls.{name}.timeout")
+                logger.warning(f"Tool '{name}' timed out after {tool.timeout}s for user {ctx.user_id}.")
+                result = TIMEOUT_RESULT
+            except Exception as e:
+                logger.error(f"Tool '{name}' failed for user {ctx.user_id}: {e}", exc_info=True)
+                result = ERROR_RESULT
+    return {
+        "toolCallId": tool_call.get("id"),
+        "name": name,
+        "result": result if isinstance(result, str) else json.dumps(result, default=str),
+    }
+
+
+async def dispatch_tool_calls(message: Dict, orani) -> Dict:
+    """The webhook response for a Vapi 'tool-calls' message."""
+    tool_calls = message.get("toolCallList") or message.get("toolCalls") or []
+    with metrics.timer("tool_calls.dispatch"):
+        user_id = await _resolve_user(message, orani)
+        entry = None
+        if user_id:
+            found, entry = assistant_config_cache.get(user_id)
+            if not found:
+                entry = await run_in_threadpool(get_assistant_config, user_id, orani._load_assistant_request_config)
+        if entry is None:
+            logger.error(f"Tool calls for an unknown business (user {user_id}); answering with an error.")
+            return {"results": [{"toolCallId": c.get("id"), "result": ERROR_RESULT} for c in tool_calls]}
+
+        call = message.get("call") or {}
+        ctx = ToolContext(
+            orani=orani,
+            user_id=user_id,
+            entry=entry,
+            call_id=call.get("id"),
+            customer_number=(message.get("customer") or call.get("customer") or {}).get("number"),
+            business_number=(message.get("phoneNumber") or {}).get("number")
+            or next((p.get("phone_number") for p in entry.profile.get("phone_numbers") or [] if p.get("phone_number")), None),
+        )
+        results = await asyncio.gather(*(_run_tool(ctx, tool_call) for tool_call in tool_calls))
+    return {"results": list(results)}
@@ -0,0 +1,259 @@
+"""
+Compressed storage for call transcripts.
+
+Transcripts live in the CallTranscript side table instead of inline in
+callsummarydb, so the table read by every history/preview request stays
+small. They are compressed with zstd when the 'zstandard' package is
+installed, otherwise with zlib; either way a dictionary trained on our own
+transcripts is used, which matters a lot for short calls.
+
+Move existing rows and report savings with:
+    python -m app.transcript_store migrate [--vacuum]
+    python -m app.transcript_store report
+"""
+import argparse
+import logging
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import CallSummaryDB, CallTranscript, TranscriptDictionary
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC = "zstd" if zstandard is not None else "zlib"
+# zlib can only use the last 32KB of a preset dictionary.
+_DICTIONARY_SIZE = {"zstd": 112 * 1024, "zlib": 32 * 1024}
+_ZSTD_LEVEL = 9
+_ZLIB_LEVEL = 9
+
+_WORDS_RE = re.compile(r"\S+")
+
+_dictionary_lock = threading.Lock()
+_dictionaries: Dict[int, bytes] = {}
+_active_dictionary_id: Optional[int] = None
+_active_dictionary_loaded = False
+
+
+def uses_side_table() -> bool:
+    """
+    Whether transcripts are moved out of callsummarydb. Postgres already
+    compresses large text out of line (TOAST), and its full-text index reads
+    the inline column, so there they stay where they are.
+    """
+    return engine.dialect.name != "postgresql"
+
+
+def train_dictionary(samples: List[str]) -> Optional[bytes]:
+    """Builds a compression dictionary for the current codec from sample transcripts."""
+    samples = [s for s in samples if s]
+    if not samples:
+        return None
+    size = _DICTIONARY_SIZE[CODEC]
+
+    if CODEC == "zstd":
+        try:
+            return zstandard.train_dictionary(size, [s.encode("utf-8") for s in samples]).as_bytes()
+        except zstandard.ZstdError as e:
+            # Training needs a reasonable number of samples; fall through to the phrase list.
+            logger.info(f"zstd dictionary training failed, using a phrase dictionary instead: {e}")
+
+    # Phrase dictionary: the most common word trigrams, with the most common
+    # last since zlib finds matches closest to the end of the dictionary cheapest.
+    phrases = Counter()
+    for sample in samples:
+        words = _WORDS_RE.findall(sample)
+        phrases.update(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+    chosen = []
+    total = 0
+    for phrase, count in phrases.most_common():
+        if count < 2 or total + len(phrase) + 1 > size:
+            break
+        chosen.append(phrase)
+        total += len(phrase) + 1
+    if not chosen:
+        return None
+    return "\n".join(reversed(chosen)).encode("utf-8")
+
+
+def _get_dictionary(dictionary_id: Optional[int]) -> Optional[bytes]:
+    if dictionary_id is None:
+        return None
+    with _dictionary_lock:
+        if dictionary_id in _dictionaries:
+            return _dictionaries[dictionary_id]
+    with Session(engine) as session:
+        record = session.get(TranscriptDictionary, dictionary_id)
+        data = record.data if record else None
+    with _dictionary_lock:
+        _dictionaries[dictionary_id] = data
+    return data
+
+
+def _get_active_dictionary_id() -> Optional[int]:
+    """The newest dictionary for the current codec, looked up once per process."""
+    global _active_dictionary_id, _active_dictionary_loaded
+    if not _active_dictionary_loaded:
+        with Session(engine) as session:
+            record = session.exec(
+                select(TranscriptDictionary).where(TranscriptDictionary.codec == CODEC).order_by(TranscriptDictionary.id.desc())
+            ).first()
+        with _dictionary_lock:
+            _active_dictionary_id = record.id if record else None
+            if record:
+                _dictionaries[record.id] = record.data
+            _active_dictionary_loaded = True
+    return _active_dictionary_id
+
+
+def save_dictionary(data: bytes) -> int:
+    """Stores a newly trained dictionary and makes it the one used for new transcripts."""
+    global _active_dictionary_id, _active_dictionary_loaded
+    with Session(engine) as session:
+        record = TranscriptDictionary(codec=CODEC, data=data)
+        session.add(record)
+        session.commit()
+        session.refresh(record)
+    with _dictionary_lock:
+        _dictionaries[record.id] = data
+        _active_dictionary_id = record.id
+        _active_dictionary_loaded = True
+    return record.id
+
+
+def compress(transcript: str) -> Tuple[str, Optional[int], bytes]:
+    """Returns (codec, dictionary_id, compressed bytes) for a transcript."""
+    raw = transcript.encode("utf-8")
+    dictionary_id = _get_active_dictionary_id()
+    dictionary = _get_dictionary(dictionary_id)
+
+    if CODEC == "zstd":
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        compressor = zstandard.ZstdCompressor(level=_ZSTD_LEVEL, dict_data=dict_data)
+        return CODEC, dictionary_id, compressor.compress(raw)
+
+    compressor = zlib.compressobj(_ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(_ZLIB_LEVEL)
+    return CODEC, dictionary_id, compressor.compress(raw) + compressor.flush()
+
+
+def decompress(codec: str, dictionary_id: Optional[int], data: bytes) -> str:
+    dictionary = _get_dictionary(dictionary_id)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This transcript is zstd-compressed but the 'zstandard' package is not installed.")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data).decode("utf-8")
+    if codec == "zlib":
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+    raise ValueError(f"Unknown transcript codec: {codec}")
+
+
+def store_transcript(session: Session, call_summary_id: int, transcript: str):
+    """Writes a compressed transcript inside the caller's transaction."""
+    codec, dictionary_id, data = compress(transcript or "")
+    session.merge(CallTranscript(
+        call_summary_id=call_summary_id,
+        codec=codec,
+        dictionary_id=dictionary_id,
+        raw_size=len((transcript or "").encode("utf-8")),
+        data=data,
+    ))
+
+
+def load_transcripts(session: Session, call_summary_ids: Iterable[int]) -> Dict[int, str]:
+    """Decompresses the transcripts for the given CallSummaryDB ids, where one is stored."""
+    ids = list(call_summary_ids)
+    if not ids:
+        return {}
+    records = session.exec(select(CallTranscript).where(CallTranscript.call_summary_id.in_(ids))).all()
+    return {r.call_summary_id: decompress(r.codec, r.dictionary_id, r.data) for r in records}
+
+
+def load_transcript(session: Session, summary: CallSummaryDB) -> str:
+    """
+    The full transcript for one call: from the side table if it has been
+    moved there, otherwise whatever is still stored inline.
+    """
+    return load_transcripts(session, [summary.id]).get(summary.id, summary.transcript or "")
+
+
+def migrate_inline_transcripts(batch_size: int = 200, sample_size: int = 2000) -> int:
+    """
+    Moves transcripts still stored inline in callsummarydb into the
+    compressed side table, training a dictionary first if there isn't one.
+    Works in small batches so the write lock is only held briefly.
+    """
+    if _get_active_dictionary_id() is None:
+        with Session(engine) as session:
+            samples = session.exec(
+                select(CallSummaryDB.transcript).where(CallSummaryDB.transcript != "").order_by(CallSummaryDB.id.desc()).limit(sample_size)
+            ).all()
+        dictionary = train_dictionary(list(samples))
+        if dictionary:
+            dictionary_id = save_dictionary(dictionary)
+            logger.info(f"Trained a {len(dictionary)}-byte {CODEC} transcript dictionary (id {dictionary_id}).")
+
+    moved = 0
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(CallSummaryDB.id, CallSummaryDB.transcript).where(CallSummaryDB.transcript != "").limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for summary_id, transcript in rows:
+                store_transcript(session, summary_id, transcript)
+            session.connection().execute(
+                text("UPDATE callsummarydb SET transcript = '' WHERE id = :id"), [{"id": r[0]} for r in rows]
+            )
+            session.commit()
+        moved += len(rows)
+    logger.info(f"Moved {moved} transcripts into compressed storage.")
+    return moved
+
+
+def storage_report() -> Dict:
+    """How much space the compressed transcripts take compared to plain text."""
+    with Session(engine) as session:
+        count, raw_bytes, stored_bytes = session.exec(
+            select(func.count(), func.coalesce(func.sum(CallTranscript.raw_size), 0), func.coalesce(func.sum(func.length(CallTranscript.data)), 0))
+        ).one()
+        inline_remaining = session.exec(select(func.count()).where(CallSummaryDB.transcript != "")).one()
+    return {
+        "codec": CODEC,
+        "compressed_transcripts": count,
+        "inline_transcripts_remaining": inline_remaining,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "saved_bytes": raw_bytes - stored_bytes,
+        "compression_ratio": round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage compressed transcript storage.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subcommands.add_parser("migrate", help="Move inline transcripts into compressed storage.")
+    migrate_parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite file afterwards to give the space back.")
+    subcommands.add_parser("report", help="Print storage savings.")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_inline_transcripts()
+        if args.vacuum and engine.dialect.name == "sqlite":
+            with engine.connect() as connection:
+                connection.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    for key, value in storage_report().items():
+        print(f"{key}: {value}")
@@ -0,0 +1,126 @@
+"""
+The one place the app talks to the Twilio REST API.
+
+A single TwilioGateway is owned by OraniAIAssistant. It keeps one pooled HTTP
+session (keep-alive connections to api.twilio.com) shared by every REST client
+it hands out, including clients for subaccounts, so a send no longer pays for
+a new TCP/TLS connection. Calls are timed into the metrics registry, and the
+async variants run on the gateway's own bounded thread pool.
+
+Tests can pass a fake gateway to OraniAIAssistant (or override
+get_orani_assistant) to avoid real Twilio calls.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _PooledHttpClient(TwilioHttpClient):
+    """TwilioHttpClient whose timeout can be overridden per call on the calling thread."""
+
+    def __init__(self, timeout: float, pool_size: int):
+        super().__init__(pool_connections=True, timeout=timeout)
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+        self._local = threading.local()
+
+    def request(self, method, url, params=None, data=None, headers=None, auth=None, timeout=None, allow_redirects=False):
+        timeout = timeout or getattr(self._local, "timeout", None)
+        return super().request(method, url, params=params, data=data, headers=headers, auth=auth,
+                               timeout=timeout, allow_redirects=allow_redirects)
+
+
+class TwilioGateway:
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        timeout: Optional[float] = None,
+        pool_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.http_client = _PooledHttpClient(
+            timeout=timeout or settings.TWILIO_HTTP_TIMEOUT_SECONDS,
+            pool_size=pool_size or settings.TWILIO_HTTP_POOL_SIZE,
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.TWILIO_EXECUTOR_WORKERS, thread_name_prefix="twilio"
+        )
+        self._clients: Dict[str, Client] = {}
+        self._clients_lock = threading.Lock()
+
+    def client(self, subaccount_sid: Optional[str] = None) -> Client:
+        """The REST client for the main account or a subaccount, sharing the pooled session."""
+        key = subaccount_sid or self.account_sid
+        with self._clients_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = Client(
+                    self.account_sid, self.auth_token, account_sid=key, http_client=self.http_client
+                )
+            return client
+
+    def call(self, operation: str, func: Callable[..., T], *args, timeout: Optional[float] = None, **kwargs) -> T:
+        """Runs a Twilio SDK call, timed as 'twilio.<operation>' (errors as 'twilio.<operation>.errors')."""
+        local = self.http_client._local
+        previous = getattr(local, "timeout", None)
+        local.timeout = timeout
+        try:
+            with metrics.timer(f"twilio.{operation}"):
+                return func(*args, **kwargs)
+        finally:
+            local.timeout = previous
+
+    async def call_async(self, operation: str, func: Callable[..., T], *args, timeout: Optional[float] = None, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.call, operation, func, *args, timeout=timeout, **kwargs))
+
+    def send_message(
+        self,
+        to: str,
+        from_: str,
+        body: Optional[str] = None,
+        media_url: Optional[List[str]] = None,
+        status_callback: Optional[str] = None,
+        subaccount_sid: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Sends an SMS/MMS and returns the Twilio message resource."""
+        params = {"to": to, "from_": from_}
+        if body:
+            params["body"] = body
+        if media_url:
+            params["media_url"] = media_url
+        if status_callback:
+            params["status_callback"] = status_callback
+        return self.call("messages.create", self.client(subaccount_sid).messages.create, timeout=timeout, **params)
+
+    async def send_message_async(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.send_message, *args, **kwargs))
+
+    def find_incoming_number(self, phone_number: str, subaccount_sid: Optional[str] = None, timeout: Optional[float] = None):
+        """The IncomingPhoneNumber resource for one of our numbers."""
+        client = self.client(subaccount_sid)
+        numbers = self.call("incoming_phone_numbers.list", client.incoming_phone_numbers.list, phone_number=phone_number, timeout=timeout)
+        if not numbers:
+            raise Exception(f"Phone number {phone_number} not found in Twilio account.")
+        return numbers[0]
+
+    def update_incoming_number(self, number, timeout: Optional[float] = None, **params):
+        return self.call("incoming_phone_numbers.update", number.update, timeout=timeout, **params)
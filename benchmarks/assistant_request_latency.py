@@ -0,0 +1,127 @@
+"""
+Latency of answering Vapi's assistant-request webhook.
+
+In-process (default): fills the routing and assistant-config caches for
+--tenants synthetic businesses the way a profile save does, then resolves
+--requests assistant-requests for random numbers and reports percentiles.
+
+    python -m benchmarks.assistant_request_latency --tenants 500 --requests 20000
+
+Against a running server: posts assistant-requests for a number that is
+already set up and reports the round-trip times.
+
+    python -m benchmarks.assistant_request_latency --url http://localhost:8000 --number +15551234567
+
+Exits non-zero if p99 is over --budget-ms, which is kept far below Vapi's
+response deadline.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import List
+
+from app.assistant_configs import CompiledAssistantConfig, resolve_assistant_request, store_assistant_config
+from app.phone_routing import phone_owner_cache
+from app.phone_utils import phone_match_key
+from app.prompt_templates import render_system_prompt
+from app.schedule import compile_schedule
+
+HOURS = [
+    {"days": ["Mon - Fri"], "start_time": "9:00 AM", "end_time": "5:00 PM"},
+    {"days": ["Saturday"], "start_time": "10:00 AM", "end_time": "2:00 PM"},
+]
+
+
+def _synthetic_config(i: int) -> dict:
+    prompt = render_system_prompt({
+        "AI NAME": "Orani",
+        "business_name": f"Business {i}",
+        "services_list": "Plumbing, heating and emergency repairs. " * 20,
+        "hours_by_day": "Mon - Fri: 9:00 AM to 5:00 PM. Saturday: 10:00 AM to 2:00 PM.",
+        "main_phone": f"+1555{i:07d}",
+        "booking_url": f"https://example.com/book/{i}",
+        "pricing_table": "Call-out: $90. Hourly: $120. ",
+        "business_tagline": "Not specified.",
+        "service_area": "Not specified.",
+        "timezone": "America/New_York",
+        "escalation_contact": "the manager",
+    })
+    return {
+        "name": f"Orani Assistant - Business {i}",
+        "model": {"provider": "openai", "model": "gpt-4", "messages": [{"role": "system", "content": prompt}]},
+        "voice": {"provider": "vapi", "voiceId": "kylie"},
+        "firstMessage": "Hello.",
+    }
+
+
+def _report(label: str, samples_ms: List[float], budget_ms: float) -> bool:
+    samples_ms.sort()
+    p99 = samples_ms[int(len(samples_ms) * 0.99) - 1]
+    print(
+        f"{label}: n={len(samples_ms)} mean={statistics.mean(samples_ms):.3f}ms "
+        f"p50={samples_ms[len(samples_ms) // 2]:.3f}ms p95={samples_ms[int(len(samples_ms) * 0.95) - 1]:.3f}ms "
+        f"p99={p99:.3f}ms max={samples_ms[-1]:.3f}ms (budget {budget_ms}ms)"
+    )
+    return p99 <= budget_ms
+
+
+def run_in_process(tenants: int, requests: int, budget_ms: float) -> bool:
+    numbers = []
+    for i in range(tenants):
+        user_id, number = f"bench-user-{i}", f"+1555{i:07d}"
+        phone_owner_cache.set(phone_match_key(number), user_id)
+        store_assistant_config(CompiledAssistantConfig(
+            user_id=user_id, assistant_id=f"bench-assistant-{i}", config=_synthetic_config(i),
+            schedule=compile_schedule(HOURS, "America/New_York"),
+        ))
+        numbers.append(number)
+
+    def no_db(user_id):
+        raise RuntimeError("cache miss during benchmark")
+
+    samples = []
+    for _ in range(requests):
+        message = {"type": "assistant-request", "phoneNumber": {"number": random.choice(numbers)}, "call": {}}
+        started = time.perf_counter()
+        response = resolve_assistant_request(message, no_db)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert "assistant" in response, response
+    return _report("in-process", samples, budget_ms)
+
+
+def run_http(url: str, number: str, requests_count: int, budget_ms: float) -> bool:
+    import requests
+
+    session = requests.Session()
+    payload = {"message": {"type": "assistant-request", "phoneNumber": {"number": number}, "call": {}}}
+    samples = []
+    for _ in range(requests_count):
+        started = time.perf_counter()
+        response = session.post(f"{url.rstrip('/')}/webhook/vapi", json=payload, timeout=10)
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return _report("http", samples, budget_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--url", help="Base URL of a running server; benchmarks over HTTP instead")
+    parser.add_argument("--number", help="A configured number to request (with --url)")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.number:
+            parser.error("--number is required with --url")
+        ok = run_http(args.url, args.number, min(args.requests, 1000), args.budget_ms)
+    else:
+        ok = run_in_process(args.tenants, args.requests, args.budget_ms)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+
+# app.config reads these at import time; the tests never reach the services.
+for name in (
+    "VAPI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "GOOGLE_API_KEY", "BACKEND_API_BASE_URL",
+    "TWILIO_API_KEY_SID", "TWILIO_API_KEY_SECRET", "TWIML_APP_SID", "CLOUDINARY_CLOUD_NAME",
+    "CLOUDINARY_API_KEY", "CLOUDINARY_API_SECRET",
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("PUBLIC_BASE_URL", "https://api.example.com")
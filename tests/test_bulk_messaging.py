@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app import bulk_messaging
+from app.bulk_messaging import TokenBucket, render_template
+
+
+@pytest.mark.parametrize("template, variables, expected", [
+    ("Hi {name}, see you at {time}.", {"name": "Ana", "time": "9am"}, "Hi Ana, see you at 9am."),
+    ("Hi {name}!", {}, "Hi {name}!"),
+    ("Order {id} ready", {"id": 42}, "Order 42 ready"),
+    ("{a}{a}{b}", {"a": "x", "b": "y"}, "xxy"),
+    ("No placeholders {}", {"name": "Ana"}, "No placeholders {}"),
+    ("Hi {first name}", {"first name": "Ana"}, "Hi {first name}"),
+])
+def test_render_template(template, variables, expected):
+    assert render_template(template, variables) == expected
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake monotonic clock that asyncio.sleep advances instead of waiting."""
+    state = {"now": 1000.0, "slept": []}
+
+    async def sleep(seconds):
+        state["slept"].append(seconds)
+        state["now"] += seconds
+
+    monkeypatch.setattr(bulk_messaging.time, "monotonic", lambda: state["now"])
+    monkeypatch.setattr(bulk_messaging.asyncio, "sleep", sleep)
+    return state
+
+
+def acquire_times(bucket, clock, count):
+    async def run():
+        times = []
+        for _ in range(count):
+            await bucket.acquire()
+            times.append(clock["now"])
+        return times
+    return asyncio.run(run())
+
+
+def test_token_bucket_allows_a_burst_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    times = acquire_times(bucket, clock, 3)
+    assert times == [1000.0] * 3
+    assert clock["slept"] == []
+
+
+def test_token_bucket_paces_to_rate_after_the_burst(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    times = acquire_times(bucket, clock, 6)
+    assert times[:2] == [1000.0, 1000.0]
+    assert times[2:] == pytest.approx([1000.5, 1001.0, 1001.5, 1002.0])
+
+
+def test_token_bucket_refills_while_idle_but_not_past_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    acquire_times(bucket, clock, 2)
+    clock["now"] += 60
+    times = acquire_times(bucket, clock, 3)
+    assert times[:2] == [1060.0, 1060.0]
+    assert times[2] == pytest.approx(1061.0)
+
+
+def test_token_bucket_capacity_defaults_to_rate():
+    assert TokenBucket(rate=5).capacity == 5
+    assert TokenBucket(rate=0.5).capacity == 1.0
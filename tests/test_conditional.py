@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+from fastapi import Request, Response
+
+from app.api import conditional
+from app.api.conditional import conditional_response
+
+UPDATED_AT = datetime(2026, 1, 2, 3, 4, 5)
+
+
+@pytest.fixture
+def history_version(monkeypatch):
+    state = {"version": 3}
+    monkeypatch.setattr(conditional, "get_history_version", lambda user_id: (state["version"], UPDATED_AT))
+    return state
+
+
+def make_request(path="/summaries/user-1", query=b"", headers=None):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    })
+
+
+def first_response(**kwargs):
+    response = Response()
+    assert conditional_response(make_request(**kwargs), response, "user-1") is None
+    return response
+
+
+def test_sets_validators_on_a_fresh_request(history_version):
+    response = first_response()
+    assert response.headers["etag"].startswith('W/"3-')
+    assert response.headers["last-modified"] == "Fri, 02 Jan 2026 03:04:05 GMT"
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_matching_etag_gets_304(history_version):
+    etag = first_response().headers["etag"]
+    for header in (etag, etag[2:], f'"other", {etag}', "*"):
+        result = conditional_response(make_request(headers={"If-None-Match": header}), Response(), "user-1")
+        assert result is not None and result.status_code == 304
+        assert result.headers["etag"] == etag
+
+
+def test_new_version_invalidates_the_etag(history_version):
+    etag = first_response().headers["etag"]
+    history_version["version"] = 4
+    assert conditional_response(make_request(headers={"If-None-Match": etag}), Response(), "user-1") is None
+
+
+def test_etag_differs_per_endpoint_and_query(history_version):
+    etags = {
+        first_response().headers["etag"],
+        first_response(query=b"fields=summary").headers["etag"],
+        first_response(path="/history/user-1").headers["etag"],
+    }
+    assert len(etags) == 3
+
+
+def test_if_modified_since(history_version):
+    not_modified = conditional_response(
+        make_request(headers={"If-Modified-Since": "Fri, 02 Jan 2026 03:04:05 GMT"}), Response(), "user-1"
+    )
+    assert not_modified.status_code == 304
+    modified = conditional_response(
+        make_request(headers={"If-Modified-Since": "Thu, 01 Jan 2026 00:00:00 GMT"}), Response(), "user-1"
+    )
+    assert modified is None
+
+
+def test_if_none_match_takes_precedence(history_version):
+    result = conditional_response(
+        make_request(headers={"If-None-Match": '"stale"', "If-Modified-Since": "Fri, 02 Jan 2026 03:04:05 GMT"}),
+        Response(), "user-1",
+    )
+    assert result is None
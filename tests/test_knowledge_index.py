@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from app import knowledge_index
+from app.knowledge_index import build_chunks, current_version, load_index, search_knowledge, tokenize, write_index
+
+PROFILE = {
+    "company_info": {
+        "company_details": "Acme Plumbing fixes leaks and unblocks drains across Springfield.\n\n"
+                           "We offer emergency call-outs at night and on weekends.",
+    },
+    "price_info": [
+        {"package_name": "Drain unblocking", "package_price": "$120"},
+        {"package_name": "Boiler service", "package_price": "$90"},
+    ],
+    "hours_of_operation": [{"days": ["Monday", "Friday"], "start_time": "8am", "end_time": "6pm"}],
+}
+KNOWLEDGE = [
+    {"question": "Do you repair boilers?", "answer": "Yes, we repair and service all boiler brands."},
+    {"title": "Parking", "content": "Free parking is available behind the shop."},
+]
+
+
+@pytest.fixture
+def index_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(knowledge_index.settings, "KNOWLEDGE_INDEX_DIR", str(tmp_path))
+    knowledge_index._loaded.invalidate("user-1")
+    knowledge_index._loaded.invalidate("user-2")
+    yield tmp_path
+    knowledge_index._loaded.invalidate("user-1")
+    knowledge_index._loaded.invalidate("user-2")
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What are YOUR opening-hours?") == ["opening", "hours"]
+
+
+def test_build_chunks_covers_profile_and_knowledge():
+    sources = [c["source"] for c in build_chunks(PROFILE, {"results": KNOWLEDGE})]
+    assert sources.count("company_details") == 2
+    assert sources.count("pricing") == 2
+    assert sources.count("hours") == 1
+    assert sources.count("knowledge") == 2
+
+
+def test_search_ranks_the_most_relevant_chunk_first(index_dir):
+    write_index("user-1", build_chunks(PROFILE, KNOWLEDGE))
+    results = search_knowledge("user-1", "how much is a boiler service", k=3)
+    assert results[0]["text"] == "Price of Boiler service: $90"
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+    assert all(r["score"] > 0 for r in results)
+
+
+def test_rarer_terms_outweigh_common_ones(index_dir):
+    chunks = [
+        {"source": "knowledge", "text": "drain drain cleaning"},
+        {"source": "knowledge", "text": "drain camera inspection"},
+        {"source": "knowledge", "text": "drain jetting"},
+    ]
+    write_index("user-1", chunks)
+    assert search_knowledge("user-1", "drain camera", k=1)[0]["text"] == "drain camera inspection"
+
+
+def test_search_without_matching_terms_returns_nothing(index_dir):
+    write_index("user-1", build_chunks(PROFILE, KNOWLEDGE))
+    assert search_knowledge("user-1", "the and of") == []
+    assert search_knowledge("user-1", "helicopter") == []
+    assert search_knowledge("user-2", "boiler") == []
+
+
+def test_tenants_do_not_share_an_index(index_dir):
+    write_index("user-1", build_chunks(PROFILE, KNOWLEDGE))
+    write_index("user-2", [{"source": "knowledge", "text": "We sell bicycles."}])
+    assert search_knowledge("user-1", "bicycles") == []
+    assert search_knowledge("user-2", "bicycles")[0]["text"] == "We sell bicycles."
+
+
+def test_rebuild_publishes_the_new_version_and_removes_the_old(index_dir):
+    first = write_index("user-1", [{"source": "knowledge", "text": "Old answer."}])
+    assert write_index("user-1", [{"source": "knowledge", "text": "Old answer."}]) == first
+    second = write_index("user-1", [{"source": "knowledge", "text": "New answer."}])
+
+    assert current_version("user-1") == second
+    user_dir = knowledge_index._user_dir("user-1")
+    assert sorted(n for n in os.listdir(user_dir) if knowledge_index._VERSION_RE.fullmatch(n)) == [second]
+    assert load_index("user-1").version == second
+    assert search_knowledge("user-1", "answer")[0]["text"] == "New answer."
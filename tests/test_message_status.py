@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import message_status
+from app.message_status import MessageStatusBuffer
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    """A throwaway SQLite database with just the columns the flush touches."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'status.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE message (message_sid TEXT PRIMARY KEY, user_id TEXT, customer_number_normalized TEXT, "
+            "status TEXT, error_code TEXT, status_updated_at TIMESTAMP)"
+        ))
+        connection.execute(text(
+            "INSERT INTO message (message_sid, user_id, customer_number_normalized, status) VALUES "
+            "('SM1', 'user-1', '5551230001', 'queued'), ('SM2', 'user-1', '5551230002', 'queued'), "
+            "('SM3', 'user-2', '5551230003', NULL)"
+        ))
+    monkeypatch.setattr(message_status, "engine", engine)
+    monkeypatch.setattr(message_status, "bump_history_version", lambda session, user_id: None)
+    monkeypatch.setattr(message_status.response_cache, "invalidate_user", lambda user_id: None)
+    return engine
+
+
+def stored_status(engine, message_sid):
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT status FROM message WHERE message_sid = :sid"), {"sid": message_sid}
+        ).scalar()
+
+
+def test_callbacks_between_flushes_collapse_to_the_latest_state():
+    buffer = MessageStatusBuffer()
+    for status in ("queued", "sent", "delivered"):
+        buffer.add("SM1", status)
+    assert len(buffer) == 1
+    assert buffer._pending["SM1"].status == "delivered"
+
+
+def test_out_of_order_callbacks_do_not_move_status_backwards_in_the_buffer():
+    buffer = MessageStatusBuffer()
+    buffer.add("SM1", "delivered")
+    buffer.add("SM1", "sent")
+    buffer.add("SM1", "queued")
+    assert buffer._pending["SM1"].status == "delivered"
+
+
+def test_flush_writes_one_batch_and_groups_by_user(engine):
+    buffer = MessageStatusBuffer()
+    buffer.add("SM1", "sent")
+    buffer.add("SM2", "failed", "30003")
+    buffer.add("SM3", "delivered")
+
+    by_user = buffer.flush()
+
+    assert len(buffer) == 0
+    assert {u["message_sid"] for u in by_user["user-1"]} == {"SM1", "SM2"}
+    assert by_user["user-2"] == [
+        {"message_sid": "SM3", "status": "delivered", "error_code": None, "customer_number": "5551230003"}
+    ]
+    assert [stored_status(engine, sid) for sid in ("SM1", "SM2", "SM3")] == ["sent", "failed", "delivered"]
+
+
+def test_a_late_callback_in_a_later_flush_does_not_overwrite_a_newer_status(engine):
+    buffer = MessageStatusBuffer()
+    buffer.add("SM1", "delivered")
+    buffer.flush()
+    buffer.add("SM1", "sent")
+    buffer.flush()
+    assert stored_status(engine, "SM1") == "delivered"
+
+
+def test_callbacks_for_unknown_messages_wait_for_the_next_flush(engine, monkeypatch):
+    monkeypatch.setattr(message_status.settings, "MESSAGE_STATUS_MAX_WAIT_SECONDS", 60)
+    buffer = MessageStatusBuffer()
+    buffer.add("SM9", "sent")
+
+    assert buffer.flush() == {}
+    assert len(buffer) == 1
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO message (message_sid, user_id, status) VALUES ('SM9', 'user-1', 'queued')"))
+    assert [u["message_sid"] for u in buffer.flush()["user-1"]] == ["SM9"]
+    assert stored_status(engine, "SM9") == "sent"
+
+
+def test_callbacks_for_unknown_messages_are_dropped_after_the_wait(engine, monkeypatch):
+    monkeypatch.setattr(message_status.settings, "MESSAGE_STATUS_MAX_WAIT_SECONDS", 0)
+    buffer = MessageStatusBuffer()
+    buffer.add("SM9", "sent")
+    assert buffer.flush() == {}
+    assert len(buffer) == 0
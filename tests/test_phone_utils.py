@@ -0,0 +1,43 @@
+import pytest
+
+from app.phone_utils import normalize_phone_number, phone_match_key
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("+15551234567", "+15551234567"),
+    ("+1 (555) 123-4567", "+15551234567"),
+    ("5551234567", "+15551234567"),  # 10-digit NANP gets the default country code
+    ("1 555 123 4567", "+15551234567"),  # 11-digit NANP already has it
+    ("+44 20 7946 0958", "+442079460958"),
+    ("0044 20 7946 0958", "+442079460958"),  # 00 international prefix
+    ("  +15551234567  ", "+15551234567"),
+    ("client:user_123", None),  # Twilio client identity
+    ("sip:alice@example.com", None),
+    ("555-1234", None),  # no country code and not 10/11 digits
+    ("44 20 7946 0958", None),  # foreign number without + or 00
+    ("+1234567", None),  # under 8 digits
+    ("+1234567890123456", None),  # over 15 digits
+    ("+0123456789", None),  # E.164 never starts with 0
+    ("00123", None),
+    ("", None),
+    (None, None),
+    ("abc", None),
+])
+def test_normalize_phone_number(raw, expected):
+    assert normalize_phone_number(raw) == expected
+
+
+def test_normalize_without_nanp_default():
+    assert normalize_phone_number("5551234567", default_country_code="44") is None
+    assert normalize_phone_number("+15551234567", default_country_code="44") == "+15551234567"
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("(555) 123-4567", "+15551234567"),
+    ("client:user_123", "client:user_123"),  # non-numbers still match themselves
+    ("  client:user_123 ", "client:user_123"),
+    ("   ", None),
+    (None, None),
+])
+def test_phone_match_key(raw, expected):
+    assert phone_match_key(raw) == expected
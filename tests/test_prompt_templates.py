@@ -0,0 +1,72 @@
+import pytest
+
+from app import prompt_templates
+from app.prompt_templates import DEFAULT_SYSTEM_PROMPT_TEMPLATE, compile_template, render_system_prompt
+
+
+def test_render_fills_every_placeholder():
+    template = compile_template("Hi, I'm {{AI NAME}} from {{ Company }}. {{AI NAME}} here to help.")
+    assert template.fields == ["AI NAME", "Company"]
+    assert template.render({"AI NAME": "Ava", "Company": "Acme"}) == "Hi, I'm Ava from Acme. Ava here to help."
+
+
+def test_render_leaves_unknown_placeholders_as_written():
+    template = compile_template("{{Greeting}}, {{Name}}!")
+    assert template.render({"Greeting": "Hello"}) == "Hello, {{Name}}!"
+
+
+def test_render_does_not_expand_placeholders_inside_values():
+    template = compile_template("{{A}} and {{B}}")
+    assert template.render({"A": "{{B}}", "B": "b"}) == "{{B}} and b"
+
+
+def test_template_without_placeholders_renders_unchanged():
+    template = compile_template("Plain text, {single braces} too.")
+    assert template.fields == []
+    assert template.render({"single braces": "x"}) == "Plain text, {single braces} too."
+
+
+def test_render_matches_replacing_each_field_in_turn():
+    values = {"AI NAME": "Ava"}
+    expected = DEFAULT_SYSTEM_PROMPT_TEMPLATE
+    for name, value in values.items():
+        expected = expected.replace("{{" + name + "}}", value)
+    assert compile_template(DEFAULT_SYSTEM_PROMPT_TEMPLATE).render(values) == expected
+
+
+def test_compiled_templates_are_reused_and_versioned_by_text():
+    assert compile_template("{{A}}") is compile_template("{{A}}")
+    assert compile_template("{{A}}").version != compile_template("{{A}}!").version
+
+
+class _Overrides:
+    def __init__(self, templates):
+        self.templates = templates
+
+    def get_or_load(self, user_id, load):
+        return self.templates.get(user_id)
+
+
+@pytest.fixture
+def overrides(monkeypatch):
+    templates = {}
+    monkeypatch.setattr(prompt_templates, "_overrides", _Overrides(templates))
+    monkeypatch.setattr(prompt_templates, "_rendered", type(prompt_templates._rendered)())
+    return templates
+
+
+def test_render_system_prompt_uses_the_tenant_override(overrides):
+    overrides["user-1"] = "You are {{AI NAME}} for user one."
+    assert render_system_prompt({"AI NAME": "Ava"}, "user-1") == "You are Ava for user one."
+    assert "Ava" in render_system_prompt({"AI NAME": "Ava"}, "user-2")
+    assert render_system_prompt({"AI NAME": "Ava"}, "user-2") != "You are Ava for user one."
+
+
+def test_render_system_prompt_memoizes_by_template_and_values(overrides, monkeypatch):
+    monkeypatch.setattr(prompt_templates.settings, "PROMPT_RENDER_CACHE_SIZE", 2)
+    first = render_system_prompt({"AI NAME": "Ava"})
+    assert render_system_prompt({"AI NAME": "Ava"}) is first
+    render_system_prompt({"AI NAME": "Bo"})
+    render_system_prompt({"AI NAME": "Cy"})
+    assert len(prompt_templates._rendered) == 2
+    assert render_system_prompt({"AI NAME": "Ava"}) == first
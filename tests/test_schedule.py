@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+from app.schedule import compile_schedule, parse_time
+
+
+def test_parse_time_with_seconds():
+    assert parse_time("09:00:00") == 9 * 60
+    assert parse_time("20:30:00") == 20 * 60 + 30
+    assert parse_time("24:00:00") == 24 * 60
+    assert parse_time("9:00:00 PM") == 21 * 60
+
+
+def test_parse_time_other_formats():
+    assert parse_time("9:00 AM") == 9 * 60
+    assert parse_time("9am") == 9 * 60
+    assert parse_time("17:30") == 17 * 60 + 30
+    assert parse_time("later") is None
+
+
+def test_schedule_with_seconds_is_not_always_open():
+    schedule = compile_schedule(
+        [{"days": ["Mon - Fri"], "start_time": "09:00:00", "end_time": "20:30:00"}], "UTC"
+    )
+    assert not schedule.is_empty
+    # 2026-10-19 is a Monday.
+    assert schedule.is_open(datetime(2026, 10, 19, 10, 0, tzinfo=timezone.utc))
+    assert not schedule.is_open(datetime(2026, 10, 19, 21, 0, tzinfo=timezone.utc))
+    assert not schedule.is_open(datetime(2026, 10, 18, 10, 0, tzinfo=timezone.utc))
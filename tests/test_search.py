@@ -0,0 +1,35 @@
+import sqlite3
+
+from app.search import FTS_TABLE, _FTS_COLUMNS, _build_match_query, _tenant_token
+
+
+def test_match_query_quotes_terms_and_prefixes_the_last():
+    query = _build_match_query("user-1", 'refund "policy" OR delivery*')
+    assert query == f'tenant : "{_tenant_token("user-1")}" AND "refund" AND "policy" AND "OR" AND "delivery"*'
+
+
+def test_match_query_without_words():
+    assert _build_match_query("user-1", "  -- !! ") is None
+
+
+def test_tenant_tokens_differ_per_user():
+    assert _tenant_token("user-1") != _tenant_token("user-2")
+    assert _tenant_token("user-1").isalnum()
+
+
+def test_match_query_runs_against_fts5_and_stays_in_tenant():
+    connection = sqlite3.connect(":memory:")
+    columns = ", ".join(_FTS_COLUMNS)
+    connection.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, tokenize='porter unicode61')")
+    rows = [
+        (_tenant_token("user-1"), "message", "SM1", "Do you offer refunds on deliveries?"),
+        (_tenant_token("user-2"), "message", "SM2", "Do you offer refunds on deliveries?"),
+        (_tenant_token("user-1"), "message", "SM3", "What time do you open?"),
+    ]
+    connection.executemany(
+        f"INSERT INTO {FTS_TABLE} (tenant, item_type, item_key, body) VALUES (?, ?, ?, ?)", rows
+    )
+    found = connection.execute(
+        f"SELECT item_key FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?", (_build_match_query("user-1", "refund deliv"),)
+    ).fetchall()
+    assert found == [("SM1",)]
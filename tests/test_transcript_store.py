@@ -0,0 +1,66 @@
+import zlib
+
+import pytest
+
+from app import transcript_store
+from app.transcript_store import CODEC, compress, decompress, train_dictionary
+
+SAMPLES = [
+    f"AI: Thank you for calling Acme Plumbing, how can I help you today? "
+    f"User: Hi, I'd like to book an appointment for a leaking tap at number {i}. "
+    f"AI: Of course, can I have your name and phone number please? User: Sure, it's customer {i}."
+    for i in range(200)
+]
+
+
+@pytest.fixture
+def active_dictionary(monkeypatch):
+    """Points the module at an in-memory dictionary instead of the database."""
+    def use(dictionary_id, data):
+        monkeypatch.setattr(transcript_store, "_dictionaries", {dictionary_id: data} if dictionary_id else {})
+        monkeypatch.setattr(transcript_store, "_active_dictionary_id", dictionary_id)
+        monkeypatch.setattr(transcript_store, "_active_dictionary_loaded", True)
+    return use
+
+
+@pytest.mark.parametrize("transcript", ["", "Hello.", SAMPLES[0], "Grüße — ¿qué tal? 👋", "x" * 100_000])
+def test_round_trip_without_dictionary(active_dictionary, transcript):
+    active_dictionary(None, None)
+    codec, dictionary_id, data = compress(transcript)
+    assert (codec, dictionary_id) == (CODEC, None)
+    assert decompress(codec, dictionary_id, data) == transcript
+
+
+def test_round_trip_with_trained_dictionary(active_dictionary):
+    dictionary = train_dictionary(SAMPLES)
+    assert dictionary
+    active_dictionary(7, dictionary)
+    transcript = SAMPLES[0].replace("number 0", "number 9000")
+    codec, dictionary_id, data = compress(transcript)
+    assert dictionary_id == 7
+    assert decompress(codec, dictionary_id, data) == transcript
+
+
+def test_dictionary_shrinks_short_transcripts(active_dictionary):
+    transcript = SAMPLES[0].replace("number 0", "number 9000")
+    active_dictionary(None, None)
+    plain = compress(transcript)[2]
+    active_dictionary(7, train_dictionary(SAMPLES))
+    with_dictionary = compress(transcript)[2]
+    assert len(with_dictionary) < len(plain)
+
+
+def test_zlib_transcripts_stay_readable(active_dictionary):
+    # Rows written before zstandard was installed are still zlib.
+    active_dictionary(None, None)
+    assert decompress("zlib", None, zlib.compress("Old transcript".encode("utf-8"))) == "Old transcript"
+
+
+def test_unknown_codec_is_rejected(active_dictionary):
+    active_dictionary(None, None)
+    with pytest.raises(ValueError):
+        decompress("brotli", None, b"")
+
+
+def test_no_dictionary_from_empty_samples():
+    assert train_dictionary(["", ""]) is None